@@ -1,719 +1,554 @@
-import React, { useEffect, useMemo, useRef, useState, createContext, useContext } from "react";
-import { useForm } from "react-hook-form";
-import { jsPDF } from "jspdf";
-import html2canvas from "html2canvas";
-
-// =====================================================================
-## Självskattning – Funktionellt ledarskap (stabil TSX, inga oklch-färger)
-// =====================================================================
-
-// ---------- Färgpalett (HEX/RGB) ----------
-const PALETTE = {
-  eggshell: "#FAF7F0", // äggskalsvit bakgrund
-  white: "#FFFFFF",
-  text: "#111827",
-  navy50: "#E6ECF3",
-  navy300: "#6B86A3",
-  navy600: "#0B1F3A", // sober navy
-  navy700: "#09233F",
-  gray100: "#F3F4F6",
-  gray200: "#E5E7EB",
-  gray300: "#D1D5DB",
-  gray400: "#9CA3AF",
-  gray700: "#374151",
-  green: "#2E7D32",
-  orange: "#F59E0B",
-};
-
-// --- Power Automate webhook (anonym URL med sig=) ---
-// Byt endast om du roterar nyckeln i PA; denna kommer från dig.
-const WEBHOOK_URL = "https://default1ad3791223f4412ea6272223201343.20.environment.api.powerplatform.com:443/powerautomate/automations/direct/workflows/bff5923897b04a39bc6ba69ea4afde69/triggers/manual/paths/invoke?api-version=1&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=B1rjO0FhY0ZxXO8VJvWPmcLAv-LMCgICG6tDguPmhwQ";
-const WEBHOOK_SECRET = ""; // valfritt: använd om du lagt en Condition på secret i flödet
-
-// ---------- Typer ----------
-type Answers = { [q: number]: number };
-
-type Contact = {
-  name: string;
-  company?: string;
-  email: string;
-};
-
-type Scores = {
-  listening: number; // Aktivt lyssnande (1-7)
-  feedback: number;  // Återkoppling (8-15)
-  goal: number;      // Målinriktning (16-20)
-  total: number;     // Totalmedel (1-20)
-};
-
-// ---------- Hjälpfunktioner ----------
-const mean = (nums: number[]) => (nums.length ? nums.reduce((a, b) => a + b, 0) / nums.length : 0);
-
-const classify = (score: number) => {
-  if (score >= 5.0) return { label: "Högt", hex: PALETTE.navy600 };
-  if (score >= 2.5) return { label: "Medel", hex: PALETTE.navy300 };
-  return { label: "Lågt", hex: PALETTE.gray400 };
-};
-
-const svDate = (date = new Date()) => new Intl.DateTimeFormat("sv-SE", { dateStyle: "long" }).format(date);
-
-// Filvänligt datum (YYYYMMDD eller YYYY-MM-DD), används i filnamn och testas i självtester
-const svDateFile = (d: Date = new Date()) => {
-  const yyyy = d.getFullYear();
-  const mm = String(d.getMonth() + 1).padStart(2, "0");
-  const dd = String(d.getDate()).padStart(2, "0");
-  // utan bindestreck för kompakta filnamn; självtest tillåter även med bindestreck
-  return `${yyyy}${mm}${dd}`;
-};
-
-// Skapar ett unikt ID för varje mätning (ex: FL-20251010-125123-AB12)
-const generateMeasurementId = () => {
-  const d = new Date();
-  const stamp = `${d.getFullYear()}${String(d.getMonth()+1).padStart(2,'0')}${String(d.getDate()).padStart(2,'0')}-${String(d.getHours()).padStart(2,'0')}${String(d.getMinutes()).padStart(2,'0')}${String(d.getSeconds()).padStart(2,'0')}`;
-  const rand = Math.random().toString(36).slice(2,6).toUpperCase();
-  return `FL-${stamp}-${rand}`;
-};
-
-const sumRange = (answers: Answers, from: number, to: number): number => {
-  let s = 0;
-  for (let i = from; i <= to; i++) s += answers[i] ?? 0;
-  return s;
-};
-
-// --- POST till Power Automate webhook ---
-async function postToWebhook(
-  url: string,
-  contact: Contact,
-  answers: Answers,
-  secret?: string,
-  pdf?: { pdfBase64: string; fileName: string },
-  titleOverride?: string
-) {
-  if (!url || !url.includes("sig=")) {
-    console.warn("Webhook URL saknas eller är inte anonym (ingen sig= hittad)");
-    return; // gör inget om URL inte är korrekt ännu
-  }
-
-  const hasPdf = !!(pdf && pdf.pdfBase64 && pdf.pdfBase64.length > 0);
-  const payload: any = {
-    title: titleOverride ?? contact.email, // SharePoint-kolumn "Rubrik"
-    name: contact.name,
-    company: contact.company ?? "",
-    email: contact.email,
-    sumListening: sumRange(answers, 1, 7),
-    sumFeedback: sumRange(answers, 8, 15),
-    sumGoal: sumRange(answers, 16, 20),
-    answersJson: JSON.stringify(answers),
-    submittedAt: new Date().toISOString(),
-    secret: secret ?? undefined,
-    hasPdf,
-  };
-  if (hasPdf) {
-    payload.pdfBase64 = pdf!.pdfBase64;
-    payload.fileName = pdf!.fileName;
-  }
-
-  try {
-    const res = await fetch(url, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    });
-    if (!res.ok) {
-      const txt = await res.text().catch(() => "");
-      throw new Error(`Webhook POST misslyckades: ${res.status} ${txt}`);
-    }
-  } catch (e) {
-    console.warn("Kunde inte posta till Power Automate:", e);
-  }
-}
-
-// ---------- Kontext för state ----------
-const AppStateCtx = createContext<{
-  answers: Answers;
-  setAnswer: (q: number, v: number) => void;
-  reset: () => void;
-} | null>(null);
-
-const AppStateProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
-  const [answers, setAnswers] = useState<Answers>(() => {
-    try {
-      const raw = localStorage.getItem("fl_sjalvskattning_answers");
-      return raw ? JSON.parse(raw) : {};
-    } catch {
-      return {};
-    }
-  });
-
-  useEffect(() => {
-    try {
-      localStorage.setItem("fl_sjalvskattning_answers", JSON.stringify(answers));
-    } catch {}
-  }, [answers]);
-
-  const setAnswer = (q: number, v: number) => setAnswers(prev => ({ ...prev, [q]: v }));
-  const reset = () => setAnswers({});
-
-  return (
-    <AppStateCtx.Provider value={{ answers, setAnswer, reset }}>
-      {children}
-    </AppStateCtx.Provider>
-  );
-};
-
-const useAppState = () => {
-  const ctx = useContext(AppStateCtx);
-  if (!ctx) throw new Error("useAppState must be used within provider");
-  return ctx;
-};
-
-// ---------- Frågorna ----------
-## 1–7 Aktivt lyssnande, 8–15 Återkoppling, 16–20 Målinriktning
-const QUESTIONS: { id: number; text: string }[] = [
-  { id: 1, text: "Jag bjuder aktivt in medarbetare till dialog och idéer." },
-  { id: 2, text: "Jag ställer öppna frågor för att förstå olika perspektiv." },
-  { id: 3, text: "Jag sammanfattar vad jag hört för att säkerställa förståelse." },
-  { id: 4, text: "Jag bekräftar andras bidrag och visar att jag lyssnar." },
-  { id: 5, text: "Jag använder information från medarbetare i beslut." },
-  { id: 6, text: "Jag skapar utrymme för alla röster i möten." },
-  { id: 7, text: "Jag anpassar min kommunikation utifrån mottagarens behov." },
-  { id: 8, text: "Jag uttrycker förväntningar tydligt och i rätt tid." },
-  { id: 9, text: "Jag ger konkret återkoppling kopplad till beteenden och resultat." },
-  { id: 10, text: "Jag följer upp överenskommelser och stöttar vid behov." },
-  { id: 11, text: "Jag uppmärksammar framsteg och förstärker önskat beteende." },
-  { id: 12, text: "Jag korrigerar respektfullt när något inte fungerar." },
-  { id: 13, text: "Jag säkerställer att budskapet är förstått (t.ex. genom frågor)." },
-  { id: 14, text: "Jag anpassar återkopplingens form (muntligt, skriftligt, 1:1)." },
-  { id: 15, text: "Jag dokumenterar och synliggör uppföljning när det behövs." },
-  { id: 16, text: "Jag formulerar tydliga mål och prioriteringar." },
-  { id: 17, text: "Jag fördelar ansvar och befogenheter på ett tydligt sätt." },
-  { id: 18, text: "Jag säkerställer att teamet vet hur målen mäts." },
-  { id: 19, text: "Jag följer upp resultat regelbundet och transparent." },
-  { id: 20, text: "Jag justerar plan och resurser utifrån lägesbild och data." },
-];
-
-const SCALE_LABELS = [
-  "1 Aldrig",
-  "2 Nästan aldrig",
-  "3 Sällan",
-  "4 Ibland",
-  "5 Ofta",
-  "6 Nästan alltid",
-  "7 Alltid",
-];
-
-// ---------- UI-komponenter ----------
-const Card: React.FC<{ children: React.ReactNode; className?: string }> = ({ children, className }) => (
-  <div className={`rounded-2xl shadow p-6 ${className ?? ""}`} style={{ background: PALETTE.white }}>
-    {children}
-  </div>
-);
-
-const PrimaryButton: React.FC<React.ButtonHTMLAttributes<HTMLButtonElement>> = ({ className, children, ...props }) => (
-  <button
-    className={`px-5 py-3 rounded-xl font-medium transition disabled:opacity-50 ${className ?? ""}`}
-    style={{ background: PALETTE.navy600, color: PALETTE.white }}
-    {...props}
-  >
-    {children}
-  </button>
-);
-
-const SecondaryButton: React.FC<React.ButtonHTMLAttributes<HTMLButtonElement>> = ({ className, children, ...props }) => (
-  <button
-    type={(props as any).type ?? "button"}
-    className={`px-5 py-3 rounded-xl font-medium transition disabled:opacity-50 ${className ?? ""}`}
-    style={{ background: PALETTE.gray200, color: PALETTE.text }}
-    {...props}
-  >
-    {children}
-  </button>
-);
-
-// Panel med ram och titel – för rapportens boxar
-const Panel: React.FC<{ title?: string; children: React.ReactNode; className?: string }> = ({ title, children, className }) => (
-  <div className={`rounded-lg p-4 ${className ?? ""}`} style={{ background: PALETTE.white, border: `1px solid ${PALETTE.gray400}` }}>
-    {title && <h3 className="text-lg font-semibold mb-2" style={{ color: PALETTE.navy700 }}>{title}</h3>}
-    {children}
-  </div>
-);
-
-// Högerkort: totalsumma (stor siffra) + stapel (summa vs total)
-const CategoryRightCard: React.FC<{ title: string; sum: number; total: number }> = ({ title, sum, total }) => {
-  const pct = Math.max(0, Math.min(100, (sum / total) * 100));
-  return (
-    <div className="rounded-xl p-4" style={{ background: PALETTE.white, border: `1px solid ${PALETTE.gray300}` }}>
-      <div className="text-sm font-semibold" style={{ color: PALETTE.navy700 }}>{title}</div>
-      <div className="text-3xl font-bold mt-1" style={{ color: PALETTE.text }}>{Math.round(sum)}</div>
-      <div className="mt-3 space-y-2">
-        <div className="w-full h-3 rounded" style={{ background: PALETTE.gray200 }} aria-label={`Summa ${Math.round(sum)} av ${total}`}>
-          <div className="h-3 rounded" style={{ width: pct + "%", background: PALETTE.green }} />
-        </div>
-        <div className="w-full h-3 rounded" style={{ background: PALETTE.orange, opacity: 0.85 }} />
-      </div>
-      <div className="mt-2 text-xs" style={{ color: PALETTE.gray700 }}>Summa {Math.round(sum)}/{total}</div>
-    </div>
-  );
-};
-
-// ---------- Startvy ----------
-const StartView: React.FC<{ onStart: () => void }> = ({ onStart }) => (
-  <div className="max-w-3xl mx-auto">
-    <Card>
-      <h1 className="text-3xl md:text-4xl font-bold" style={{ color: PALETTE.navy700 }}>Självskattning – Funktionellt ledarskap</h1>
-      <p className="mt-4 leading-relaxed" style={{ color: PALETTE.gray700 }}>
-        Denna självskattning hjälper dig att reflektera över tre centrala områden i funktionellt ledarskap:
-        <span className="font-medium"> aktivt lyssnande, återkoppling och målinriktning</span>. Du besvarar 20 påståenden på en 7-gradig skala.
-        Efteråt får du en personlig rapport som PDF med text och reflektion.
-      </p>
-      <div className="mt-6">
-        <PrimaryButton onClick={onStart}>Starta självskattning</PrimaryButton>
-      </div>
-    </Card>
-  </div>
-);
-
-// ---------- Frågekomponent ----------
-const Likert: React.FC<{ value?: number; onChange: (v: number) => void }> = ({ value, onChange }) => (
-  <div className="grid grid-cols-7 gap-2 mt-3">
-    {Array.from({ length: 7 }).map((_, i) => {
-      const v = i + 1;
-      const selected = value === v;
-      return (
-        <button
-          key={v}
-          type="button"
-          onClick={() => onChange(v)}
-          className={`text-sm md:text-base border rounded-lg py-2 px-1 text-center focus:outline-none`}
-          style={{
-            borderColor: selected ? PALETTE.navy600 : PALETTE.gray300,
-            boxShadow: selected ? `0 0 0 3px rgba(11, 31, 58, 0.25)` : undefined,
-            background: selected ? PALETTE.navy50 : PALETTE.white,
-          }}
-          aria-pressed={selected}
-        >
-          {v}
-        </button>
-      );
-    })}
-  </div>
-);
-
-const QuestionsView: React.FC<{ onDone: () => void }> = ({ onDone }) => {
-  const { answers, setAnswer } = useAppState();
-  const [page, setPage] = useState(0); // 0..3
-  const pageSize = 5; const totalPages = 4;
-  const items = useMemo(() => QUESTIONS.slice(page * pageSize, (page + 1) * pageSize), [page]);
-  const allOnPageAnswered = items.every(q => answers[q.id] != null);
-  const allAnswered = QUESTIONS.every(q => answers[q.id] != null);
-  return (
-    <div className="max-w-4xl mx-auto">
-      <Card>
-        <div className="flex items-center justify-between">
-          <h2 className="text-2xl font-semibold" style={{ color: PALETTE.navy700 }}>Frågor</h2>
-          <div className="text-sm" style={{ color: PALETTE.gray700 }}>Steg {page + 1} av {totalPages}</div>
-        </div>
-        <div className="w-full rounded-full h-2 mt-2" style={{ background: PALETTE.gray200 }}>
-          <div className="h-2 rounded-full" style={{ background: PALETTE.navy600, width: `${((page + 1) / totalPages) * 100}%` }} />
-        </div>
-        <ol className="mt-6 space-y-6">
-          {items.map((q) => (
-            <li key={q.id} className="border-b pb-4" style={{ borderColor: PALETTE.gray200 }}>
-              <div className="flex items-start gap-3">
-                <div className="flex-shrink-0 w-8 h-8 rounded-full flex items-center justify-center font-semibold" style={{ background: PALETTE.navy600, color: PALETTE.white }}>{q.id}</div>
-                <div className="flex-1">
-                  <p className="font-medium" style={{ color: PALETTE.text }}>{q.text}</p>
-                  <div className="mt-2 text-xs grid grid-cols-7" style={{ color: PALETTE.gray700 }}>
-                    {SCALE_LABELS.map((s, i) => (<span key={s} className={`text-center ${i===0?"text-left":""}`}>{s.split(" ")[0]}</span>))}
-                  </div>
-                  <Likert value={answers[q.id]} onChange={(v)=>setAnswer(q.id, v)} />
-                </div>
-              </div>
-            </li>
-          ))}
-        </ol>
-        <div className="mt-6 flex items-center justify-between">
-          <SecondaryButton onClick={()=>setPage(p=>Math.max(0,p-1))} disabled={page===0}>Föregående</SecondaryButton>
-          {page < totalPages - 1 ? (
-            <PrimaryButton onClick={()=>setPage(p=>Math.min(totalPages-1,p+1))} disabled={!allOnPageAnswered}>Nästa</PrimaryButton>
-          ) : (
-            <PrimaryButton onClick={onDone} disabled={!allAnswered}>Fortsätt</PrimaryButton>
-          )}
-        </div>
-      </Card>
-    </div>
-  );
-};
-
-// ---------- Kontaktformulär ----------
-const ContactForm: React.FC<{ onGenerate: (contact: Contact) => void }> = ({ onGenerate }) => {
-  const { register, handleSubmit, formState: { errors } } = useForm<Contact>({ defaultValues: { name: "", company: "", email: "" } });
-  return (
-    <div className="max-w-xl mx-auto">
-      <Card>
-        <h2 className="text-2xl font-semibold" style={{ color: PALETTE.navy700 }}>Kontaktuppgifter</h2>
-        <p className="mt-2" style={{ color: PALETTE.gray700 }}>Fyll i dina uppgifter för att generera din personliga rapport.</p>
-        <form className="mt-6 space-y-4" onSubmit={handleSubmit(onGenerate)}>
-          <div>
-            <label className="block text-sm font-medium" style={{ color: PALETTE.text }}>Namn <span style={{ color: '#DC2626' }}>*</span></label>
-            <input className="mt-1 w-full border rounded-lg px-3 py-2 focus:outline-none" style={{ borderColor: PALETTE.gray300 }} placeholder="För- och efternamn" {...register("name", { required: "Ange ditt namn" })} />
-            {errors.name && <p className="text-sm mt-1" style={{ color: '#DC2626' }}>{errors.name.message}</p>}
-          </div>
-          <div>
-            <label className="block text-sm font-medium" style={{ color: PALETTE.text }}>Företag (valfritt)</label>
-            <input className="mt-1 w-full border rounded-lg px-3 py-2 focus:outline-none" style={{ borderColor: PALETTE.gray300 }} placeholder="Organisation / Team" {...register("company")} />
-          </div>
-          <div>
-            <label className="block text-sm font-medium" style={{ color: PALETTE.text }}>E-post <span style={{ color: '#DC2626' }}>*</span></label>
-            <input type="email" className="mt-1 w-full border rounded-lg px-3 py-2 focus:outline-none" style={{ borderColor: PALETTE.gray300 }} placeholder="namn@foretag.se" {...register("email", { required: "Ange en giltig e-post", pattern: { value: /.+@.+\..+/, message: "Ogiltig e-post" } })} />
-            {errors.email && <p className="text-sm mt-1" style={{ color: '#DC2626' }}>{errors.email.message}</p>}
-          </div>
-          <div className="pt-2"><PrimaryButton type="submit">Generera rapport</PrimaryButton></div>
-        </form>
-      </Card>
-    </div>
-  );
-};
-
-// ---------- Resultat & Rapport ----------
-const ReportView: React.FC<{ contact: Contact; onRestart: () => void }> = ({ contact, onRestart }) => {
-  const [measurementId, setMeasurementId] = useState<string | null>(null);
-  const { answers } = useAppState();
-  const reportRef = useRef<HTMLDivElement | null>(null);
-  const [ctaBlocked, setCtaBlocked] = useState(false);
-  const isEmbedded = useMemo(() => { try { return window.self !== window.top; } catch { return true; } }, []);
-
-  // SUMMOR per kategori direkt från svaren
-  const sum1to7 = useMemo(() => sumRange(answers, 1, 7), [answers]);
-  const sum8to15 = useMemo(() => sumRange(answers, 8, 15), [answers]);
-  const sum16to20 = useMemo(() => sumRange(answers, 16, 20), [answers]);
-
-  // Bygg PDF och returnera Base64 + filnamn (för SharePoint-bilaga)
-  const buildPdfBase64 = async (): Promise<{ base64: string; fileName: string }> => {
-    if (!reportRef.current) throw new Error('Report root saknas');
-    const input = reportRef.current as HTMLElement;
-    input.style.background = PALETTE.eggshell;
-
-    const canvas = await html2canvas(input, { scale: 2, useCORS: true, backgroundColor: PALETTE.eggshell });
-    const imgData = canvas.toDataURL('image/png');
-    const pdf = new jsPDF({ orientation: 'portrait', unit: 'mm', format: 'a4' });
-
-    const pageWidth = pdf.internal.pageSize.getWidth();
-    const pageHeight = pdf.internal.pageSize.getHeight();
-    const imgWidth = pageWidth;
-    const imgHeight = (canvas.height * imgWidth) / canvas.width;
-
-    let position = 0;
-    let heightLeft = imgHeight;
-    pdf.addImage(imgData, 'PNG', 0, position, imgWidth, imgHeight, undefined, 'FAST');
-    heightLeft -= pageHeight;
-
-    while (heightLeft > 0) {
-      position = heightLeft - imgHeight;
-      pdf.addPage();
-      pdf.addImage(imgData, 'PNG', 0, position, imgWidth, imgHeight, undefined, 'FAST');
-      heightLeft -= pageHeight;
-    }
-
-    const fileName = `Självskattning_${contact.name.replace(/\s+/g, "_")}_${svDateFile(new Date())}.pdf`;
-    const base64 = pdf.output('datauristring').replace(/^data:application\/pdf;base64,/, '');
-    return { base64, fileName };
-  };
-
-  // Skicka rapporten (PDF) + data till Power Automate/SharePoint när rapporten visas
-  useEffect(() => {
-    (async () => {
-      try {
-        const id = generateMeasurementId();
-        setMeasurementId(id);
-        const { base64, fileName } = await buildPdfBase64();
-        await postToWebhook(
-          WEBHOOK_URL,
-          contact,
-          answers,
-          WEBHOOK_SECRET,
-          { pdfBase64: base64, fileName },
-          id
-        );
-      } catch (e) {
-        console.warn('Kunde inte skapa/skicka PDF till SharePoint:', e);
-      }
-    })();
-    // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, []);
-
-  const openBooking = () => {
-    const url = "https://link.paidsocialfunnels.com/widget/bookings/carl-fredrik";
-    setCtaBlocked(false);
-    // 1) Ny flik
-    let win: Window | null = null;
-    try { win = window.open(url, "_blank", "noopener,noreferrer"); } catch {}
-    if (win) return;
-    // 2) Översta fönstret
-    try { if (window.top) { (window.top as Window).location.href = url; return; } } catch {}
-    // 3) Osynligt ankare
-    try {
-      const a = document.createElement('a');
-      a.href = url; a.target = '_blank'; a.rel = 'noopener noreferrer';
-      document.body.appendChild(a); a.click(); document.body.removeChild(a);
-      return;
-    } catch {}
-    // 4) Visa länk att kopiera
-    setCtaBlocked(true);
-  };
-
-  return (
-    <div className="max-w-5xl mx-auto">
-      <div className="mb-4 flex justify-between items-center">
-        <div className="text-sm" style={{ color: PALETTE.gray700 }}>Genererad: {svDate()}</div>
-        <div className="flex gap-2">
-          <PrimaryButton onClick={onRestart}>Starta om</PrimaryButton>
-        </div>
-      </div>
-      
-      <Card>
-        {/* WRAPPER: allt innehåll som ska in i PDF:en */}
-        <div ref={reportRef} className="report-root font-sans p-4 rounded-xl" style={{ background: PALETTE.eggshell }}>
-          {/* Titel */}
-          <div className="rounded-lg p-4 mb-4" style={{ background: PALETTE.white, border: `1px solid ${PALETTE.gray400}` }}>
-            <h1 className="text-3xl font-bold" style={{ color: PALETTE.navy700 }}>Din rapport – Funktionellt ledarskap</h1>
-            <p style={{ color: PALETTE.gray700 }}>{svDate()}</p>
-          </div>
-
-          {/* Uppgifter */}
-          <Panel title="Uppgifter">
-            <dl>
-              <div className="flex justify-between py-1" style={{ borderBottom: `1px solid ${PALETTE.gray200}` }}><dt className="font-medium">Rubrik (Mätnings-ID)</dt><dd>{measurementId}</dd></div>
-              <div className="flex justify-between py-1" style={{ borderBottom: `1px solid ${PALETTE.gray200}` }}><dt className="font-medium">Namn</dt><dd>{contact.name}</dd></div>
-              <div className="flex justify-between py-1" style={{ borderBottom: `1px solid ${PALETTE.gray200}` }}><dt className="font-medium">Företag</dt><dd>{contact.company || "—"}</dd></div>
-              <div className="flex justify-between py-1" style={{ borderBottom: `1px solid ${PALETTE.gray200}` }}><dt className="font-medium">E-post</dt><dd>{contact.email}</dd></div>
-            </dl>
-          </Panel>
-
-          {/* Delområden */}
-          <div className="rounded-lg p-3 mt-3" style={{ background: PALETTE.white, border: `1px solid ${PALETTE.gray400}` }}>
-            <h2 className="text-xl font-bold" style={{ color: PALETTE.navy700 }}>Delområden</h2>
-          </div>
-
-          {/* Aktivt lyssnande */}
-          <div className="grid md:grid-cols-3 gap-4 items-start mt-3">
-            <div className="md:col-span-2">
-              <Panel title="Aktivt lyssnande">
-                <p style={{ color: PALETTE.gray700 }}>
-                  I dagens arbetsliv har chefens roll förändrats. Medarbetarna sitter ofta på den djupaste kompetensen och lösningarna på verksamhetens utmaningar.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  Därför är aktivt lyssnande en av chefens viktigaste färdigheter. Det handlar inte bara om att höra vad som sägs, utan om att förstå, visa intresse och använda den information du får. När du bjuder in till dialog och tar till dig medarbetarnas perspektiv visar du att deras erfarenheter är värdefulla.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  Genom att agera på det du hör – bekräfta, följa upp och omsätta idéer i handling – stärker du både engagemang, förtroende och delaktighet.
-                </p>
-              </Panel>
-            </div>
-            <CategoryRightCard title="Aktivt lyssnande" sum={sum1to7} total={49} />
-          </div>
-
-          {/* Återkoppling */}
-          <div className="grid md:grid-cols-3 gap-4 items-start mt-3">
-            <div className="md:col-span-2">
-              <Panel title="Återkoppling">
-                <p style={{ color: PALETTE.gray700 }}>
-                  Effektiv återkoppling är grunden för både utveckling och motivation. Medarbetare behöver veta vad som förväntas, hur de ligger till och hur de kan växa. När du som chef tydligt beskriver uppgifter och förväntade beteenden skapar du trygghet och fokus i arbetet.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  Återkoppling handlar sedan om närvaro och uppföljning – att se, lyssna och ge både beröm och konstruktiv feedback. Genom att tydligt lyfta fram vad som fungerar och vad som kan förbättras, förstärker du önskvärda beteenden och hjälper dina medarbetare att lyckas.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  I svåra situationer blir återkopplingen extra viktig. Att vara lugn, konsekvent och tydlig när det blåser visar ledarskap på riktigt.
-                </p>
-              </Panel>
-            </div>
-            <CategoryRightCard title="Återkoppling" sum={sum8to15} total={56} />
-          </div>
-
-          {/* Målinriktning */}
-          <div className="grid md:grid-cols-3 gap-4 items-start mt-6">
-            <div className="md:col-span-2">
-              <Panel title="Målinriktning">
-                <p style={{ color: PALETTE.gray700 }}>
-                  Målinriktat ledarskap handlar om att ge tydliga ramar – tid, resurser och ansvar – så att medarbetare kan arbeta effektivt och med trygghet. Tydliga och inspirerande mål skapar riktning och hjälper alla att förstå vad som är viktigt just nu.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  Som chef handlar det om att formulera mål som går att tro på, och att tydliggöra hur de ska nås. När du delegerar ansvar och befogenheter visar du förtroende och skapar engagemang. Målen blir då inte bara något att leverera på – utan något att vara delaktig i.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  Uppföljning är nyckeln. Genom att uppmärksamma framsteg, ge återkoppling och fira resultat förstärker du både prestation och motivation.
-                </p>
-              </Panel>
-            </div>
-            <CategoryRightCard title="Målinriktning" sum={sum16to20} total={35} />
-          </div>
-
-          {/* Nästa steg */}
-          <Panel title="Nästa steg" className="mt-8">
-            <div className="space-y-4">
-              <div className="flex flex-wrap items-center gap-2 p-2 rounded-lg" style={{ background: PALETTE.gray100, border: `1px solid ${PALETTE.gray300}` }}>
-                <span className="text-sm font-medium" style={{ color: PALETTE.navy700 }}>Sammanfattning:</span>
-                <span className="text-xs md:text-sm px-2 py-1 rounded-full" style={{ background: PALETTE.navy50, border: `1px solid ${PALETTE.navy300}`, color: PALETTE.navy700 }}>Aktivt lyssnande {Math.round(sum1to7)}/49</span>
-                <span className="text-xs md:text-sm px-2 py-1 rounded-full" style={{ background: PALETTE.navy50, border: `1px solid ${PALETTE.navy300}`, color: PALETTE.navy700 }}>Återkoppling {Math.round(sum8to15)}/56</span>
-                <span className="text-xs md:text-sm px-2 py-1 rounded-full" style={{ background: PALETTE.navy50, border: `1px solid ${PALETTE.navy300}`, color: PALETTE.navy700 }}>Målinriktning {Math.round(sum16to20)}/35</span>
-              </div>
-
-              <div>
-                <p className="font-medium" style={{ color: PALETTE.navy700 }}>Aktivt lyssnande</p>
-                <ul className="list-disc ml-6 mt-1" style={{ color: PALETTE.gray700 }}>
-                  <li><strong>Aktivt lyssnande:</strong> träna på att använda kroppsspråk, frågor och återkoppling som visar att du verkligen lyssnar.</li>
-                  <li className="mt-1"><strong>Hantera gnäll och kritik:</strong> lär dig hur du kan behålla lugnet, lyssna även i svåra samtal och styra dialogen mot lösningar.</li>
-                </ul>
-              </div>
-
-              <div>
-                <p className="font-medium" style={{ color: PALETTE.navy700 }}>Återkoppling</p>
-                <ul className="list-disc ml-6 mt-1" style={{ color: PALETTE.gray700 }}>
-                  <li><strong>Analys av beteenden i organisationen:</strong> förstå varför medarbetare agerar som de gör och hur du kan påverka beteenden konstruktivt.</li>
-                  <li className="mt-1"><strong>Positiv förstärkning genom positiv återkoppling:</strong> träna på att ge beröm och förstärka rätt beteenden.</li>
-                  <li className="mt-1"><strong>Korrigerande återkoppling:</strong> lär dig att ge kritik som leder till lärande och förbättring, inte försvar.</li>
-                </ul>
-              </div>
-
-              <div>
-                <p className="font-medium" style={{ color: PALETTE.navy700 }}>Målinriktning</p>
-                <p className="mt-1" style={{ color: PALETTE.gray700 }}>
-                  Målinriktat ledarskap handlar om att skapa riktning, struktur och tydlighet. Det betyder att formulera mål som är meningsfulla, realistiska och engagerande – och följa upp både resultat och beteenden på vägen.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>
-                  Fortsätt utvecklas genom att arbeta med:
-                </p>
-                <ul className="list-disc ml-6 mt-1" style={{ color: PALETTE.gray700 }}>
-                  <li><strong>Hantera tid utifrån prioriteringar:</strong> hitta balans mellan akuta uppgifter och långsiktiga mål.</li>
-                  <li className="mt-1"><strong>Funktionella mötesbeteenden:</strong> lär dig leda möten som skapar delaktighet och framdrift.</li>
-                  <li className="mt-1"><strong>Formulera och följa upp mål:</strong> träna på att sätta tydliga, mätbara och inspirerande mål.</li>
-                  <li className="mt-1"><strong>Funktionell problemlösning:</strong> använd mål- och lösningsfokus för att hantera hinder och skapa lärande i gruppen.</li>
-                </ul>
-              </div>
-
-              <div>
-                <p className="font-medium" style={{ color: PALETTE.navy700 }}>Självledarskap</p>
-                <p className="mt-1" style={{ color: PALETTE.gray700 }}>
-                  För att kunna använda funktionella ledarbeteenden i vardagen behöver du också kunna hantera egna tankar, känslor och fokus. Det handlar om att vara närvarande, flexibel och medveten om hur du själv påverkar ditt ledarskap.
-                </p>
-                <p className="mt-2" style={{ color: PALETTE.gray700 }}>Stärk din självinsikt genom att arbeta med:</p>
-                <ul className="list-disc ml-6 mt-1" style={{ color: PALETTE.gray700 }}>
-                  <li><strong>Flexibilitet i relation till tankar:</strong> lär dig hantera självkritiska eller begränsande tankar.</li>
-                  <li className="mt-1"><strong>Medveten närvaro:</strong> träna din förmåga att fokusera och agera med lugn och tydlighet – även under press.</li>
-                </ul>
-              </div>
-            </div>
-          </Panel>
-        </div>
-      </Card>
-
-      {/* CTA endast i rapportvyn */}
-      <div className="px-4 pb-6 text-center">
-        <button type="button" onClick={openBooking} className="inline-block px-5 py-3 rounded-xl font-medium" style={{ background: PALETTE.navy600, color: PALETTE.white, cursor: 'pointer' }}>
-          Boka Strategimöte
-        </button>
-        {ctaBlocked && (
-          <p className="mt-2 text-sm" style={{ color: PALETTE.gray700 }}>
-            Din webbläsare blockerade öppningen av länken. Kopiera och klistra in i en ny flik:
-            {' '}<a href="https://link.paidsocialfunnels.com/widget/bookings/carl-fredrik" target="_blank" rel="noopener noreferrer" style={{ color: PALETTE.navy700, textDecoration: 'underline' }}>https://link.paidsocialfunnels.com/widget/bookings/carl-fredrik</a>
-          </p>
-        )}
-      </div>
-    </div>
-  );
-};
-
-// ---------- Huvudapp ----------
-const App: React.FC = () => {
-  const { answers, reset } = useAppState();
-  const [step, setStep] = useState<"start" | "questions" | "contact" | "report">("start");
-  const [contact, setContact] = useState<Contact | null>(null);
-
-  const handleQuestionsDone = () => setStep("contact");
-
-  const calcScores = (ans: Answers): Scores => {
-    const listening = mean([1,2,3,4,5,6,7].map(i => ans[i] ?? 0));
-    const feedback  = mean([8,9,10,11,12,13,14,15].map(i => ans[i] ?? 0));
-    const goal      = mean([16,17,18,19,20].map(i => ans[i] ?? 0));
-    const total     = mean(Object.values(ans));
-    return { listening, feedback, goal, total };
-  };
-
-  // Viktigt: Vi POST:ar först när rapporten visas (då finns PDF). Ingen POST här för att undvika dubbletter.
-  const handleGenerate = async (c: Contact) => {
-    setContact(c);
-    setStep("report");
-  };
-
-  const handleRestart = () => { reset(); setContact(null); setStep("start"); };
-
-  // --- Självtester (enkla runtime-testfall) ---
-  useEffect(() => {
-    // 1) medelvärden & klassning
-    console.assert(mean([1, 1, 1]) === 1, "mean ska bli 1");
-    console.assert(classify(5.1).label === "Högt", "klassning >=5 ska vara Högt");
-    console.assert(classify(2.6).label === "Medel", "klassning 2.5–4.9 ska vara Medel");
-    console.assert(classify(1.9).label === "Lågt", "klassning <2.5 ska vara Lågt");
-
-    // 2) summeringar
-    const demo: Answers = {}; for (let i = 1; i <= 7; i++) demo[i] = 7; for (let i = 8; i <= 15; i++) demo[i] = 5; for (let i = 16; i <= 20; i++) demo[i] = 3;
-    const s1 = sumRange(demo, 1, 7); const s2 = sumRange(demo, 8, 15); const s3 = sumRange(demo, 16, 20);
-    console.assert(s1 === 49 && s2 === 40 && s3 === 15, "Summor ska bli 49/40/15");
-    console.assert(sumRange({}, 1, 7) === 0, "Tomma svar ska ge 0 i summa");
-
-    // 3) inga oklch-färger i palett/egna stilar
-    console.assert(Object.values(PALETTE).every(v => typeof v === 'string' && !v.includes('oklch')), 'Paletten får inte innehålla oklch');
-    const hasOklchInStyles = Array.from(document.querySelectorAll('style')).some(s => (s.textContent||'').includes('oklch('));
-    console.assert(!hasOklchInStyles, 'Våra egna inbäddade stilar får inte använda oklch');
-
-    // 4) procentklamp
-    const overPct = Math.max(0, Math.min(100, (60/56)*100));
-    const underPct = Math.max(0, Math.min(100, (-5/56)*100));
-    console.assert(overPct === 100, 'Procenten ska clampas till 100 vid översumma');
-    console.assert(underPct === 0, 'Procenten ska clampas till 0 vid negativ summa');
-
-    // 5) inga regex-markörer i DOM
-    const bodyHtml = document.body.innerHTML;
-    console.assert(!bodyHtml.includes('$1') && !bodyHtml.includes('$2'), 'DOM får inte innehålla $1/$2-markörer');
-
-    // 6) datumhelpers format (svDateFile ska ge 8–10 tecken inklusive bindestreck)
-    const f = svDateFile(new Date());
-    console.assert(/^\d{4}-?\d{2}-?\d{2}$/.test(f), 'svDateFile format felaktigt');
-  }, []);
-
-  return (
-    <main className="min-h-screen" style={{ background: PALETTE.eggshell, color: PALETTE.text }}>
-      <header className="max-w-5xl mx-auto px-4 py-6">
-        <h1 className="text-xl md:text-2xl font-semibold" style={{ color: PALETTE.navy700 }}>Självskattning – Funktionellt ledarskap</h1>
-      </header>
-      <section className="px-4 pb-16">
-        {step === "start" && <StartView onStart={() => setStep("questions")} />}
-        {step === "questions" && <QuestionsView onDone={handleQuestionsDone} />}
-        {step === "contact" && <ContactForm onGenerate={handleGenerate} />}
-        {step === "report" && contact && (
-          <ReportView contact={contact} onRestart={handleRestart} />
-        )}
-      </section>
-
-      {/* (CTA är flyttad till ReportView; ingen global CTA här) */}
-
-      <footer className="text-center text-xs py-8" style={{ color: PALETTE.gray700 }}>© {new Date().getFullYear()} Självskattning. Byggd med React, Tailwind, jsPDF.</footer>
-
-      {/* Tailwind helper styles for print/PDF */}
-      <style>{`
-        .report-root { font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Inter, Helvetica, Arial, "Apple Color Emoji", "Segoe UI Emoji"; }
-        @media print { .break-before-page { break-before: page; } }
-      `}</style>
-    </main>
-  );
-};
-
-// Exportera som default komponent för Canvas-förhandsvisning
-export default function WrappedApp() {
-  return (
-    <AppStateProvider>
-      <App />
-    </AppStateProvider>
-  );
-}
+"""Självskattning – Funktionellt ledarskap (Streamlit).
+
+Samma flöde som React-versionen i app.tsx: start → 20 frågor på 4 sidor →
+kontaktuppgifter → rapport. PDF:en byggs på servern med reportlab. Frågor,
+skala och rapporttexter kommer från instrumentplanen; välj ett annat
+instrument med `?instrument=<id>.v<version>` eller `FL_INSTRUMENT`.
+
+Frågesidorna och kontaktformuläret är fragment: ett klick på skalan kör bara
+om den aktuella sidan, inte hela skriptet. Planer, sidindelning och
+självtester ligger i processdelade cachar som invalideras när en
+instrumentdefinition ändras på disk.
+
+Svar, steg och sida sparas på servern (`sjalvskattning.sessions`) under en
+token i URL:en (`?session=…`); en omladdning eller omstart fortsätter där
+respondenten var.
+
+Startvyn laddar bara det lätta (Streamlit, instrumentplanen, sessioner).
+Rapport- och PDF-delen (reportlab, numpy) importeras först när den behövs;
+efter första vyn värms typsnitt och rapportmall upp i en bakgrundstråd så
+att rapportsteget inte betalar kallstarten. Se `sjalvskattning.startup`.
+
+Med `?admin=<FL_ADMIN_TOKEN>` visas en adminpanel i sidofältet, där
+processen kan profileras under en tidsperiod eller för en rapport
+(`sjalvskattning.profiler`) och flamgraf och topplista laddas ner.
+"""
+from __future__ import annotations
+
+import hmac
+import os
+import time
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from sjalvskattning import startup  # först: startar klockan
+
+import streamlit as st
+
+from sjalvskattning import metrics
+from sjalvskattning.core import Contact, run_self_tests, sv_date
+from sjalvskattning.instrument import SPEC_DIR, InstrumentError, ScoringPlan, default_plan, invalidate, plan_for_key
+from sjalvskattning.sessions import SessionStore
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+    from sjalvskattning.aggregates import AggregateStore
+    from sjalvskattning.blobstore import BlobStore
+    from sjalvskattning.columnstore import ColumnStore
+    from sjalvskattning.idempotency import IdempotencyIndex
+    from sjalvskattning.jobs import ReportPipeline
+    from sjalvskattning.outbox import DeliveryWorker
+    from sjalvskattning.percentiles import PercentileStore
+
+BOOKING_URL = "https://link.paidsocialfunnels.com/widget/bookings/carl-fredrik"
+PAGE_SIZE = 5
+ADMIN_TOKEN = os.environ.get("FL_ADMIN_TOKEN", "")
+SPEC_POLL_S = float(os.environ.get("FL_SPEC_POLL", "2"))  # hur ofta en definition kontrolleras på disk
+
+
+# ---------- Statiskt material (delat mellan sessioner) ----------
+@st.cache_resource(show_spinner=False)
+def _spec_stamps() -> Dict[str, Tuple[float, float]]:
+    return {}  # nyckel → (kontrollerad, ändringstid); delas mellan sessioner och omkörningar
+
+
+def spec_stamp(key: str) -> float:
+    """Ändringstiden för nyckelns definition; ny stämpel = ny cachenyckel.
+
+    Filen kontrolleras högst var `SPEC_POLL_S` sekund, inte vid varje klick.
+    """
+    stamps = _spec_stamps()
+    now = time.monotonic()
+    checked = stamps.get(key)
+    if checked is not None and now - checked[0] < SPEC_POLL_S:
+        return checked[1]
+    try:
+        stamp = (SPEC_DIR / f"{key}.json").stat().st_mtime
+    except OSError:
+        stamp = 0.0
+    stamps[key] = (now, stamp)
+    return stamp
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_plan(key: str, stamp: float) -> ScoringPlan:
+    # En ny stämpel betyder att definitionen ändrats: kompilera om just den från disk
+    invalidate(key)
+    return plan_for_key(key)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def question_pages(key: str, stamp: float) -> Tuple[Tuple[Tuple[int, str], ...], ...]:
+    """Frågorna indelade i sidor som (id, etikett), så att sidbyten inte skivar om katalogen."""
+    questions = load_plan(key, stamp).questions
+    return tuple(
+        tuple((q.id, f"**{q.id}.** {q.text}") for q in questions[i:i + PAGE_SIZE])
+        for i in range(0, len(questions), PAGE_SIZE)
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def self_tested() -> bool:
+    with startup.phase("self_tests"):
+        run_self_tests()
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def report_warmup() -> bool:
+    """Efter första vyn: importera rapportdelen, registrera typsnitt och bygg mallen i bakgrunden."""
+
+    def warm() -> None:
+        from sjalvskattning.report import report_template
+
+        plan = plan_for_key(os.environ.get("FL_INSTRUMENT"))
+        report_template(plan, plan.sums({}))
+        import sjalvskattning.jobs  # noqa: F401  (resten av pipelinen)
+
+    startup.warm_in_background("report_warmup", warm)
+    return True
+
+
+# ---------- Leverans (importeras först vid rapportsteget) ----------
+@st.cache_resource
+def delivery_worker() -> "DeliveryWorker":
+    """En utkorg och en leveransarbetare per process, delad mellan alla sessioner."""
+    from sjalvskattning.outbox import DeliveryWorker, Outbox
+
+    return DeliveryWorker(Outbox()).start()
+
+
+@st.cache_resource
+def blob_store() -> "BlobStore":
+    from sjalvskattning.blobstore import BlobStore
+
+    return BlobStore()
+
+
+@st.cache_resource
+def aggregate_store() -> "AggregateStore":
+    from sjalvskattning.aggregates import AggregateStore
+
+    return AggregateStore()
+
+
+@st.cache_resource
+def submission_store() -> "ColumnStore":
+    from sjalvskattning.columnstore import ColumnStore
+
+    return ColumnStore()
+
+
+@st.cache_resource
+def idempotency_index() -> "IdempotencyIndex":
+    from sjalvskattning.idempotency import IdempotencyIndex
+
+    return IdempotencyIndex()
+
+
+@st.cache_resource
+def percentile_store() -> "PercentileStore":
+    from sjalvskattning.percentiles import PercentileStore
+
+    return PercentileStore()
+
+
+@st.cache_resource
+def session_store() -> SessionStore:
+    """Delas av alla sessioner; ändringar skrivs i omgångar av en bakgrundstråd."""
+    return SessionStore().start()
+
+
+@st.cache_resource
+def metrics_endpoint() -> Optional["ThreadingHTTPServer"]:
+    """/metrics och /trace/<id> på FL_METRICS_PORT; av om variabeln saknas."""
+    port = os.environ.get("FL_METRICS_PORT")
+    if not port:
+        return None
+    outbox = delivery_worker().outbox
+    outbox_depth = metrics.gauge("fl_outbox_messages", "Meddelanden i webhook-utkorgen per tillstånd.", ("state",))
+    for state in ("pending", "inflight", "dead"):
+        outbox_depth.set_function(lambda state=state: outbox.depth()[state], state=state)
+    return metrics.serve(os.environ.get("FL_METRICS_HOST", "127.0.0.1"), int(port))
+
+
+@st.cache_resource
+def report_pipeline() -> "ReportPipeline":
+    """Rapporter renderas och levereras i bakgrunden; sessionen väntar aldrig på PDF:en."""
+    from sjalvskattning.jobs import ReportPipeline
+
+    return ReportPipeline(
+        delivery_worker().outbox,
+        blob_store(),
+        aggregate_store(),
+        submission_store(),
+        idempotency_index(),
+        percentile_store(),
+        processes=int(os.environ.get("FL_REPORT_PROCESSES", "0")),
+    )
+
+
+# ---------- State ----------
+def init_state() -> None:
+    ss = st.session_state
+    if "session" not in ss:
+        resume_session(st.query_params.get("session"))
+    # Instrumentet låses vid sessionens start så att en pågående enkät inte byter frågor
+    if "instrument" not in ss:
+        ss.instrument = requested_plan().key
+    ss.setdefault("step", "start")  # start | questions | contact | report
+    ss.setdefault("answers", {})
+    ss.setdefault("page", 0)
+    ss.setdefault("contact", None)
+    ss.setdefault("report", None)
+    if "session" not in ss:
+        ss.session = session_store().new(ss.instrument)
+        st.query_params["session"] = ss.session
+
+
+def requested_plan() -> ScoringPlan:
+    """Instrumentet från `?instrument=` eller FL_INSTRUMENT; standardinstrumentet om det inte finns."""
+    key = st.query_params.get("instrument") or os.environ.get("FL_INSTRUMENT")
+    try:
+        return plan_for_key(key)
+    except InstrumentError:
+        st.warning(f"Instrumentet {key!r} finns inte. Standardinstrumentet används.")
+        return default_plan()
+
+
+def resume_session(token: Optional[str]) -> None:
+    """Återställer svar, steg och sida från sessionslagret om token är känd."""
+    saved = session_store().load(token) if token else None
+    if saved is None:
+        return
+    try:
+        plan_for_key(saved.instrument)
+    except InstrumentError:
+        # instrumentet har tagits bort sedan sessionen startade: börja om med en ny
+        st.warning("Enkäten du påbörjade finns inte längre. Du får börja om.")
+        return
+    ss = st.session_state
+    ss.session = saved.token
+    ss.instrument = saved.instrument
+    ss.answers = dict(saved.answers)
+    ss.page = saved.page
+    # kontaktuppgifterna sparas inte: efter frågorna fortsätter man vid formuläret
+    ss.step = saved.step if saved.step in ("start", "questions") else "contact"
+
+
+def save_progress() -> None:
+    ss = st.session_state
+    session_store().save_state(ss.session, ss.instrument, ss.step, ss.page)
+
+
+def current_plan() -> ScoringPlan:
+    key = st.session_state.instrument
+    return load_plan(key, spec_stamp(key))
+
+
+def go(step: str) -> None:
+    st.session_state.step = step
+    save_progress()
+
+
+def turn_page(delta: int, total_pages: int) -> None:
+    st.session_state.page = max(0, min(total_pages - 1, st.session_state.page + delta))
+    save_progress()
+
+
+def set_answer(qid: int) -> None:
+    value = st.session_state.get(f"q{qid}")
+    if value is not None:
+        st.session_state.answers[qid] = value
+        session_store().set_answer(st.session_state.session, qid, value)
+
+
+def restart() -> None:
+    session_store().forget(st.session_state.session)
+    for q in current_plan().questions:
+        st.session_state.pop(f"q{q.id}", None)
+    for key in ("session", "answers", "page", "contact", "report"):
+        st.session_state.pop(key, None)
+    init_state()
+    go("start")
+
+
+# ---------- Startvy ----------
+def start_view(plan: ScoringPlan) -> None:
+    titles = [cat.title.lower() for cat in plan.categories]
+    areas = ", ".join(titles[:-1]) + f" och {titles[-1]}" if len(titles) > 1 else titles[0]
+    st.title(plan.title)
+    st.write(
+        f"Denna självskattning hjälper dig att reflektera över {len(titles)} centrala områden i funktionellt ledarskap: "
+        f"**{areas}**. Du besvarar {plan.n_questions} påståenden på en {len(plan.scale_values)}-gradig skala. "
+        "Efteråt får du en personlig rapport som PDF med text och reflektion."
+    )
+    st.button("Starta självskattning", type="primary", on_click=go, args=("questions",))
+
+
+# ---------- Frågor ----------
+def questions_view(plan: ScoringPlan) -> None:
+    st.subheader("Frågor")
+    question_page(plan)
+
+
+@st.fragment
+def question_page(plan: ScoringPlan) -> None:
+    """En sida med frågor; svar och sidbyten kör bara om detta fragment."""
+    answers = st.session_state.answers
+    page = st.session_state.page
+    pages = question_pages(plan.key, spec_stamp(plan.key))
+    total_pages = len(pages)
+
+    st.caption(f"Steg {page + 1} av {total_pages}")
+    st.progress((page + 1) / total_pages)
+    for qid, label in pages[page]:
+        current = answers.get(qid)
+        st.radio(
+            label,
+            options=plan.scale_values,
+            index=current - plan.scale_min if current else None,
+            format_func=lambda v: plan.scale_labels[v - plan.scale_min],
+            horizontal=True,
+            key=f"q{qid}",
+            on_change=set_answer,
+            args=(qid,),
+        )
+        st.divider()
+
+    all_on_page = all(qid in answers for qid, _ in pages[page])
+    prev_col, next_col = st.columns(2)
+    prev_col.button("Föregående", disabled=page == 0, on_click=turn_page, args=(-1, total_pages))
+    if page < total_pages - 1:
+        next_col.button("Nästa", type="primary", disabled=not all_on_page, on_click=turn_page, args=(1, total_pages))
+    elif next_col.button("Fortsätt", type="primary", disabled=not all(q.id in answers for q in plan.questions)):
+        # stegbytet gäller hela appen, inte bara fragmentet
+        go("contact")
+        st.rerun()
+
+
+# ---------- Kontaktformulär ----------
+def contact_view() -> None:
+    st.subheader("Kontaktuppgifter")
+    st.write("Fyll i dina uppgifter för att generera din personliga rapport.")
+    contact_form()
+
+
+@st.fragment
+def contact_form() -> None:
+    """Valideringsfel kör bara om formuläret; ett giltigt formulär byter steg i hela appen."""
+    with st.form("contact_form"):
+        name = st.text_input("Namn *", placeholder="För- och efternamn")
+        company = st.text_input("Företag (valfritt)", placeholder="Organisation / Team")
+        email = st.text_input("E-post *", placeholder="namn@foretag.se")
+        submitted = st.form_submit_button("Generera rapport", type="primary")
+    if not submitted:
+        return
+    errors = []
+    if not name.strip():
+        errors.append("Ange ditt namn")
+    if not email.strip():
+        errors.append("Ange en giltig e-post")
+    elif "@" not in email or "." not in email.split("@")[-1]:
+        errors.append("Ogiltig e-post")
+    for err in errors:
+        st.error(err)
+    if not errors:
+        st.session_state.contact = Contact(name=name.strip(), email=email.strip(), company=company.strip())
+        go("report")
+        st.rerun()
+
+
+# ---------- Resultat & Rapport ----------
+def ensure_report(plan: ScoringPlan, contact: Contact, answers: dict) -> dict:
+    """Köar rapporten en gång per session (inte per rerun); PDF och webhook sköts i bakgrunden."""
+    report = st.session_state.report
+    if report is None:
+        from sjalvskattning.report import report_file_name
+
+        pipeline = report_pipeline()
+        job_id = pipeline.submit(contact, answers, plan)
+        job = pipeline.get(job_id)
+        report = {"id": job_id, "pdf": None, "fileName": report_file_name(contact), "ranks": job.ranks if job else None}
+        st.session_state.report = report
+    return report
+
+
+@st.fragment(run_every=1)
+def pdf_pending(job_id: str) -> None:
+    """Frågar pipelinen varje sekund tills PDF:en finns; sedan en hel omkörning utan polling."""
+    from sjalvskattning.jobs import DEFERRED, FAILED
+
+    job = report_pipeline().get(job_id)
+    if job is not None and job.pdf is not None:
+        st.session_state.report["pdf"] = job.pdf
+        st.rerun()
+    if job is None or job.state == FAILED:
+        st.error("PDF:en kunde inte skapas.")
+        if st.button("Försök igen"):
+            st.session_state.report = None
+            st.rerun()
+        return
+    if job.state == DEFERRED:
+        st.info(
+            "Många rapporter skapas just nu. Ditt resultat visas ovan och PDF:en är köad – "
+            "den dyker upp här så snart den är klar och skickas med din inlämning."
+        )
+        return
+    st.caption("PDF:en skapas …")
+
+
+def report_view(plan: ScoringPlan) -> None:
+    contact: Contact = st.session_state.contact
+    answers = st.session_state.answers
+    report = ensure_report(plan, contact, answers)
+    sums = plan.sums(answers)
+
+    top_left, top_right = st.columns([3, 1])
+    top_left.caption(f"Genererad: {sv_date(date.today())}")
+    top_right.button("Starta om", type="primary", on_click=restart)
+
+    st.header(plan.report_title)
+    st.subheader("Uppgifter")
+    st.table({
+        "": ["Rubrik (Mätnings-ID)", "Namn", "Företag", "E-post"],
+        " ": [report["id"], contact.name, contact.company or "—", contact.email],
+    })
+
+    st.subheader("Delområden")
+    ranks = report.get("ranks")
+    if ranks:
+        st.caption(f"Percentil: hur stor andel av tidigare respondenter som har en lägre summa (totalt percentil {ranks['total']}).")
+    for cat, s in zip(plan.categories, sums):
+        text_col, card_col = st.columns([2, 1])
+        with text_col:
+            st.markdown(f"#### {cat.title}")
+            for paragraph in cat.texts:
+                st.write(paragraph)
+        with card_col:
+            st.metric(cat.title, s)
+            st.progress(max(0.0, min(1.0, s / cat.max_sum)))
+            st.caption(f"Summa {s}/{cat.max_sum}" + (f" · percentil {ranks[cat.key]}" if ranks else ""))
+
+    st.subheader("Nästa steg")
+    st.caption("Sammanfattning: " + " · ".join(f"{cat.title} {s}/{cat.max_sum}" for cat, s in zip(plan.categories, sums)))
+    for step in plan.next_steps:
+        st.markdown(f"**{step.heading}**")
+        for paragraph in step.paragraphs:
+            st.write(paragraph)
+        st.markdown("\n".join(f"- **{strong}:** {text}" for strong, text in step.bullets))
+
+    if report["pdf"] is None:
+        pdf_pending(report["id"])
+    else:
+        # nedladdningen behöver ingen omkörning av sidan
+        st.download_button(
+            "Ladda ner PDF", report["pdf"], file_name=report["fileName"], mime="application/pdf", on_click="ignore"
+        )
+    # CTA endast i rapportvyn
+    st.link_button("Boka Strategimöte", BOOKING_URL)
+
+
+# ---------- Admin ----------
+def is_admin() -> bool:
+    """Adminläge med `?admin=<FL_ADMIN_TOKEN>`; alltid av om variabeln saknas."""
+    given = st.query_params.get("admin")
+    return bool(ADMIN_TOKEN and given) and hmac.compare_digest(given.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def admin_panel() -> None:
+    with st.sidebar:
+        st.subheader("Profilering")
+        profiling_panel()
+
+
+def start_profiling(seconds: int, key: Optional[str]) -> None:
+    from sjalvskattning import profiler
+
+    until = None
+    if key is not None:
+        # pipelinen slås upp här: samplartråden har ingen Streamlit-kontext
+        pipeline = report_pipeline()
+        until = lambda k: (job := pipeline.get(k)) is not None and job.done  # noqa: E731
+    try:
+        profiler.start(seconds, key=key, until=until)
+    except (profiler.ProfilerBusy, profiler.ProfilerError) as e:
+        st.toast(str(e))
+
+
+@st.fragment
+def profiling_panel() -> None:
+    """Startar en profilering av processen och erbjuder den senaste som nedladdning."""
+    from sjalvskattning import profiler
+
+    sampler = profiler.last()
+    if sampler is not None and sampler.running:
+        profiling_progress()
+        return
+    mode = st.radio("Omfång", ["Tidsperiod", "Mätnings-ID"], horizontal=True)
+    longest = max(5, int(profiler.MAX_SECONDS))
+    seconds = st.slider("Sekunder (högst)", 5, longest, min(30, longest))
+    key = None
+    if mode == "Mätnings-ID":
+        key = st.text_input("Mätnings-ID", placeholder="tomt = nästa rapport").strip() or profiler.NEXT
+    st.button("Starta profilering", type="primary", on_click=start_profiling, args=(seconds, key))
+    if sampler is None:
+        return
+    profile = sampler.profile
+    name = f"profil-{time.strftime('%Y%m%d-%H%M%S', time.localtime(sampler.started_at))}"
+    st.text(profile.summary(10))
+    st.download_button("Flamgraf (SVG)", profile.flamegraph_svg(), f"{name}.svg", "image/svg+xml", on_click="ignore")
+    st.download_button("Kollapsade stackar", profile.collapsed(), f"{name}.collapsed", "text/plain", on_click="ignore")
+    st.download_button("Topplista", profile.summary(50), f"{name}.txt", "text/plain", on_click="ignore")
+
+
+@st.fragment(run_every=1)
+def profiling_progress() -> None:
+    from sjalvskattning import profiler
+
+    sampler = profiler.last()
+    if sampler is None or not sampler.running:
+        st.rerun()
+    profile = sampler.profile
+    target = f" · {profile.key or 'väntar på nästa rapport'}" if sampler.key else ""
+    st.caption(f"Profilerar … {time.time() - sampler.started_at:.0f} s · {profile.samples} stickprov{target}")
+    st.button("Stoppa", on_click=sampler.stop)
+
+
+# ---------- Huvudapp ----------
+def main() -> None:
+    st.set_page_config(page_title="Självskattning – Funktionellt ledarskap")
+    self_tested()
+    metrics_endpoint()
+    with startup.phase("session"):
+        init_state()
+    with startup.phase("plan"):
+        plan = current_plan()
+    step = st.session_state.step
+    if step == "start":
+        start_view(plan)
+    elif step == "questions":
+        questions_view(plan)
+    elif step == "contact":
+        contact_view()
+    elif step == "report" and st.session_state.contact:
+        report_view(plan)
+    st.caption(f"© {date.today().year} Självskattning. Byggd med Streamlit och reportlab.")
+    startup.mark("first_paint")
+    report_warmup()
+    if is_admin():
+        admin_panel()
+
+
+main()
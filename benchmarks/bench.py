@@ -0,0 +1,297 @@
+"""Prestandamätningar för poängsättning, PDF, webhook-payload och leverans.
+
+Körs helt offline (leveransen går mot stub_endpoint på 127.0.0.1) och skriver
+resultatet som JSON. Med `--baseline` jämförs varje mätvärde mot en tidigare
+körning och försämringar över tröskeln flaggas.
+
+    python -m benchmarks.bench                               # kör allt
+    python -m benchmarks.bench --only scoring,pdf --quick
+    python -m benchmarks.bench --save-baseline               # benchmarks/baseline.json
+    python -m benchmarks.bench --baseline benchmarks/baseline.json --fail-on-regression
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from sjalvskattning.blobstore import BlobRef
+from sjalvskattning.core import Contact, calc_scores, classify, sum_range
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.outbox import DeliveryWorker, Outbox
+from sjalvskattning.report import build_pdf, report_file_name
+from sjalvskattning.stub_endpoint import StubConfig, serve
+from sjalvskattning.vectorized import score_matrix
+from sjalvskattning.webhook import build_compact_payload, build_payload, encode_payload
+
+ROOT = Path(__file__).parent
+BASELINE = ROOT / "baseline.json"
+RESULTS_DIR = Path(".data/benchmarks")
+THRESHOLD = 0.20  # 20 % sämre än baslinjen räknas som regression
+DELIVERY_TIMEOUT_S = 120.0  # leveranssviten avbryts om stubben inte fått allt inom denna tid
+PDF_TIMEOUT_S = 600.0  # PDF-sviten avbryts om barnprocessen inte svarat inom denna tid
+
+CONTACT = Contact(name="Anna Andersson", email="anna@example.se", company="Exempel AB")
+MEASUREMENT_ID = "FL-20250101-120000-BNCH"
+
+Metrics = Dict[str, Dict[str, Any]]
+
+
+def _answers(rng: random.Random) -> Dict[int, int]:
+    return {q: rng.randint(1, 7) for q in range(1, 21)}
+
+
+def _metric(value: float, unit: str, better: str = "lower") -> Dict[str, Any]:
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+
+def timeit(fn: Callable[[], Any], number: int, repeat: int = 5) -> Dict[str, float]:
+    """Median och bästa tid per anrop i µs över `repeat` omgångar à `number` anrop."""
+    fn()  # uppvärmning: cacher, importer, planer
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter_ns() - start) / number / 1000)
+    return {"median": statistics.median(rounds), "best": min(rounds)}
+
+
+# ---------- Poängsättning ----------
+def bench_scoring(quick: bool) -> Metrics:
+    rng = random.Random(1)
+    answers = _answers(rng)
+    number = 2_000 if quick else 20_000
+    out: Metrics = {}
+    for name, fn in (
+        ("sum_range", lambda: sum_range(answers, 1, 7)),
+        ("calc_scores", lambda: calc_scores(answers)),
+        ("classify", lambda: classify(4.2)),
+        ("plan_sums", lambda: default_plan().sums(answers)),
+    ):
+        out[f"scoring.{name}.us"] = _metric(timeit(fn, number)["median"], "µs")
+
+    n = 10_000 if quick else 100_000
+    sets = [_answers(rng) for _ in range(n // 10)]
+    t = timeit(lambda: [calc_scores(a) for a in sets], 1, 3)["median"]
+    out["scoring.bulk_python.ns_per_row"] = _metric(t * 1000 / len(sets), "ns")
+    matrix = np.random.default_rng(1).integers(1, 8, size=(n, 20), dtype=np.int8)
+    t = timeit(lambda: score_matrix(matrix), 1, 3)["median"]
+    out["scoring.bulk_numpy.ns_per_row"] = _metric(t * 1000 / n, "ns")
+    return out
+
+
+# ---------- PDF ----------
+def _pdf_child(n: int, conn) -> None:
+    # egen process, så att topp-RSS gäller PDF-bygget och inte resten av sviten
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rng = random.Random(2)
+    build_pdf(CONTACT, _answers(rng), MEASUREMENT_ID)  # uppvärmning
+    times, sizes = [], []
+    for _ in range(n):
+        answers = _answers(rng)
+        start = time.perf_counter()
+        pdf = build_pdf(CONTACT, answers, MEASUREMENT_ID)
+        times.append(time.perf_counter() - start)
+        sizes.append(len(pdf))
+    conn.send({
+        "times": times,
+        "sizes": sizes,
+        "rss_before_kb": rss_before,
+        "rss_peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+    conn.close()
+
+
+def bench_pdf(quick: bool) -> Metrics:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_pdf_child, args=(20 if quick else 200, child))
+    proc.start()
+    child.close()  # annars ser föräldern aldrig EOF om barnet dör
+    deadline = time.monotonic() + PDF_TIMEOUT_S
+    data = None
+    try:
+        # kort poll i taget, så att en krasch (t.ex. importfel i reportlab) märks direkt
+        while not parent.poll(0.5) and proc.exitcode is None and time.monotonic() < deadline:
+            pass
+        if parent.poll():
+            data = parent.recv()
+    except EOFError:
+        pass
+    finally:
+        if data is None:
+            proc.join(5)  # ett barn som kraschat hinner avsluta sig självt
+            if proc.is_alive():
+                proc.kill()
+        proc.join()
+    if data is None:
+        raise RuntimeError(f"PDF-mätningen gav inget resultat; barnprocessens exit-status: {proc.exitcode}")
+    times = sorted(data["times"])
+    return {
+        "pdf.build.ms_p50": _metric(times[len(times) // 2] * 1000, "ms"),
+        "pdf.build.ms_p95": _metric(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, "ms"),
+        "pdf.bytes": _metric(statistics.mean(data["sizes"]), "B"),
+        "pdf.rss_peak.mb": _metric(data["rss_peak_kb"] / 1024, "MB"),
+        "pdf.rss_growth.mb": _metric((data["rss_peak_kb"] - data["rss_before_kb"]) / 1024, "MB"),
+    }
+
+
+# ---------- Webhook-payload ----------
+def bench_payload(quick: bool) -> Metrics:
+    answers = _answers(random.Random(3))
+    pdf_bytes = build_pdf(CONTACT, answers, MEASUREMENT_ID)
+    file_name = report_file_name(CONTACT)
+    number = 200 if quick else 2_000
+
+    def inline() -> bytes:
+        # som post_to_webhook: base64 i JSON-kroppen
+        pdf = {"pdfBase64": base64.b64encode(pdf_bytes).decode("ascii"), "fileName": file_name}
+        return json.dumps(build_payload(CONTACT, answers, "", pdf, MEASUREMENT_ID)).encode("utf-8")
+
+    def compact() -> bytes:
+        ref = BlobRef("0" * 64, len(pdf_bytes))
+        return encode_payload(build_compact_payload(CONTACT, answers, ref, file_name, "", MEASUREMENT_ID), True)[0]
+
+    return {
+        "payload.inline.us": _metric(timeit(inline, number)["median"], "µs"),
+        "payload.inline.bytes": _metric(len(inline()), "B"),
+        "payload.compact_gzip.us": _metric(timeit(compact, number)["median"], "µs"),
+        "payload.compact_gzip.bytes": _metric(len(compact()), "B"),
+    }
+
+
+# ---------- Leverans ----------
+def bench_delivery(quick: bool) -> Metrics:
+    server, config = serve("127.0.0.1", 0, StubConfig())
+    url = f"http://127.0.0.1:{server.server_address[1]}/invoke?sig=bench"
+    answers = _answers(random.Random(4))
+    body = json.dumps(build_payload(CONTACT, answers, "", None, MEASUREMENT_ID)).encode("utf-8")
+    n = 200 if quick else 2_000
+    outbox = Outbox(":memory:")
+    worker = DeliveryWorker(outbox, concurrency=4)
+    try:
+        for _ in range(n):
+            outbox.enqueue(url, body)
+        start = time.perf_counter()
+        worker.start()
+        deadline = start + DELIVERY_TIMEOUT_S
+        while config.received < n:
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"leveransen hann bara {config.received}/{n} meddelanden på "
+                                   f"{DELIVERY_TIMEOUT_S:.0f} s; worker: {json.dumps(worker.metrics())}")
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        metrics = worker.metrics()
+    finally:
+        worker.stop(timeout=5)
+        server.shutdown()
+    return {
+        "delivery.msgs_per_s": _metric(n / elapsed, "msg/s", "higher"),
+        "delivery.latency_p95.ms": _metric(metrics.get("latencyP95", 0.0) * 1000, "ms"),
+    }
+
+
+SUITES: Dict[str, Callable[[bool], Metrics]] = {
+    "scoring": bench_scoring,
+    "pdf": bench_pdf,
+    "payload": bench_payload,
+    "delivery": bench_delivery,
+}
+
+
+# ---------- Jämförelse ----------
+def compare(current: Metrics, baseline: Metrics, threshold: float = THRESHOLD) -> List[Dict[str, Any]]:
+    """Mätvärden som blivit mer än `threshold` sämre än baslinjen."""
+    regressions = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if not before or not before["value"]:
+            continue
+        change = (now["value"] - before["value"]) / before["value"]
+        if now.get("better") == "higher":
+            change = -change
+        if change > threshold:
+            regressions.append({"metric": name, "baseline": before["value"], "current": now["value"],
+                                "change": round(change, 3)})
+    return regressions
+
+
+def _meta() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import reportlab
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "reportlab": reportlab.Version,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kör prestandamätningarna.")
+    parser.add_argument("--only", help=f"kommaseparerat urval av {', '.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="färre iterationer, för snabb kontroll")
+    parser.add_argument("-o", "--out", type=Path, help=f"resultatfil (default: {RESULTS_DIR}/<tid>.json)")
+    parser.add_argument("--baseline", type=Path, help="jämför mot en tidigare resultatfil")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--save-baseline", action="store_true", help=f"skriv resultatet till {BASELINE}")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(SUITES)
+    unknown = set(names) - set(SUITES)
+    if unknown:
+        parser.error(f"okända sviter: {', '.join(sorted(unknown))}")
+
+    metrics: Metrics = {}
+    for name in names:
+        started = time.perf_counter()
+        metrics.update(SUITES[name](args.quick))
+        print(f"{name}: {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    result = {"meta": {**_meta(), "quick": args.quick}, "metrics": metrics}
+
+    out = args.out or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    width = max(map(len, metrics))
+    for name, m in metrics.items():
+        print(f"{name:<{width}}  {m['value']:>12,.3f} {m['unit']}")
+    print(f"→ {out}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["metrics"]
+        regressions = compare(metrics, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['metric']}: {r['baseline']} → {r['current']} (+{r['change']:.0%})", file=sys.stderr)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
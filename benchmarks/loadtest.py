@@ -0,0 +1,232 @@
+"""Lasttest: simulerade respondenter från första frågan till levererad webhook.
+
+Varje session besvarar instrumentets frågor sida för sida (med valfri
+betänketid), skickar kontaktformuläret via samma rapportpipeline som appen
+och väntar sedan, som rapportvyn, tills PDF:en finns och webhooken är
+levererad. Sessioner startar enligt en Poissonprocess med given takt; en
+`--ramp` höjer takten stegvis tills instansen mättas. Power Automate ersätts
+av stub_endpoint med inställbar latens och andel 429-svar.
+
+Streamlits egen rendering ingår inte – harnessen mäter serverarbetet bakom
+"Generera rapport", som är det som köar upp på workshopdagar.
+
+    python -m benchmarks.loadtest --rate 5 --duration 30
+    python -m benchmarks.loadtest --ramp 2,5,10,20,40 --duration 20 --latency 0.3 --rate-429 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import ScoringPlan, default_plan
+from sjalvskattning.jobs import FAILED, ReportPipeline
+from sjalvskattning.outbox import DeliveryWorker, Outbox
+from sjalvskattning.stub_endpoint import StubConfig, serve
+
+RESULTS_DIR = Path(".data/loadtest")
+PAGE_SIZE = 5
+STAGES = ("answer", "submit", "report", "delivery", "total")
+
+
+@dataclass
+class StepResult:
+    rate: float
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    timings: Dict[str, List[float]] = field(default_factory=lambda: {s: [] for s in STAGES})
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, stage_times: Dict[str, float]) -> None:
+        with self.lock:
+            self.completed += 1
+            for stage, t in stage_times.items():
+                self.timings[stage].append(t)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": round(ordered[-1] * 1000, 1)}
+
+
+# ---------- En session ----------
+def run_session(
+    pipeline: ReportPipeline,
+    plan: ScoringPlan,
+    result: StepResult,
+    rng: random.Random,
+    think: float,
+    poll: float,
+    timeout: float,
+) -> None:
+    start = time.perf_counter()
+    answers: Dict[int, int] = {}
+    for i in range(0, plan.n_questions, PAGE_SIZE):
+        for q in plan.questions[i:i + PAGE_SIZE]:
+            answers[q.id] = rng.choice(plan.scale_values)
+        plan.validate_answers(answers)
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+    answered = time.perf_counter()
+
+    n = result.started
+    contact = Contact(name=f"Deltagare {n}", email=f"deltagare{n}@example.se", company="Lasttest AB")
+    job_id = pipeline.submit(contact, answers, plan)
+    submitted = time.perf_counter()  # rapportvyn kan visas härifrån
+
+    deadline = submitted + timeout
+    job = pipeline.get(job_id)
+    while not job.done and time.perf_counter() < deadline:
+        time.sleep(poll)
+        job = pipeline.get(job_id)
+    finished = time.perf_counter()
+    if job.state == FAILED or not job.done or job.rendered_at is None:
+        with result.lock:
+            result.failed += 1
+        return
+    result.record({
+        "answer": answered - start,
+        "submit": submitted - answered,
+        # PDF-tiden tas från jobbets egna tidsstämplar, oberoende av pollintervallet
+        "report": job.rendered_at - job.submitted_at,
+        "delivery": finished - submitted,
+        "total": finished - start,
+    })
+
+
+# ---------- Ett steg med fast takt ----------
+def run_step(
+    pipeline: ReportPipeline,
+    plan: ScoringPlan,
+    rate: float,
+    duration: float,
+    max_sessions: int,
+    think: float,
+    poll: float,
+    timeout: float,
+    seed: int,
+) -> Dict[str, Any]:
+    result = StepResult(rate)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_sessions, thread_name_prefix="session") as sessions:
+        next_at = started
+        while next_at < started + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with result.lock:
+                result.started += 1
+            sessions.submit(run_session, pipeline, plan, result, random.Random(rng.random()), think, poll, timeout)
+            next_at += rng.expovariate(rate)  # Poissonankomster
+    elapsed = time.perf_counter() - started
+    throughput = result.completed / elapsed
+    return {
+        "offeredRate": rate,
+        "sessions": result.started,
+        "completed": result.completed,
+        "failed": result.failed,
+        "seconds": round(elapsed, 2),
+        "throughput": round(throughput, 2),
+        "stagesMs": {stage: percentiles(result.timings[stage]) for stage in STAGES},
+        "pipeline": pipeline.metrics(),
+        "outbox": pipeline.outbox.depth(),
+    }
+
+
+def saturated(step: Dict[str, Any], slo_ms: float) -> bool:
+    """Mättad: sessioner som misslyckas eller p95 från inskick till PDF över SLO.
+
+    Köer som växer syns som stigande PDF-latens långt innan genomströmningen
+    planar ut, så latensen är den känsliga signalen.
+    """
+    report_p95 = step["stagesMs"]["report"].get("p95", float("inf"))
+    return step["failed"] > 0 or report_p95 > slo_ms
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Lasttesta rapportflödet med simulerade respondenter.")
+    parser.add_argument("--rate", type=float, default=5.0, help="nya sessioner per sekund")
+    parser.add_argument("--ramp", help="kommaseparerade takter, t.ex. 2,5,10,20 (ersätter --rate)")
+    parser.add_argument("--duration", type=float, default=20.0, help="sekunder per steg")
+    parser.add_argument("--max-sessions", type=int, default=500, help="samtidiga sessioner")
+    parser.add_argument("--think", type=float, default=0.0, help="medelbetänketid per sida i sekunder")
+    parser.add_argument("--poll", type=float, default=0.1, help="sekunder mellan statusfrågor")
+    parser.add_argument("--timeout", type=float, default=120.0, help="max väntan per session efter inskick")
+    parser.add_argument("--slo-ms", type=float, default=2000.0, help="p95 inskick → PDF för att räknas som omättad")
+    parser.add_argument("--workers", type=int, default=2, help="rapporttrådar (som FL_REPORT_WORKERS)")
+    parser.add_argument("--processes", type=int, default=0, help="renderingsprocesser (som FL_REPORT_PROCESSES)")
+    parser.add_argument("--concurrency", type=int, default=4, help="samtidiga webhook-leveranser")
+    parser.add_argument("--latency", type=float, default=0.2, help="stubbens svarstid i sekunder")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="andel 429-svar från stubben")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--out", type=Path, help=f"resultatfil (default: {RESULTS_DIR}/<tid>.json)")
+    args = parser.parse_args(argv)
+
+    rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rate]
+    stub = StubConfig(args.latency, args.jitter, args.rate_429, args.retry_after)
+    server, _ = serve("127.0.0.1", 0, stub)
+    url = f"http://127.0.0.1:{server.server_port}/invoke?sig=loadtest"
+    outbox = Outbox(":memory:")
+    # korta backoffer: ett lasttest ska inte vänta minuter på Retry-After-kedjor
+    worker = DeliveryWorker(outbox, concurrency=args.concurrency, base_delay=0.2, max_delay=5).start()
+    pipeline = ReportPipeline(outbox, workers=args.workers, processes=args.processes, url=url, transport="inline")
+    plan = default_plan()
+
+    steps = []
+    saturation = None
+    try:
+        for i, rate in enumerate(rates):
+            step = run_step(pipeline, plan, rate, args.duration, args.max_sessions, args.think,
+                            args.poll, args.timeout, args.seed + i)
+            step["stub"] = {"received": stub.received, "throttled": stub.throttled}
+            steps.append(step)
+            stages = step["stagesMs"]
+            print(
+                f"{rate:>6.1f}/s  klara {step['completed']:>5}  fel {step['failed']:>3}  "
+                f"{step['throughput']:>6.2f}/s  PDF p95 {stages['report'].get('p95', '–')} ms  "
+                f"leverans p95 {stages['delivery'].get('p95', '–')} ms",
+                file=sys.stderr,
+            )
+            if saturated(step, args.slo_ms):
+                saturation = rate
+                break
+    finally:
+        pipeline.shutdown(wait=False)
+        worker.stop(timeout=5)
+        server.shutdown()
+
+    ok_rates = [s["offeredRate"] for s in steps if not saturated(s, args.slo_ms)]
+    summary = {
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "steps": steps,
+        "saturatedAt": saturation,
+        "maxSustainedRate": max(ok_rates) if ok_rates else None,
+    }
+    out = args.out or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Högsta hållbara takt: {summary['maxSustainedRate']} sessioner/s → {out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Självskattning – Funktionellt ledarskap: poängsättning, rapport och leverans."""
@@ -0,0 +1,176 @@
+"""Tillträdeskontroll framför rapportrenderingen och webhook-leveransen.
+
+Utan gräns startar en topp av inskick lika många samtidiga renderingar: alla
+blir långsammare och minnet växer tills instansen dödas och alla pågående
+sessioner går förlorade. Här finns två byggstenar:
+
+- `FairQueue`: en begränsad väntekö framför ett fast antal arbetare (gränsen
+  för samtidighet, se `default_limit()`). Köplatserna turas om mellan
+  nycklar (företag), FIFO inom varje nyckel, så att en workshop med femtio
+  chefer från samma företag inte tränger undan alla andra. Är kön full
+  tackar `offer()` nej och anroparen degraderar (visar poängen direkt och
+  köar PDF:en med lägre prioritet).
+- `TokenBucket`: högsta takt för utgående webhook-anrop, så att en kö som
+  töms efter ett avbrott inte strypts av flödet.
+
+    FL_REPORT_WORKERS    samtidiga renderingar (default: efter kärnor och minne)
+    FL_REPORT_QUEUE      platser i väntekön (default 8 per arbetare)
+    FL_RENDER_MEMORY_MB  minnesbudget per rendering vid storleksberäkningen (default 64)
+    FL_WEBHOOK_RATE      webhook-anrop per sekund (default 0 = ingen gräns)
+    FL_WEBHOOK_BURST     antal anrop som får gå direkt efter vila (default 10)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Generic, Optional, TypeVar
+
+from .metrics import counter, gauge
+
+T = TypeVar("T")
+
+RENDER_MEMORY_MB = float(os.environ.get("FL_RENDER_MEMORY_MB", "64"))
+WEBHOOK_RATE = float(os.environ.get("FL_WEBHOOK_RATE", "0"))
+WEBHOOK_BURST = float(os.environ.get("FL_WEBHOOK_BURST", "10"))
+
+QUEUED = gauge("fl_admission_queued", "Jobb i väntekön per pool.", ("pool",))
+ACTIVE = gauge("fl_admission_active", "Pågående jobb per pool.", ("pool",))
+REJECTED = counter("fl_admission_rejected_total", "Jobb som inte fick plats i väntekön per pool.", ("pool",))
+THROTTLED = counter("fl_ratelimit_waits_total", "Anrop som fick vänta på en token.", ("bucket",))
+THROTTLED_SECONDS = counter("fl_ratelimit_wait_seconds_total", "Sammanlagd väntan på tokens.", ("bucket",))
+
+
+# ---------- Storlek ----------
+def available_memory_mb() -> Optional[float]:
+    """Ledigt minne: det lägsta av MemAvailable och cgroup-gränsen, om de går att läsa."""
+    candidates = []
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    candidates.append(int(line.split()[1]) / 1024)
+                    break
+    except OSError:
+        pass
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        with open("/sys/fs/cgroup/memory.current") as f:
+            used = int(f.read().strip())
+        if limit != "max":
+            candidates.append((int(limit) - used) / (1024 * 1024))
+    except (OSError, ValueError):
+        pass
+    return min(candidates) if candidates else None
+
+
+def default_limit(memory_mb: float = RENDER_MEMORY_MB) -> int:
+    """Samtidiga renderingar: en per kärna, men aldrig fler än minnet räcker till."""
+    if os.environ.get("FL_REPORT_WORKERS"):
+        return max(1, int(os.environ["FL_REPORT_WORKERS"]))
+    limit = os.cpu_count() or 1
+    free = available_memory_mb()
+    if free is not None:
+        limit = min(limit, int(free // memory_mb))
+    return max(1, limit)
+
+
+def default_queue_size(limit: int) -> int:
+    return int(os.environ.get("FL_REPORT_QUEUE", str(8 * limit)))
+
+
+# ---------- Väntekö ----------
+class FairQueue(Generic[T]):
+    """Begränsad kö; `get()` tar nycklarna i tur och ordning, FIFO inom nyckeln. Trådsäker."""
+
+    def __init__(self, pool: str, maxsize: int):
+        self.pool = pool
+        self.maxsize = maxsize
+        self._queues: "OrderedDict[str, Deque[T]]" = OrderedDict()
+        self._size = 0
+        self._active = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        QUEUED.set_function(lambda: self._size, pool=pool)
+        ACTIVE.set_function(lambda: self._active, pool=pool)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def offer(self, key: str, item: T) -> bool:
+        """Lägger `item` sist i kön för `key`; False om kön är full."""
+        with self._cond:
+            if self._closed or self._size >= self.maxsize:
+                REJECTED.inc(pool=self.pool)
+                return False
+            self._queues.setdefault(key, deque()).append(item)
+            self._size += 1
+            self._cond.notify()
+        return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[T]:
+        """Nästa jobb (och räknar det som pågående till `done()`); None vid timeout eller stängd kö."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size or self._closed, timeout) or not self._size:
+                return None
+            key, queue = next(iter(self._queues.items()))
+            item = queue.popleft()
+            # nyckeln flyttas sist: nästa get() tar nästa företag
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            self._size -= 1
+            self._active += 1
+        return item
+
+    def start(self) -> None:
+        """Räknar ett jobb som inte kom via kön (t.ex. ett uppskjutet) som pågående."""
+        with self._cond:
+            self._active += 1
+
+    def done(self) -> None:
+        with self._cond:
+            self._active -= 1
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# ---------- Takt ----------
+class TokenBucket:
+    """`rate` tokens per sekund, högst `burst` sparade. `rate <= 0` betyder ingen gräns."""
+
+    def __init__(self, name: str, rate: float, burst: float = 1.0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Tar en token (kan bli skuld); returnerar hur länge anroparen ska vänta."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """Väntar på en token; False om `stop` sattes under väntan."""
+        if self.rate <= 0:
+            return True
+        wait_s = self._reserve()
+        if wait_s <= 0:
+            return True
+        THROTTLED.inc(bucket=self.name)
+        THROTTLED_SECONDS.inc(wait_s, bucket=self.name)
+        if stop is not None:
+            return not stop.wait(wait_s)
+        time.sleep(wait_s)
+        return True
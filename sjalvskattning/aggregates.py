@@ -0,0 +1,363 @@
+"""Löpande kohortstatistik per företag, tidsperiod och instrumentversion.
+
+Varje inlämning uppdaterar ett fast stort tillstånd för sin kohort (företag,
+månad, instrument) i O(1): histogram per fråga över skalans värden,
+Welford-medel/varians per kategori och totalt, samt antal per klassning.
+Tillstånden materialiseras i SQLite så att dashboards och exporter läser
+färdiga aggregat i stället för att räkna om alla rådata. Kohorter över flera
+månader slås ihop med Chans parallella variansformel.
+
+    python -m sjalvskattning.aggregates show --company "Acme AB"
+    python -m sjalvskattning.aggregates export > kohorter.csv
+    python -m sjalvskattning.aggregates ingest inlamningar.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from .core import Answers, Contact, answers_from_row, measurement_id_from_row
+from .instrument import ScoringPlan, plan_for_key, plan_for_row
+
+DEFAULT_DB = os.environ.get("FL_AGGREGATES_DB", ".data/aggregates.sqlite3")
+NO_COMPANY = "(inget företag)"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cohort (
+    company TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (company, bucket, instrument)
+);
+CREATE TABLE IF NOT EXISTS counted (
+    measurement_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+class CohortKey(NamedTuple):
+    company: str
+    bucket: str      # YYYY-MM
+    instrument: str  # plan.key, t.ex. funktionellt-ledarskap.v1
+
+
+def company_key(company: str) -> str:
+    """Samma företag med olika blanksteg ska hamna i samma kohort."""
+    return " ".join(company.split()) or NO_COMPANY
+
+
+def time_bucket(at: Optional[float] = None) -> str:
+    return datetime.fromtimestamp(time.time() if at is None else at).strftime("%Y-%m")
+
+
+# ---------- Löpande statistik ----------
+@dataclass
+class Welford:
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other: "Welford") -> None:
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def variance(self) -> float:
+        """Stickprovsvarians (n − 1); 0 för färre än två värden."""
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+@dataclass
+class CohortStats:
+    """Aggregat för en kohort. Storleken beror bara på instrumentet, inte på n."""
+
+    n: int = 0
+    histogram: List[List[int]] = field(default_factory=list)  # fråga × skalvärde
+    scores: Dict[str, Welford] = field(default_factory=dict)  # kategori-nyckel + "total"
+    bands: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    first_at: Optional[float] = None
+    last_at: Optional[float] = None
+
+    @classmethod
+    def empty(cls, plan: ScoringPlan) -> "CohortStats":
+        width = len(plan.scale_values)
+        keys = [cat.key for cat in plan.categories] + ["total"]
+        return cls(
+            histogram=[[0] * width for _ in plan.questions],
+            scores={k: Welford() for k in keys},
+            bands={k: {} for k in keys},
+        )
+
+    def add(self, answers: Answers, plan: ScoringPlan, at: Optional[float] = None) -> None:
+        for q, v in answers.items():
+            if v is not None:
+                self.histogram[q - 1][v - plan.scale_min] += 1
+        # samma medelvärden och klassning som rapporten visar
+        for key, score in plan.mean_scores(answers).items():
+            self.scores[key].add(score)
+            label = plan.classify(score).label
+            self.bands[key][label] = self.bands[key].get(label, 0) + 1
+        self.n += 1
+        at = time.time() if at is None else at
+        self.first_at = at if self.first_at is None else min(self.first_at, at)
+        self.last_at = at if self.last_at is None else max(self.last_at, at)
+
+    def merge(self, other: "CohortStats") -> None:
+        if not self.histogram:
+            self.histogram = [row[:] for row in other.histogram]
+        else:
+            for mine, theirs in zip(self.histogram, other.histogram):
+                for i, c in enumerate(theirs):
+                    mine[i] += c
+        for key, w in other.scores.items():
+            self.scores.setdefault(key, Welford()).merge(w)
+        for key, counts in other.bands.items():
+            mine = self.bands.setdefault(key, {})
+            for label, c in counts.items():
+                mine[label] = mine.get(label, 0) + c
+        self.n += other.n
+        self.first_at = min(filter(None, (self.first_at, other.first_at)), default=None)
+        self.last_at = max(filter(None, (self.last_at, other.last_at)), default=None)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "n": self.n,
+            "histogram": self.histogram,
+            "scores": {k: [w.n, w.mean, w.m2] for k, w in self.scores.items()},
+            "bands": self.bands,
+            "firstAt": self.first_at,
+            "lastAt": self.last_at,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CohortStats":
+        data = json.loads(raw)
+        return cls(
+            n=data["n"],
+            histogram=data["histogram"],
+            scores={k: Welford(*v) for k, v in data["scores"].items()},
+            bands=data["bands"],
+            first_at=data.get("firstAt"),
+            last_at=data.get("lastAt"),
+        )
+
+    def summary(self, plan: ScoringPlan) -> Dict[str, Any]:
+        """Medel, standardavvikelse och klassning per kategori samt frågefördelningar."""
+        titles = {cat.key: cat.title for cat in plan.categories}
+        titles["total"] = "Totalt"
+        labels = [band.label for _, band in plan.bands]
+        return {
+            "n": self.n,
+            "categories": [
+                {
+                    "key": key,
+                    "title": titles.get(key, key),
+                    "mean": round(w.mean, 3),
+                    "std": round(w.std, 3),
+                    "bands": {label: self.bands.get(key, {}).get(label, 0) for label in labels},
+                }
+                for key, w in self.scores.items()
+            ],
+            "questions": [
+                {"id": q.id, "counts": counts, "mean": _hist_mean(counts, plan.scale_min)}
+                for q, counts in zip(plan.questions, self.histogram)
+            ],
+        }
+
+
+def _hist_mean(counts: List[int], scale_min: int) -> Optional[float]:
+    total = sum(counts)
+    if not total:
+        return None
+    return round(sum((scale_min + i) * c for i, c in enumerate(counts)) / total, 3)
+
+
+# ---------- Materialiserade aggregat ----------
+class AggregateStore:
+    """SQLite-backade kohortaggregat. Trådsäker; en anslutning skyddad av ett lås."""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        contact: Contact,
+        answers: Answers,
+        plan: ScoringPlan,
+        measurement_id: Optional[str] = None,
+        at: Optional[float] = None,
+    ) -> bool:
+        """Lägger till en inlämning; False om mätnings-ID:t redan är räknat."""
+        plan.validate_answers(answers)
+        at = time.time() if at is None else at
+        key = CohortKey(company_key(contact.company), time_bucket(at), plan.key)
+        with self._lock:
+            # IMMEDIATE tar skrivlåset direkt så att parallella processer inte tappar uppdateringar
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if measurement_id is not None:
+                    cur = self._db.execute(
+                        "INSERT OR IGNORE INTO counted (measurement_id) VALUES (?)", (measurement_id,)
+                    )
+                    if not cur.rowcount:
+                        self._db.execute("ROLLBACK")
+                        return False
+                row = self._db.execute(
+                    "SELECT state FROM cohort WHERE company = ? AND bucket = ? AND instrument = ?", key
+                ).fetchone()
+                stats = CohortStats.from_json(row[0]) if row else CohortStats.empty(plan)
+                stats.add(answers, plan, at)
+                self._db.execute(
+                    "INSERT INTO cohort (company, bucket, instrument, n, state, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (company, bucket, instrument)"
+                    " DO UPDATE SET n = excluded.n, state = excluded.state, updated_at = excluded.updated_at",
+                    (*key, stats.n, stats.to_json(), time.time()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return True
+
+    def cohorts(self, company: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Alla kohorter (företag, månad, instrument) med antal svar."""
+        sql = "SELECT company, bucket, instrument, n FROM cohort"
+        params: tuple = ()
+        if company is not None:
+            sql += " WHERE company = ?"
+            params = (company_key(company),)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY company, bucket, instrument", params).fetchall()
+        return [dict(zip(("company", "bucket", "instrument", "n"), r)) for r in rows]
+
+    def get(
+        self,
+        instrument: str,
+        company: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> CohortStats:
+        """Sammanslagna aggregat för ett instrument, valfritt per företag och månadsintervall (YYYY-MM)."""
+        sql = "SELECT state FROM cohort WHERE instrument = ?"
+        params: List[Any] = [instrument]
+        if company is not None:
+            sql += " AND company = ?"
+            params.append(company_key(company))
+        if since:
+            sql += " AND bucket >= ?"
+            params.append(since)
+        if until:
+            sql += " AND bucket <= ?"
+            params.append(until)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        merged = CohortStats()
+        for (state,) in rows:
+            merged.merge(CohortStats.from_json(state))
+        return merged
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# ---------- Export ----------
+def export_rows(store: AggregateStore) -> Iterable[Dict[str, Any]]:
+    """En rad per kohort och kategori, för Excel/Power BI."""
+    for cohort in store.cohorts():
+        plan = plan_for_key(cohort["instrument"])
+        stats = store.get(cohort["instrument"], cohort["company"], cohort["bucket"], cohort["bucket"])
+        for cat in stats.summary(plan)["categories"]:
+            yield {
+                "company": cohort["company"],
+                "bucket": cohort["bucket"],
+                "instrument": cohort["instrument"],
+                "n": stats.n,
+                "category": cat["title"],
+                "mean": cat["mean"],
+                "std": cat["std"],
+                **cat["bands"],
+            }
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kohortaggregat per företag, månad och instrument.")
+    parser.add_argument("command", choices=("show", "export", "ingest"))
+    parser.add_argument("source", nargs="?", type=Path, help="CSV/JSONL med inlämningar (ingest)")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"sökväg till aggregaten (default: {DEFAULT_DB})")
+    parser.add_argument("--company")
+    parser.add_argument("--instrument", help="t.ex. funktionellt-ledarskap.v1 (default: standard)")
+    parser.add_argument("--since", help="första månad, YYYY-MM")
+    parser.add_argument("--until", help="sista månad, YYYY-MM")
+    args = parser.parse_args(argv)
+
+    store = AggregateStore(args.db)
+    if args.command == "show":
+        plan = plan_for_key(args.instrument)
+        stats = store.get(plan.key, args.company, args.since, args.until)
+        print(json.dumps(stats.summary(plan), ensure_ascii=False, indent=2))
+        return 0
+    if args.command == "export":
+        rows = list(export_rows(store))
+        if rows:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]), extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        return 0
+
+    if args.source is None:
+        parser.error("ingest kräver en källfil")
+    from .batch import read_submissions
+
+    added = skipped = 0
+    for row in read_submissions(args.source):
+        submitted = row.get("submittedAt")
+        at = datetime.fromisoformat(submitted.replace("Z", "+00:00")).timestamp() if submitted else None
+        contact = Contact(name=row.get("name", ""), email=row.get("email", ""), company=row.get("company") or "")
+        if store.record(contact, answers_from_row(row), plan_for_row(row), measurement_id_from_row(row), at):
+            added += 1
+        else:
+            skipped += 1
+    print(f"{added} inlämningar tillagda, {skipped} redan räknade", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
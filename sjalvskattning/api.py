@@ -0,0 +1,264 @@
+"""Tillståndslöst HTTP-API för poängsättning och rapport (ASGI, utan ramverk).
+
+För LMS och andra system som bara vill posta svar, utan en Streamlit-session
+per respondent:
+
+    POST /score   {"instrument"?: "id.vN", "answers": {"1": 5, …}}
+                  → summor, medelvärden och nivå per kategori (Scores/classify),
+                    percentilrang när alla frågor är besvarade
+    POST /report  {"instrument"?, "answers", "contact": {"name", "email", "company"?}}
+                  → application/pdf, mätnings-ID i X-Measurement-Id
+    GET  /health
+
+Varje anrop räknas enbart från kroppen och instrumentplanen (som läses från
+disk och cachas per process), så inget delas i minnet mellan processer och
+API:t skalar med antalet arbetsprocesser. Mätnings-ID:n delas via
+tillståndsfilen i ids.py. Percentilrangerna läses, skrivskyddat, ur appens
+fördelningar (percentiles.py, `FL_API_PERCENTILES_DB`; tomt = inga rangordningar)
+om filen finns. Inget lagras och ingen webhook skickas; anroparen får
+PDF:en. Med `FL_API_KEY` satt krävs `Authorization: Bearer <nyckel>`.
+
+    python -m sjalvskattning.api --workers 4 --port 8000
+    uvicorn sjalvskattning.api:app --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import hmac
+import io
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+from .core import Answers, Contact, answer_value, generate_measurement_id
+from .instrument import InstrumentError, ScoringPlan, default_plan, plan_for_key
+from .percentiles import DEFAULT_DB as PERCENTILES_DEFAULT_DB
+from .percentiles import PercentileStore
+from .report import report_file_name, report_template, write_pdf
+
+API_KEY = os.environ.get("FL_API_KEY", "")
+PERCENTILES_DB = os.environ.get("FL_API_PERCENTILES_DB", PERCENTILES_DEFAULT_DB)
+MAX_BODY = 64 * 1024
+CHUNK = 64 * 1024
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+_percentiles: Optional[PercentileStore] = None
+_percentiles_opened = False
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- Tolkning ----------
+def _plan(body: Mapping[str, Any]) -> ScoringPlan:
+    key = body.get("instrument")
+    if key is not None and not isinstance(key, str):
+        raise ApiError(422, "instrument ska vara en sträng, t.ex. \"funktionellt-ledarskap.v1\"")
+    try:
+        return plan_for_key(key)
+    except (InstrumentError, ValueError) as e:
+        raise ApiError(422, str(e))
+
+
+def _answers(body: Mapping[str, Any], plan: ScoringPlan, complete: bool) -> Answers:
+    raw = body.get("answers")
+    if not isinstance(raw, dict):
+        raise ApiError(422, "answers ska vara ett objekt {frågenummer: svar}")
+    try:
+        answers = {int(k): answer_value(v) for k, v in raw.items() if v is not None}
+        plan.validate_answers(answers)
+    except (InstrumentError, ValueError, TypeError) as e:
+        raise ApiError(422, str(e))
+    missing = [q.id for q in plan.questions if q.id not in answers]
+    if complete and missing:
+        raise ApiError(422, f"Obesvarade frågor: {', '.join(map(str, missing))}")
+    return answers
+
+
+def _contact(body: Mapping[str, Any]) -> Contact:
+    raw = body.get("contact")
+    if not isinstance(raw, dict):
+        raise ApiError(422, "contact ska vara ett objekt {name, email, company?}")
+    name, email = str(raw.get("name") or "").strip(), str(raw.get("email") or "").strip()
+    if not name:
+        raise ApiError(422, "Ange namn")
+    if "@" not in email or "." not in email.split("@")[-1]:
+        raise ApiError(422, "Ogiltig e-post")
+    return Contact(name=name, email=email, company=str(raw.get("company") or "").strip())
+
+
+def percentile_ranks(plan: ScoringPlan, answers: Answers) -> Optional[Dict[str, int]]:
+    """Rang mot tidigare respondenter; bara för kompletta svar (delsummor går inte att jämföra)."""
+    if len(answers) < plan.n_questions:
+        return None
+    store = _percentile_store()
+    return store.ranks(plan, plan.sums(answers)) if store is not None else None
+
+
+def use_percentiles(store: Optional[PercentileStore]) -> None:
+    """Sätter fördelningarna som rangen läses ur; None stänger av percentilrangerna."""
+    global _percentiles, _percentiles_opened
+    _percentiles, _percentiles_opened = store, True
+
+
+def _percentile_store() -> Optional[PercentileStore]:
+    # öppnas skrivskyddat första gången; API:t skapar aldrig någon fil
+    global _percentiles, _percentiles_opened
+    if not _percentiles_opened:
+        _percentiles_opened = True
+        if PERCENTILES_DB and os.path.exists(PERCENTILES_DB):
+            _percentiles = PercentileStore(PERCENTILES_DB, read_only=True)
+    return _percentiles
+
+
+def score(plan: ScoringPlan, answers: Answers, ranks: Optional[Mapping[str, int]] = None) -> Dict[str, Any]:
+    """Samma tal som rapporten: summor, medel, nivå och (med `ranks`) percentil per kategori samt totalt."""
+    means = plan.mean_scores(answers)
+    categories = [
+        {
+            "key": cat.key,
+            "title": cat.title,
+            "sum": s,
+            "max": cat.max_sum,
+            "mean": means[cat.key],
+            "band": plan.classify(means[cat.key]).label,
+            "percentile": ranks[cat.key] if ranks else None,
+        }
+        for cat, s in zip(plan.categories, plan.sums(answers))
+    ]
+    return {
+        "instrument": plan.key,
+        "answered": len(answers),
+        "questions": plan.n_questions,
+        "categories": categories,
+        "total": {
+            "mean": means["total"],
+            "band": plan.classify(means["total"]).label,
+            "percentile": ranks["total"] if ranks else None,
+        },
+    }
+
+
+# ---------- ASGI ----------
+async def _read_body(receive: Receive) -> Dict[str, Any]:
+    chunks: List[bytes] = []
+    size = 0
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ApiError(400, "Anslutningen stängdes")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            raise ApiError(413, f"Kroppen får vara högst {MAX_BODY} byte")
+        chunks.append(chunk)
+        more = message.get("more_body", False)
+    try:
+        body = json.loads(b"".join(chunks) or b"{}")
+    except ValueError:
+        raise ApiError(400, "Kroppen är inte giltig JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Kroppen ska vara ett JSON-objekt")
+    return body
+
+
+async def _send(send: Send, status: int, body: Union[bytes, memoryview], content_type: str, headers: Sequence[Tuple[bytes, bytes]] = ()) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    # i bitar, så att en stor PDF inte skickas som ett enda ASGI-meddelande
+    for i in range(0, max(len(body), 1), CHUNK):
+        await send({"type": "http.response.body", "body": bytes(body[i:i + CHUNK]), "more_body": i + CHUNK < len(body)})
+
+
+async def _send_json(send: Send, status: int, data: Any) -> None:
+    await _send(send, status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+
+def _authorized(scope: Scope) -> bool:
+    if not API_KEY:
+        return True
+    headers = dict(scope.get("headers") or ())
+    return hmac.compare_digest(headers.get(b"authorization", b""), b"Bearer " + API_KEY.encode("utf-8"))
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # varje arbetsprocess bygger planen och rapportmallen innan den tar trafik
+            plan = default_plan()
+            report_template(plan, plan.sums({}))
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    path, method = scope["path"].rstrip("/") or "/", scope["method"]
+    try:
+        if path == "/health":
+            await _send_json(send, 200, {"ok": True})
+            return
+        if path not in ("/score", "/report"):
+            raise ApiError(404, "Okänd sökväg")
+        if method != "POST":
+            raise ApiError(405, "Använd POST")
+        if not _authorized(scope):
+            raise ApiError(401, "Saknar eller fel API-nyckel")
+        body = await _read_body(receive)
+        plan = _plan(body)
+        if path == "/score":
+            answers = _answers(body, plan, complete=False)
+            await _send_json(send, 200, score(plan, answers, percentile_ranks(plan, answers)))
+            return
+        answers, contact = _answers(body, plan, complete=True), _contact(body)
+        measurement_id = generate_measurement_id()
+        # ~1 ms CPU: körs direkt i stället för i en trådpool; parallellism ges av arbetsprocesserna
+        pdf = io.BytesIO()
+        ranks = percentile_ranks(plan, answers)
+        write_pdf(contact, answers, measurement_id, pdf, plan=plan,
+                  ranks=[ranks[cat.key] for cat in plan.categories] if ranks else None)
+        file_name = report_file_name(contact)
+        await _send(send, 200, pdf.getbuffer(), "application/pdf", [
+            (b"content-disposition", f"attachment; filename*=UTF-8''{quote(file_name)}".encode("ascii")),
+            (b"x-measurement-id", measurement_id.encode("ascii")),
+        ])
+    except ApiError as e:
+        await _send_json(send, e.status, {"error": str(e)})
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.api", description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:  # pragma: no cover
+        ap.error("uvicorn saknas (pip install uvicorn)")
+    uvicorn.run("sjalvskattning.api:app", host=args.host, port=args.port, workers=args.workers, access_log=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,185 @@
+"""Batchgenerering av rapporter för hela kohorter.
+
+Läser inlämningar (samma fält som webhook-payloaden: name, company, email,
+answersJson och valfritt title som mätnings-ID samt instrument som
+"<id>.v<version>") från CSV eller JSONL och
+renderar PDF:erna parallellt i en processpool. Varje arbetare skriver sin PDF
+direkt till disk, så huvudprocessen håller bara ett begränsat antal batcher i
+luften oavsett filens storlek. PDF:en heter `<mätnings-ID>.pdf`; en rad vars
+mätnings-ID redan förekommit i filen avvisas i manifestet i stället för att
+skriva över den första rapporten.
+
+    python -m sjalvskattning.batch inlamningar.jsonl -o rapporter/
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .core import Contact, answers_from_row, generate_measurement_id, measurement_id_from_row
+from .instrument import plan_for_row
+from .report import report_file_name, write_pdf
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16
+
+
+# ---------- Inläsning ----------
+def read_submissions(path: Path) -> Iterator[Dict[str, Any]]:
+    """Strömmar rader ur en CSV- eller JSONL-fil (avgörs av filändelsen)."""
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# ---------- Arbetare ----------
+def render_chunk(rows: List[Dict[str, Any]], out_dir: str) -> List[Dict[str, Any]]:
+    """Körs i arbetsprocessen: renderar och skriver PDF:er, returnerar bara metadata."""
+    results = []
+    for row in rows:
+        try:
+            contact = Contact(name=row["name"], email=row["email"], company=row.get("company") or "")
+            answers = answers_from_row(row)
+            plan = plan_for_row(row)
+            plan.validate_answers(answers)
+            measurement_id = measurement_id_from_row(row) or generate_measurement_id()
+            path = Path(out_dir) / f"{measurement_id}.pdf"
+            if path.resolve().parent != Path(out_dir).resolve():
+                raise ValueError(f"Mätnings-ID:t {measurement_id!r} pekar ut ur målkatalogen")
+            with open(path, "wb") as f:
+                n_bytes = write_pdf(contact, answers, measurement_id, f, plan=plan)
+            result = {
+                "id": measurement_id,
+                "instrument": plan.key,
+                "email": contact.email,
+                "fileName": report_file_name(contact),
+                "path": str(path),
+                "bytes": n_bytes,
+            }
+            result.update({cat.payload_field: s for cat, s in zip(plan.categories, plan.sums(answers))})
+            results.append(result)
+        except Exception as e:  # en trasig rad ska inte stoppa hela kohorten
+            results.append({"id": row.get("title"), "email": row.get("email"), "error": repr(e)})
+    return results
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _duplicates(rows: Iterable[Dict[str, Any]], seen: Set[str], rejected: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Släpper igenom rader vars angivna mätnings-ID inte setts förut; övriga hamnar i `rejected`.
+
+    Genererade ID:n är unika, så bara rader med `measurementId`/`title` minns.
+    Rader med ogiltigt mätnings-ID avvisas också här.
+    """
+    for row in rows:
+        try:
+            measurement_id = measurement_id_from_row(row)
+        except ValueError as e:
+            rejected.append({"id": row.get("measurementId") or row.get("title"), "email": row.get("email"), "error": str(e)})
+            continue
+        if measurement_id is None:
+            yield row
+        elif measurement_id in seen:
+            rejected.append({
+                "id": measurement_id, "email": row.get("email"),
+                "error": f"Mätnings-ID:t {measurement_id} förekommer redan i filen",
+            })
+        else:
+            seen.add(measurement_id)
+            yield row
+
+
+# ---------- Körning ----------
+def run_batch(
+    source: Path,
+    out_dir: Path,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Renderar alla inlämningar i `source` och skriver manifest.jsonl i `out_dir`."""
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2  # begränsar minnet: högst så många batcher väntar
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ok = failed = total_bytes = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, (out_dir / "manifest.jsonl").open("w", encoding="utf-8") as manifest:
+        pending: Set[Future] = set()
+        rejected: List[Dict[str, Any]] = []
+
+        def write(results: Iterable[Dict[str, Any]]) -> None:
+            nonlocal ok, failed, total_bytes
+            for result in results:
+                manifest.write(json.dumps(result, ensure_ascii=False) + "\n")
+                if "error" in result:
+                    failed += 1
+                    log.warning("Kunde inte skapa rapport för %s: %s", result["email"], result["error"])
+                else:
+                    ok += 1
+                    total_bytes += result["bytes"]
+
+        def drain() -> None:
+            done, rest = wait(pending, return_when=FIRST_COMPLETED)
+            pending.intersection_update(rest)
+            for fut in done:
+                write(fut.result())
+
+        for chunk in _chunks(_duplicates(read_submissions(source), set(), rejected), chunk_size):
+            write(rejected)
+            rejected.clear()
+            if len(pending) >= max_in_flight:
+                drain()
+            pending.add(pool.submit(render_chunk, chunk, str(out_dir)))
+        write(rejected)
+        while pending:
+            drain()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "reports": ok,
+        "failed": failed,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 3),
+        "reportsPerSecond": round(ok / elapsed, 1) if elapsed else 0.0,
+        "workers": workers,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generera PDF-rapporter för en hel kohort.")
+    parser.add_argument("source", type=Path, help="CSV- eller JSONL-fil med inlämningar")
+    parser.add_argument("-o", "--out", type=Path, default=Path("rapporter"), help="målkatalog (default: rapporter/)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="antal processer (default: antal kärnor)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rader per uppgift till arbetarna")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    stats = run_batch(args.source, args.out, args.workers, args.chunk_size)
+    print(
+        f"{stats['reports']} rapporter ({stats['failed']} fel) på {stats['seconds']} s "
+        f"– {stats['reportsPerSecond']} rapporter/s med {stats['workers']} processer",
+        file=sys.stderr,
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Innehållsadresserad lagring av rapport-PDF:er.
+
+PDF:en sparas en gång under sin SHA-256 och webhooken bär bara en referens.
+Samma PDF som skickas igen (omförsök, omladdning) hamnar på samma nyckel och
+skrivs inte en gång till.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_ROOT = os.environ.get("FL_BLOB_ROOT", ".data/blobs")
+BASE_URL = os.environ.get("FL_BLOB_BASE_URL", "")  # t.ex. https://rapporter.example.se/blobs/
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    sha256: str
+    size: int
+    url: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        ref = {"sha256": self.sha256, "size": self.size}
+        if self.url:
+            ref["url"] = self.url
+        return ref
+
+
+class BlobStore:
+    def __init__(self, root: str = DEFAULT_ROOT, base_url: str = BASE_URL, suffix: str = ".pdf"):
+        self.root = Path(root)
+        self.base_url = base_url
+        self.suffix = suffix
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}{self.suffix}"
+
+    def url(self, sha256: str) -> Optional[str]:
+        return f"{self.base_url}{sha256}{self.suffix}" if self.base_url else None
+
+    def put(self, data: bytes) -> BlobRef:
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.path(sha)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # skriv till temporär fil och byt namn atomärt – en halv blob syns aldrig
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        return BlobRef(sha, len(data), self.url(sha))
+
+    def get(self, sha256: str) -> bytes:
+        return self.path(sha256).read_bytes()
+
+    def exists(self, sha256: str) -> bool:
+        return self.path(sha256).exists()
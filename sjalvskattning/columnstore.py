@@ -0,0 +1,350 @@
+"""Kompakt, kolumnvis lagring av inlämningar i minnesmappade filer.
+
+I stället för ~200 byte JSON per respondent lagras varje inlämning som rader
+med fast bredd i separata kolumnfiler, en katalog (partition) per
+instrumentversion:
+
+    <root>/<instrument>/meta.json     schema, packning, antal frågor
+    <root>/<instrument>/answers.i1    N×frågor int8 (0 = obesvarad) – eller
+    <root>/<instrument>/answers.u4    N×⌈frågor/2⌉ uint8, två svar per byte
+    <root>/<instrument>/ts.i8         int64, millisekunder sedan epoch
+    <root>/<instrument>/id.s24        mätnings-ID, 24 byte ASCII
+    <root>/<instrument>/company.u4    uint32-kod i companies.txt
+
+Filerna är append-only och läses med `np.memmap`, så en skanning över
+miljontals inlämningar matas rakt in i `score_matrix` utan kopiering. Ett
+nytt instrument (eller en ny version) får en egen partition med egen
+`meta.json`; gamla filer skrivs aldrig om.
+
+    python -m sjalvskattning.columnstore ingest inlamningar.jsonl
+    python -m sjalvskattning.columnstore stats
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .aggregates import company_key
+from .core import Answers, Contact, answers_from_row, measurement_id_from_row
+from .instrument import ScoringPlan, plan_for_key, plan_for_row
+from .vectorized import BulkScores, score_matrix
+
+try:  # låset mellan processer finns bara på POSIX
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+DEFAULT_ROOT = os.environ.get("FL_COLUMNSTORE_ROOT", ".data/submissions")
+SCHEMA_VERSION = 1
+ID_WIDTH = 24
+
+_TS, _ID, _COMPANY = ("ts.i8", np.int64), ("id.s24", f"S{ID_WIDTH}"), ("company.u4", np.uint32)
+
+
+class ColumnStoreError(ValueError):
+    """Fel i kolumnlagringen (okänt schema, för långt ID, fel instrument …)."""
+
+
+@dataclass
+class Columns:
+    """Minnesmappade kolumner för en partition. Arrayerna är skrivskyddade vyer."""
+
+    plan: ScoringPlan
+    answers_raw: np.ndarray  # N×frågor int8, eller N×⌈frågor/2⌉ uint8 om packed
+    packed: bool
+    ts_ms: np.ndarray
+    ids: np.ndarray
+    company: np.ndarray
+    companies: Tuple[str, ...]
+
+    def __len__(self) -> int:
+        return len(self.ts_ms)
+
+    @property
+    def answers(self) -> np.ndarray:
+        """Svarsmatrisen N×frågor; utan kopiering om partitionen inte är nibble-packad."""
+        if not self.packed:
+            return self.answers_raw
+        return unpack_nibbles(self.answers_raw, self.plan.n_questions)
+
+    def company_code(self, company: str) -> Optional[int]:
+        try:
+            return self.companies.index(company_key(company))
+        except ValueError:
+            return None
+
+    def score(self, company: Optional[str] = None) -> BulkScores:
+        """Poängsätter alla rader, eller bara ett företags rader."""
+        answers = self.answers
+        if company is not None:
+            code = self.company_code(company)
+            answers = answers[self.company == code] if code is not None else answers[:0]
+        return score_matrix(answers, plan=self.plan)
+
+
+# ---------- Packning ----------
+def pack_nibbles(rows: np.ndarray) -> np.ndarray:
+    """N×frågor (0..15) → N×⌈frågor/2⌉ uint8; udda fråga i de höga fyra bitarna."""
+    rows = np.asarray(rows, dtype=np.uint8)
+    if rows.shape[1] % 2:
+        rows = np.pad(rows, ((0, 0), (0, 1)))
+    return (rows[:, 0::2] << 4) | rows[:, 1::2]
+
+
+def unpack_nibbles(packed: np.ndarray, n_questions: int) -> np.ndarray:
+    out = np.empty((packed.shape[0], packed.shape[1] * 2), dtype=np.int8)
+    out[:, 0::2] = packed >> 4
+    out[:, 1::2] = packed & 0x0F
+    return out[:, :n_questions]
+
+
+# ---------- Partition ----------
+class _Partition:
+    """En instrumentversion: kolumnfiler + företagsordbok. En skrivare åt gången."""
+
+    def __init__(self, root: Path, plan: ScoringPlan, packed: bool):
+        self.dir = root / plan.key
+        self.plan = plan
+        self.dir.mkdir(parents=True, exist_ok=True)
+        meta_path = self.dir / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta["schema"] > SCHEMA_VERSION:
+                raise ColumnStoreError(f"{self.dir}: schema {meta['schema']} är nyare än {SCHEMA_VERSION}")
+            if meta["nQuestions"] != plan.n_questions:
+                raise ColumnStoreError(f"{self.dir}: {meta['nQuestions']} frågor, planen har {plan.n_questions}")
+            packed = meta["packing"] == "nibble"
+        else:
+            meta = {
+                "schema": SCHEMA_VERSION,
+                "instrument": plan.key,
+                "nQuestions": plan.n_questions,
+                "packing": "nibble" if packed else "byte",
+                "createdAt": time.time(),
+            }
+            tmp = meta_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            os.replace(tmp, meta_path)
+        self.packed = packed
+        self.max_value = 15 if packed else 127  # fyra bitar respektive int8; 0 = obesvarad
+        width = (plan.n_questions + 1) // 2 if packed else plan.n_questions
+        self.answers_col = ("answers.u4", np.uint8, width) if packed else ("answers.i1", np.int8, width)
+        self._lock = threading.Lock()
+        self._companies: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._companies_size = 0
+        self._load_companies()
+
+    def _columns(self) -> List[Tuple[str, object, int]]:
+        name, dtype, width = self.answers_col
+        # ts skrivs sist: en rad räknas först när alla kolumner har den
+        return [(name, dtype, width), (_ID[0], _ID[1], 1), (_COMPANY[0], _COMPANY[1], 1), (_TS[0], _TS[1], 1)]
+
+    @staticmethod
+    def _row_bytes(dtype, width: int) -> int:
+        return np.dtype(dtype).itemsize * width
+
+    def rows(self) -> int:
+        """Antal hela rader = minsta antalet över kolumnerna (en avbruten skrivning räknas inte)."""
+        counts = []
+        for name, dtype, width in self._columns():
+            path = self.dir / name
+            size = path.stat().st_size if path.exists() else 0
+            counts.append(size // self._row_bytes(dtype, width))
+        return min(counts)
+
+    def _load_companies(self) -> None:
+        path = self.dir / "companies.txt"
+        if not path.exists():
+            return
+        data = path.read_bytes()
+        if len(data) == self._companies_size:
+            return
+        # bara hela rader; en halvskriven sista rad läses nästa gång
+        complete = data[: data.rfind(b"\n") + 1]
+        self._companies = complete.decode("utf-8").splitlines()
+        self._codes = {c: i for i, c in enumerate(self._companies)}
+        self._companies_size = len(complete)
+
+    def _company_code(self, company: str) -> int:
+        key = company_key(company)
+        code = self._codes.get(key)
+        if code is None:
+            code = len(self._companies)
+            with open(self.dir / "companies.txt", "ab") as f:
+                f.write(key.encode("utf-8") + b"\n")
+            self._companies.append(key)
+            self._codes[key] = code
+            self._companies_size += len(key.encode("utf-8")) + 1
+        return code
+
+    def _repair(self, n: int) -> None:
+        # klipp bort rester av en avbruten append så att kolumnerna är lika långa
+        for name, dtype, width in self._columns():
+            path = self.dir / name
+            if path.exists() and path.stat().st_size > n * self._row_bytes(dtype, width):
+                os.truncate(path, n * self._row_bytes(dtype, width))
+
+    def append(self, rows: Sequence[Tuple[Contact, Answers, str, float]]) -> int:
+        n_questions = self.plan.n_questions
+        answers = np.zeros((len(rows), n_questions), dtype=np.int8)
+        ids = np.zeros(len(rows), dtype=_ID[1])
+        ts = np.empty(len(rows), dtype=_TS[1])
+        for i, (_, ans, measurement_id, at) in enumerate(rows):
+            self.plan.validate_answers(ans)
+            for q, v in ans.items():
+                if v is not None:
+                    if not 1 <= v <= self.max_value:
+                        # annars slår värdet runt i packningen och läses tillbaka som ett annat svar
+                        raise ColumnStoreError(
+                            f"Svar {v} på fråga {q} ryms inte i {self.answers_col[0]} (1..{self.max_value})"
+                        )
+                    answers[i, q - 1] = v
+            raw_id = measurement_id.encode("ascii")
+            if len(raw_id) > ID_WIDTH:
+                raise ColumnStoreError(f"Mätnings-ID längre än {ID_WIDTH} tecken: {measurement_id}")
+            ids[i] = raw_id
+            ts[i] = int(at * 1000)
+
+        lock_file = open(self.dir / ".lock", "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._lock:
+                self._load_companies()  # en annan process kan ha lagt till företag
+                codes = np.array([self._company_code(c.company) for c, *_ in rows], dtype=_COMPANY[1])
+                start = self.rows()
+                self._repair(start)
+                columns = (pack_nibbles(answers) if self.packed else answers, ids, codes, ts)
+                for (name, _, _), data in zip(self._columns(), columns):
+                    with open(self.dir / name, "ab") as f:
+                        f.write(np.ascontiguousarray(data).tobytes())
+        finally:
+            lock_file.close()  # släpper flock
+        return start
+
+    def open_columns(self) -> Columns:
+        with self._lock:
+            self._load_companies()
+            companies = tuple(self._companies)
+        n = self.rows()
+        maps = []
+        for name, dtype, width in self._columns():
+            shape = (n, width) if name == self.answers_col[0] else (n,)
+            if n == 0:
+                maps.append(np.zeros(shape, dtype=dtype))
+            else:
+                maps.append(np.memmap(self.dir / name, dtype=dtype, mode="r", shape=shape))
+        answers, ids, company, ts = maps
+        return Columns(self.plan, answers, self.packed, ts, ids, company, companies)
+
+
+# ---------- Lagringen ----------
+class ColumnStore:
+    """Append-only inlämningar per instrumentversion. Trådsäker inom en process."""
+
+    def __init__(self, root: str = DEFAULT_ROOT, packed: bool = False):
+        self.root = Path(root)
+        self.packed = packed  # gäller bara nya partitioner; befintliga behåller sin packning
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+
+    def partition(self, plan: ScoringPlan) -> _Partition:
+        with self._lock:
+            part = self._partitions.get(plan.key)
+            if part is None:
+                part = self._partitions[plan.key] = _Partition(self.root, plan, self.packed)
+            return part
+
+    def instruments(self) -> List[str]:
+        return sorted(p.name for p in self.root.iterdir() if (p / "meta.json").exists())
+
+    def append(
+        self,
+        contact: Contact,
+        answers: Answers,
+        plan: ScoringPlan,
+        measurement_id: str,
+        at: Optional[float] = None,
+    ) -> int:
+        """Lägger till en inlämning; returnerar radnumret."""
+        at = time.time() if at is None else at
+        return self.partition(plan).append([(contact, answers, measurement_id, at)])
+
+    def append_many(self, plan: ScoringPlan, rows: Iterable[Tuple[Contact, Answers, str, float]]) -> int:
+        """Lägger till många inlämningar i en skrivning per kolumn; returnerar första radnumret."""
+        return self.partition(plan).append(list(rows))
+
+    def columns(self, instrument: str) -> Columns:
+        return self.partition(plan_for_key(instrument)).open_columns()
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kolumnvis lagring av inlämningar.")
+    parser.add_argument("command", choices=("ingest", "stats"))
+    parser.add_argument("source", nargs="?", type=Path, help="CSV/JSONL med inlämningar (ingest)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help=f"lagringskatalog (default: {DEFAULT_ROOT})")
+    parser.add_argument("--packed", action="store_true", help="två svar per byte i nya partitioner")
+    parser.add_argument("--batch", type=int, default=10_000, help="rader per skrivning vid ingest")
+    args = parser.parse_args(argv)
+
+    store = ColumnStore(args.root, packed=args.packed)
+    if args.command == "stats":
+        for key in store.instruments():
+            cols = store.columns(key)
+            scores = cols.score()
+            print(json.dumps({
+                "instrument": key,
+                "rows": len(cols),
+                "packing": "nibble" if cols.packed else "byte",
+                "companies": len(cols.companies),
+                "bytesPerRow": cols.answers_raw.shape[1] + 8 + ID_WIDTH + 4,
+                "means": [round(float(m), 3) for m in np.nanmean(scores.means, axis=0)] if len(cols) else [],
+            }, ensure_ascii=False))
+        return 0
+
+    if args.source is None:
+        parser.error("ingest kräver en källfil")
+    from .batch import read_submissions
+    from .core import generate_measurement_id
+
+    pending: Dict[str, List[Tuple[Contact, Answers, str, float]]] = {}
+    plans: Dict[str, ScoringPlan] = {}
+    total = 0
+    started = time.perf_counter()
+
+    def flush(key: str) -> None:
+        store.append_many(plans[key], pending.pop(key))
+
+    for row in read_submissions(args.source):
+        plan = plan_for_row(row)
+        plans[plan.key] = plan
+        submitted = row.get("submittedAt")
+        at = datetime.fromisoformat(submitted.replace("Z", "+00:00")).timestamp() if submitted else time.time()
+        contact = Contact(name=row.get("name", ""), email=row.get("email", ""), company=row.get("company") or "")
+        measurement_id = measurement_id_from_row(row) or generate_measurement_id()
+        batch = pending.setdefault(plan.key, [])
+        batch.append((contact, answers_from_row(row), measurement_id, at))
+        total += 1
+        if len(batch) >= args.batch:
+            flush(plan.key)
+    for key in list(pending):
+        flush(key)
+    print(f"{total} inlämningar på {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Grunddata och hjälpfunktioner för självskattningen.
+
+Portat från React-versionen (app.tsx) så att Streamlit-appen, PDF-motorn och
+övriga serverdelar räknar exakt likadant som webbkomponenten. Frågor, skala
+och kategorier kommer från instrumentplanen (se instrument.py).
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from .ids import ID_PATTERN, default_ids
+from .instrument import Band, ScoringPlan, default_plan
+
+# ---------- Färgpalett (HEX/RGB) ----------
+PALETTE = {
+    "eggshell": "#FAF7F0",  # äggskalsvit bakgrund
+    "white": "#FFFFFF",
+    "text": "#111827",
+    "navy50": "#E6ECF3",
+    "navy300": "#6B86A3",
+    "navy600": "#0B1F3A",  # sober navy
+    "navy700": "#09233F",
+    "gray100": "#F3F4F6",
+    "gray200": "#E5E7EB",
+    "gray300": "#D1D5DB",
+    "gray400": "#9CA3AF",
+    "gray700": "#374151",
+    "green": "#2E7D32",
+    "orange": "#F59E0B",
+}
+
+# ---------- Typer ----------
+Answers = Dict[int, int]
+
+
+@dataclass(frozen=True)
+class Contact:
+    name: str
+    email: str
+    company: str = ""
+
+
+@dataclass(frozen=True)
+class Scores:
+    listening: float  # Aktivt lyssnande (1-7)
+    feedback: float   # Återkoppling (8-15)
+    goal: float       # Målinriktning (16-20)
+    total: float      # Totalmedel (1-20)
+
+
+# ---------- Hjälpfunktioner ----------
+_SV_MONTHS = (
+    "januari", "februari", "mars", "april", "maj", "juni",
+    "juli", "augusti", "september", "oktober", "november", "december",
+)
+
+
+def mean(nums: Iterable[float]) -> float:
+    nums = list(nums)
+    return sum(nums) / len(nums) if nums else 0.0
+
+
+def classify(score: float, plan: Optional[ScoringPlan] = None) -> Band:
+    return (plan or default_plan()).classify(score)
+
+
+def sv_date(d: Optional[date] = None) -> str:
+    """Långt svenskt datum, motsvarar Intl sv-SE dateStyle "long"."""
+    d = d or date.today()
+    return f"{d.day} {_SV_MONTHS[d.month - 1]} {d.year}"
+
+
+def sv_date_file(d: Optional[date] = None) -> str:
+    """Filvänligt datum (YYYYMMDD), används i filnamn."""
+    d = d or date.today()
+    return f"{d.year:04d}{d.month:02d}{d.day:02d}"
+
+
+def generate_measurement_id(now: Optional[datetime] = None) -> str:
+    """Skapar ett unikt, sorterbart ID för varje mätning (ex: FL-20251010-125123-0001), se ids.py."""
+    return default_ids().next(now)
+
+
+def sum_range(answers: Answers, start: int, end: int) -> int:
+    return sum(answers.get(i) or 0 for i in range(start, end + 1))
+
+
+def calc_scores(ans: Answers) -> Scores:
+    """Medelvärden för standardinstrumentet; andra instrument använder plan.mean_scores."""
+    return Scores(**default_plan().mean_scores(ans))
+
+
+def answer_value(v: Any) -> int:
+    """Ett svar ur en JSON-kropp: bara heltal godtas, inte bool, flyttal eller text."""
+    if isinstance(v, bool) or not isinstance(v, int):
+        raise ValueError(f"Svaret {v!r} är inte ett heltal")
+    return v
+
+
+def answers_from_json(raw: str, strict: bool = False) -> Answers:
+    """Läser `answersJson` (JSON-objekt med frågenummer som nycklar).
+
+    Med `strict` måste varje svar vara ett heltal (se answer_value); annars
+    tolkas det med int(), som äldre exporter kräver.
+    """
+    data = json.loads(raw) if raw else {}
+    if not isinstance(data, dict):
+        raise ValueError("answersJson ska vara ett JSON-objekt")
+    value = answer_value if strict else int
+    return {int(k): value(v) for k, v in data.items() if v is not None}
+
+
+# --- Inlämningsrader (webhook-payload, CSV/JSONL-export) ---
+def answers_from_row(row: Mapping[str, Any]) -> Answers:
+    """Svaren ur en rad: `answersJson` som JSON-text eller redan tolkat objekt (eller `answers`)."""
+    raw = row.get("answersJson", row.get("answers"))
+    if isinstance(raw, dict):
+        return {int(k): int(v) for k, v in raw.items() if v is not None}
+    return answers_from_json(raw or "")
+
+
+def measurement_id_from_row(row: Mapping[str, Any]) -> Optional[str]:
+    """`measurementId`, annars `title` om den är ett mätnings-ID (annars är den e-postadressen).
+
+    ID:t blir filnamn och nyckel, så bara det genererade formatet godtas; allt
+    annat ger ValueError.
+    """
+    title = row.get("title") or ""
+    measurement_id = row.get("measurementId") or (title if title.startswith("FL-") else None)
+    if measurement_id is not None and not (isinstance(measurement_id, str) and ID_PATTERN.fullmatch(measurement_id)):
+        raise ValueError(f"Ogiltigt mätnings-ID: {measurement_id!r}")
+    return measurement_id
+
+
+# --- Självtester (enkla runtime-testfall) ---
+def run_self_tests() -> None:
+    # 1) medelvärden & klassning
+    assert mean([1, 1, 1]) == 1, "mean ska bli 1"
+    assert classify(5.1).label == "Högt", "klassning >=5 ska vara Högt"
+    assert classify(2.6).label == "Medel", "klassning 2.5–4.9 ska vara Medel"
+    assert classify(1.9).label == "Lågt", "klassning <2.5 ska vara Lågt"
+
+    # 2) summeringar
+    demo: Answers = {i: 7 if i <= 7 else 5 if i <= 15 else 3 for i in range(1, 21)}
+    s1, s2, s3 = sum_range(demo, 1, 7), sum_range(demo, 8, 15), sum_range(demo, 16, 20)
+    assert (s1, s2, s3) == (49, 40, 15), "Summor ska bli 49/40/15"
+    assert sum_range({}, 1, 7) == 0, "Tomma svar ska ge 0 i summa"
+    assert default_plan().sums(demo) == (49, 40, 15), "Planens summor ska bli 49/40/15"
+
+    # 3) datumhelpers format
+    assert len(sv_date_file()) == 8 and sv_date_file().isdigit(), "sv_date_file format felaktigt"
@@ -0,0 +1,126 @@
+"""Idempotent inskick: samma person, samma svar, inom ett tidsfönster.
+
+En omladdning eller ett omförsök som skickar exakt samma svar från samma
+e-postadress inom fönstret får tillbaka mätnings-ID:t från första
+inskicket i stället för en ny PDF och en ny rad i SharePoint. Nyckeln är
+(normaliserad e-post, hash av instrument + svarsvektor) och indexet ligger i
+SQLite så att det gäller mellan processer och överlever omstarter.
+
+Posten minns också hur långt inskicket kom (lagrat, lagt i utkorgen), så att
+ett inskick som fortsätts efter en omstart varken tappas eller lagras två
+gånger.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from .core import Answers
+from .instrument import ScoringPlan
+
+DEFAULT_DB = os.environ.get("FL_IDEMPOTENCY_DB", ".data/idempotency.sqlite3")
+WINDOW_S = float(os.environ.get("FL_IDEMPOTENCY_WINDOW", "3600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission (
+    email TEXT NOT NULL,
+    answers_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    measurement_id TEXT NOT NULL,
+    stored_at REAL,
+    enqueued_at REAL
+);
+CREATE INDEX IF NOT EXISTS submission_key ON submission(email, answers_hash, created_at);
+CREATE INDEX IF NOT EXISTS submission_id ON submission(measurement_id);
+"""
+
+
+def answers_hash(answers: Answers, plan: ScoringPlan) -> str:
+    """Stabil hash av svarsvektorn; obesvarat = 0, samma svar i annan ordning ger samma hash."""
+    vector = bytes(answers.get(q.id) or 0 for q in plan.questions)
+    return hashlib.sha256(plan.key.encode("utf-8") + b"\0" + vector).hexdigest()[:32]
+
+
+class IdempotencyIndex:
+    """(e-post, svarshash, tid) → mätnings-ID. Trådsäker; en anslutning skyddad av ett lås."""
+
+    def __init__(self, path: str = DEFAULT_DB, window_s: float = WINDOW_S):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.window_s = window_s
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _migrate(self) -> None:
+        # index skapade före stored_at/enqueued_at
+        cols = {row[1] for row in self._db.execute("PRAGMA table_info(submission)")}
+        if cols:
+            for col in ("stored_at", "enqueued_at"):
+                if col not in cols:
+                    self._db.execute(f"ALTER TABLE submission ADD COLUMN {col} REAL")
+
+    def claim(self, email: str, answers: Answers, plan: ScoringPlan, measurement_id: str) -> Optional[str]:
+        """Registrerar inskicket; finns ett likadant inom fönstret returneras dess ID i stället."""
+        key = (email.strip().lower(), answers_hash(answers, plan))
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: två processer får inte båda se "inget" och båda registrera
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT measurement_id FROM submission WHERE email = ? AND answers_hash = ? AND created_at >= ?"
+                    " ORDER BY created_at LIMIT 1",
+                    (*key, now - self.window_s),
+                ).fetchone()
+                if row is None:
+                    self._db.execute(
+                        "INSERT INTO submission (email, answers_hash, created_at, measurement_id) VALUES (?, ?, ?, ?)",
+                        (*key, now, measurement_id),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def mark_stored(self, measurement_id: str) -> None:
+        """Inskicket är inräknat i aggregat, kolumnlagring och percentiler."""
+        self._mark("stored_at", measurement_id)
+
+    def mark_enqueued(self, measurement_id: str) -> None:
+        """Webhooken ligger i den beständiga utkorgen (eller behövs inte)."""
+        self._mark("enqueued_at", measurement_id)
+
+    def _mark(self, column: str, measurement_id: str) -> None:
+        with self._lock:
+            self._db.execute(
+                f"UPDATE submission SET {column} = ? WHERE measurement_id = ? AND {column} IS NULL",
+                (time.time(), measurement_id),
+            )
+
+    def progress(self, measurement_id: str) -> Tuple[bool, bool]:
+        """(lagrat, i utkorgen) för mätnings-ID:t; (False, False) om det är okänt."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(stored_at IS NOT NULL), MAX(enqueued_at IS NOT NULL) FROM submission WHERE measurement_id = ?",
+                (measurement_id,),
+            ).fetchone()
+        return bool(row[0]), bool(row[1])
+
+    def prune(self, older_than_s: Optional[float] = None) -> int:
+        """Tar bort poster äldre än fönstret (de kan ändå aldrig matcha)."""
+        cutoff = time.time() - (older_than_s if older_than_s is not None else self.window_s)
+        with self._lock:
+            return self._db.execute("DELETE FROM submission WHERE created_at < ?", (cutoff,)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
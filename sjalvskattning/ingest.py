@@ -0,0 +1,571 @@
+"""Lokal insamlingstjänst i stället för Power Automate-flödet (ASGI, utan ramverk).
+
+Tar emot samma kroppar som webhooken skickar och lagrar dem lokalt:
+
+    POST /invoke  en inlämning: postToWebhook-kroppen (v1, PDF:en som
+                  `pdfBase64`) eller den kompakta v2-posten; gzip går bra
+                  → 202 {"ok": true, "id", "duplicate"}
+    POST /batch   NDJSON, en inlämning per rad
+                  → 200 {"accepted", "duplicates", "errors": [{"line", "error"}]}
+    GET  /health, GET /stats, GET /metrics (Prometheus)
+
+Anropen tolkas i händelseslingan och läggs i en kö till en skrivtråd. Tråden
+tar allt som väntar (högst `MAX_BATCH` rader) och skriver det i en enda
+SQLite-transaktion (group commit). Svaret skickas först när transaktionen
+är klar, så ett 202 betyder att inlämningen är lagrad. Under last delar
+hundratals anrop på samma commit. PDF:erna skrivs som filer i en BlobStore
+(`FL_INGEST_PDF_ROOT`) innan raden som pekar på dem. En omsänd inlämning
+(samma rubrik och `submittedAt`, som när utkorgen försöker igen) lagras inte
+två gånger. Är kön full svarar tjänsten 503 med Retry-After.
+
+Peka appen hit med `FL_WEBHOOK_URL=http://127.0.0.1:8780/invoke?sig=lokal`
+(`sig=` krävs av webhook.valid_webhook_url). Med `FL_INGEST_SECRET` måste
+kroppens `secret` stämma, som villkoret i flödet. Exporten läses av
+batch.py och team_report.py (`--source`).
+
+    python -m sjalvskattning.ingest serve --port 8780
+    python -m sjalvskattning.ingest stats
+    python -m sjalvskattning.ingest export inlamningar.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import binascii
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+from .blobstore import BlobStore
+from .core import answer_value, answers_from_json
+from .instrument import InstrumentError, ScoringPlan, plan_for_key
+from .metrics import REGISTRY, counter, histogram
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DB = os.environ.get("FL_INGEST_DB", ".data/ingest.sqlite3")
+PDF_ROOT = os.environ.get("FL_INGEST_PDF_ROOT", ".data/ingest/pdfs")
+SECRET = os.environ.get("FL_INGEST_SECRET", "")
+MAX_BODY = int(os.environ.get("FL_INGEST_MAX_BODY", str(32 * 1024 * 1024)))
+MAX_PENDING = int(os.environ.get("FL_INGEST_MAX_PENDING", "50000"))  # rader i kö innan 503
+MAX_BATCH = 4096  # rader per transaktion
+_SHA256 = re.compile(r"[0-9a-fA-F]{64}")
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+SUBMISSIONS = counter("fl_ingest_submissions_total", "Mottagna inlämningar per utfall.", ("result",))
+COMMITS = counter("fl_ingest_commits_total", "Skrivtransaktioner i insamlingstjänsten.")
+COMMIT_ROWS = histogram(
+    "fl_ingest_commit_rows", "Inlämningar per transaktion.", (), (1, 4, 16, 64, 256, 1024, 4096)
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    name TEXT NOT NULL,
+    company TEXT NOT NULL,
+    email TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    sums TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    submitted_at TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    pdf_sha256 TEXT,
+    pdf_size INTEGER,
+    file_name TEXT,
+    UNIQUE (title, submitted_at)
+);
+"""
+_INSERT = (
+    "INSERT OR IGNORE INTO submission (title, name, company, email, instrument, sums, answers, submitted_at,"
+    " received_at, pdf_sha256, pdf_size, file_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class IngestError(ValueError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- Tolkning ----------
+@dataclass
+class Submission:
+    title: str
+    name: str
+    company: str
+    email: str
+    instrument: str
+    sums: List[int]
+    answers: List[Optional[int]]  # i frågeordning; None = obesvarad
+    submitted_at: str
+    pdf: Optional[bytes] = None
+    pdf_sha256: Optional[str] = None
+    pdf_size: Optional[int] = None
+    file_name: Optional[str] = None
+
+
+def _text(payload: Mapping[str, Any], key: str, required: bool = True) -> str:
+    value = payload.get(key)
+    if value is None and not required:
+        return ""
+    if not isinstance(value, str) or (required and not value.strip()):
+        raise IngestError(422, f"{key} saknas eller är inte en sträng")
+    return value
+
+
+def parse_submission(payload: Any, secret: str = SECRET) -> Submission:
+    """En webhookkropp (v1 eller v2) som rad; IngestError om den inte går att lagra."""
+    if not isinstance(payload, dict):
+        raise IngestError(400, "Inlämningen ska vara ett JSON-objekt")
+    if secret and not hmac.compare_digest(str(payload.get("secret", "")).encode(), secret.encode()):
+        raise IngestError(401, "Fel eller saknad secret")
+    try:
+        plan = plan_for_key(payload.get("instrument") or None)
+        if payload.get("v") == 2:
+            values = payload.get("answers")
+            if not isinstance(values, list) or len(values) != plan.n_questions:
+                raise IngestError(422, f"answers ska vara en lista med {plan.n_questions} svar")
+            answers = {q.id: answer_value(v) for q, v in zip(plan.questions, values) if v is not None}
+        else:
+            answers = answers_from_json(payload.get("answersJson") or "", strict=True)
+        plan.validate_answers(answers)
+    except IngestError:
+        raise
+    except (InstrumentError, TypeError, ValueError, RecursionError) as e:
+        raise IngestError(422, str(e) or type(e).__name__)
+    email = _text(payload, "email")
+    sub = Submission(
+        title=_text(payload, "title", required=False) or email,
+        name=_text(payload, "name"),
+        company=_text(payload, "company", required=False),
+        email=email,
+        instrument=plan.key,
+        sums=list(plan.sums(answers)),
+        answers=[answers.get(q.id) for q in plan.questions],
+        submitted_at=_text(payload, "submittedAt", required=False) or _utc_now(),
+    )
+    _attach_pdf(sub, payload)
+    return sub
+
+
+def _file_name(value: Any) -> Optional[str]:
+    if value is not None and not isinstance(value, str):
+        raise IngestError(422, "fileName ska vara en sträng")
+    return value
+
+
+def _attach_pdf(sub: Submission, payload: Mapping[str, Any]) -> None:
+    if payload.get("pdfBase64"):
+        try:
+            sub.pdf = binascii.a2b_base64(payload["pdfBase64"], strict_mode=True)
+        except (binascii.Error, TypeError, ValueError):
+            raise IngestError(422, "pdfBase64 är inte giltig base64")
+        sub.file_name = _file_name(payload.get("fileName"))
+    elif isinstance(payload.get("pdf"), dict):
+        # v2: PDF:en ligger redan i en blobstore; bara referensen lagras
+        ref = payload["pdf"]
+        sha, size = ref.get("sha256"), ref.get("size")
+        if not isinstance(sha, str) or not _SHA256.fullmatch(sha):
+            raise IngestError(422, "pdf.sha256 ska vara 64 hexadecimala tecken")
+        if size is not None and (not isinstance(size, int) or isinstance(size, bool) or not 0 <= size < 2**63):
+            raise IngestError(422, "pdf.size ska vara ett icke-negativt heltal")
+        sub.pdf_sha256, sub.pdf_size, sub.file_name = sha.lower(), size, _file_name(ref.get("fileName"))
+
+
+def _utc_now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+# ---------- Lagring ----------
+# per rad: True = ny, False = dubblett, IngestError = just den raden kunde inte lagras
+Outcome = Union[bool, IngestError]
+Done = Callable[[Optional[List[Outcome]], Optional[BaseException]], None]
+# fel som bara gäller en rad (bindning, kodning); allt annat fäller hela transaktionen
+_ROW_ERRORS = (sqlite3.InterfaceError, sqlite3.ProgrammingError, ValueError, TypeError, OverflowError)
+
+
+def _notify(done: Done, result: Optional[List[Outcome]], error: Optional[BaseException]) -> None:
+    """Anropar en `done`-callback; ett fel i den får inte döda skrivtråden."""
+    try:
+        done(result, error)
+    except Exception:
+        log.exception("Callback för inlämning misslyckades")
+
+
+class IngestStore:
+    """Inlämningar i SQLite, skrivna i omgångar av en skrivtråd (group commit). Trådsäker."""
+
+    def __init__(self, path: str = DEFAULT_DB, pdf_root: str = PDF_ROOT, max_pending: int = MAX_PENDING):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.blobs = BlobStore(pdf_root)
+        self.max_pending = max_pending
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._queue: Deque[Tuple[List[Submission], Done]] = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stopped = False  # skrivtråden har avslutats (efter close() eller ett oväntat fel)
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, items: List[Submission], done: Done) -> bool:
+        """Köar `items`; `done(inlagda, fel)` anropas från skrivtråden efter commit. False om kön är full.
+
+        IngestError(503) om skrivtråden har stannat utan att butiken stängts.
+        """
+        with self._cond:
+            if self._closed or self._pending + len(items) > self.max_pending:
+                return False
+            if self._stopped:
+                raise IngestError(503, "Lagringen har stannat")
+            self._queue.append((items, done))
+            self._pending += len(items)
+            self._cond.notify()
+        return True
+
+    def write(self, items: List[Submission]) -> List[Outcome]:
+        """Som `submit`, men väntar på commit; True per rad som var ny."""
+        finished = threading.Event()
+        outcome: List[Any] = [None, None]
+
+        def done(result: Optional[List[Outcome]], error: Optional[BaseException]) -> None:
+            outcome[:] = [result, error]
+            finished.set()
+
+        if not self.submit(items, done):
+            raise IngestError(503, "Kön är full")
+        finished.wait()
+        if outcome[1] is not None:
+            raise outcome[1]
+        return outcome[0]
+
+    def _run(self) -> None:
+        batch: List[Tuple[List[Submission], Done]] = []
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or self._closed)
+                    if not self._queue:
+                        return
+                    # allt som väntar, hela anrop, högst MAX_BATCH rader (minst ett anrop)
+                    batch = [self._queue.popleft()]
+                    rows = len(batch[0][0])
+                    while self._queue and rows + len(self._queue[0][0]) <= MAX_BATCH:
+                        rows += len(self._queue[0][0])
+                        batch.append(self._queue.popleft())
+                try:
+                    inserted = self._commit([item for items, _ in batch for item in items])
+                    error = None
+                except Exception as e:
+                    inserted, error = None, e
+                with self._cond:
+                    self._pending -= rows
+                i = 0
+                for items, done in batch:
+                    _notify(done, inserted[i:i + len(items)] if inserted is not None else None, error)
+                    i += len(items)
+                batch = []
+        finally:
+            # dör tråden får ingen vänta förgäves: allt i kön och i luften får ett fel
+            with self._cond:
+                self._stopped = True
+                abandoned = batch + list(self._queue)
+                self._queue.clear()
+                self._pending = 0
+            for _, done in abandoned:
+                _notify(done, None, IngestError(503, "Lagringen har stannat"))
+
+    def _commit(self, items: List[Submission]) -> List[Outcome]:
+        received_at = time.time()
+        rows = []
+        for s in items:
+            if s.pdf is not None:
+                # filen före raden: en rad pekar aldrig på en PDF som saknas
+                ref = self.blobs.put(s.pdf)
+                s.pdf_sha256, s.pdf_size, s.pdf = ref.sha256, ref.size, None
+            rows.append((
+                s.title, s.name, s.company, s.email, s.instrument, json.dumps(s.sums), json.dumps(s.answers),
+                s.submitted_at, received_at, s.pdf_sha256, s.pdf_size, s.file_name,
+            ))
+        outcomes: List[Outcome] = []
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                for row in rows:
+                    try:
+                        outcomes.append(self._db.execute(_INSERT, row).rowcount == 1)
+                    except _ROW_ERRORS as e:
+                        # en trasig rad ska inte rulla tillbaka de andra anropens rader
+                        outcomes.append(IngestError(422, f"Raden kunde inte lagras: {e}"))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        n_new = sum(o is True for o in outcomes)
+        n_dup = sum(o is False for o in outcomes)
+        COMMITS.inc()
+        COMMIT_ROWS.observe(len(rows))
+        SUBMISSIONS.inc(n_new, result="accepted")
+        SUBMISSIONS.inc(n_dup, result="duplicate")
+        SUBMISSIONS.inc(len(rows) - n_new - n_dup, result="invalid")
+        return outcomes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db_lock:
+            n, pdfs, last = self._db.execute(
+                "SELECT COUNT(*), COUNT(pdf_sha256), MAX(received_at) FROM submission"
+            ).fetchone()
+        return {"submissions": n, "withPdf": pdfs, "lastReceivedAt": last, "pending": self._pending}
+
+    def export(self) -> Iterator[Dict[str, Any]]:
+        """Alla inlämningar som rader för batch.read_submissions (svaren som `answers`-objekt)."""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT title, name, company, email, instrument, answers, submitted_at, pdf_sha256, file_name"
+                " FROM submission ORDER BY id"
+            ).fetchall()
+        plans: Dict[str, ScoringPlan] = {}
+        for title, name, company, email, instrument, answers, submitted_at, sha, file_name in rows:
+            plan = plans.get(instrument) or plans.setdefault(instrument, plan_for_key(instrument))
+            row = {
+                "title": title, "name": name, "company": company, "email": email, "instrument": instrument,
+                "answers": {str(q.id): v for q, v in zip(plan.questions, json.loads(answers))},
+                "submittedAt": submitted_at,
+            }
+            if sha and _SHA256.fullmatch(sha):
+                row["pdf"] = {"sha256": sha, "fileName": file_name, "path": str(self.blobs.path(sha))}
+            yield row
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._db_lock:
+            self._db.close()
+
+
+# ---------- ASGI ----------
+_store: Optional[IngestStore] = None
+
+
+def store() -> IngestStore:
+    global _store
+    if _store is None:
+        _store = IngestStore()
+    return _store
+
+
+async def _read_body(scope: Scope, receive: Receive) -> bytes:
+    chunks: List[bytes] = []
+    size = 0
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise IngestError(400, "Anslutningen stängdes")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            raise IngestError(413, f"Kroppen får vara högst {MAX_BODY} byte")
+        chunks.append(chunk)
+        more = message.get("more_body", False)
+    body = b"".join(chunks)
+    if (b"content-encoding", b"gzip") in scope.get("headers", ()):
+        # MAX_BODY gäller även uppackat, annars räcker några kB gzip för att fylla minnet
+        inflater = zlib.decompressobj(wbits=31)
+        try:
+            body = inflater.decompress(body, MAX_BODY)
+        except zlib.error:
+            raise IngestError(400, "Kroppen är inte giltig gzip")
+        if not inflater.eof:
+            if inflater.unconsumed_tail or inflater.decompress(b"", 1):
+                raise IngestError(413, f"Kroppen får vara högst {MAX_BODY} byte uppackad")
+            raise IngestError(400, "Kroppen är inte giltig gzip")
+    return body
+
+
+async def _commit(items: List[Submission]) -> List[Outcome]:
+    """Väntar på skrivtrådens commit utan att blockera händelseslingan."""
+    loop = asyncio.get_running_loop()
+    future: "asyncio.Future[List[Outcome]]" = loop.create_future()
+
+    def resolve(result: Optional[List[Outcome]], error: Optional[BaseException]) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    if not store().submit(items, lambda r, e: loop.call_soon_threadsafe(resolve, r, e)):
+        raise IngestError(503, "Kön är full, försök igen")
+    return await future
+
+
+async def _send_json(send: Send, status: int, data: Any, headers: List[Tuple[bytes, bytes]] = ()) -> None:
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json; charset=utf-8"), (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _invoke(scope: Scope, receive: Receive, send: Send) -> None:
+    body = await _read_body(scope, receive)
+    try:
+        payload = json.loads(body)
+    except (ValueError, RecursionError):
+        raise IngestError(400, "Kroppen är inte giltig JSON")
+    try:
+        sub = parse_submission(payload)
+    except IngestError:
+        SUBMISSIONS.inc(result="invalid")
+        raise
+    (outcome,) = await _commit([sub])
+    if isinstance(outcome, IngestError):
+        raise outcome
+    await _send_json(send, 202, {"ok": True, "id": sub.title, "duplicate": not outcome})
+
+
+async def _batch(scope: Scope, receive: Receive, send: Send) -> None:
+    body = await _read_body(scope, receive)
+    items: List[Submission] = []
+    lines: List[int] = []
+    errors = []
+    for n, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            items.append(parse_submission(json.loads(line)))
+            lines.append(n)
+        except (ValueError, RecursionError) as e:  # även IngestError och ogiltig JSON
+            errors.append({"line": n, "error": str(e) or type(e).__name__})
+    SUBMISSIONS.inc(len(errors), result="invalid")
+    outcomes = await _commit(items) if items else []
+    for n, outcome in zip(lines, outcomes):
+        if isinstance(outcome, IngestError):
+            errors.append({"line": n, "error": str(outcome)})
+    errors.sort(key=lambda e: e["line"])
+    accepted = sum(o is True for o in outcomes)
+    await _send_json(send, 200, {"accepted": accepted, "duplicates": sum(o is False for o in outcomes), "errors": errors})
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            store()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _store is not None:
+                _store.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    path, method = scope["path"].rstrip("/") or "/", scope["method"]
+    try:
+        if path == "/health":
+            await _send_json(send, 200, {"ok": True})
+            return
+        if path == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"), (b"content-length", str(len(body)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        if path == "/stats":
+            await _send_json(send, 200, store().stats())
+            return
+        if path not in ("/invoke", "/batch"):
+            raise IngestError(404, "Okänd sökväg")
+        if method != "POST":
+            raise IngestError(405, "Använd POST")
+        await (_invoke if path == "/invoke" else _batch)(scope, receive, send)
+    except IngestError as e:
+        headers = [(b"retry-after", b"1")] if e.status == 503 else []
+        await _send_json(send, e.status, {"error": str(e)}, headers)
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.ingest", description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=DEFAULT_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="Starta tjänsten")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8780)
+    sub.add_parser("stats", help="Antal lagrade inlämningar")
+    p_export = sub.add_parser("export", help="Skriv alla inlämningar som JSONL (- = stdout)")
+    p_export.add_argument("out")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        try:
+            import uvicorn
+        except ImportError:  # pragma: no cover
+            ap.error("uvicorn saknas (pip install uvicorn)")
+        global _store
+        _store = IngestStore(args.db)
+        # en process: group commit kräver en enda skrivare mot databasen
+        uvicorn.run(app, host=args.host, port=args.port, access_log=False)
+        return 0
+    ingest = IngestStore(args.db)
+    try:
+        if args.cmd == "stats":
+            for key, value in ingest.stats().items():
+                print(f"{key:<16}{value}")
+            return 0
+        out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+        try:
+            n = 0
+            for row in ingest.export():
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                n += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"{n} inlämningar exporterade", file=sys.stderr)
+    finally:
+        ingest.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,302 @@
+"""Deklarativa instrument kompilerade till en cachad poängplan.
+
+Ett instrument (frågor, skala, kategorier, klassning och rapporttexter)
+beskrivs som JSON i `instruments/<id>.v<version>.json`. Definitionen valideras
+och kompileras en gång till en `ScoringPlan` med färdiga index per kategori,
+maxsummor och trösklar. Planen cachas per (id, version) och laddas först när
+den efterfrågas; all poängsättning och rapportlayout går sedan via planen.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+SPEC_DIR = Path(__file__).parent / "instruments"
+DEFAULT_INSTRUMENT = "funktionellt-ledarskap"
+
+_SPEC_FILE = re.compile(r"^(?P<id>[a-z0-9-]+)\.v(?P<version>\d+)\.json$")
+_KEY = re.compile(r"(?P<id>[a-z0-9-]+)(?:\.v(?P<version>\d+))?")
+
+
+class InstrumentError(ValueError):
+    """Ogiltig instrumentdefinition."""
+
+
+class Question(NamedTuple):
+    id: int
+    text: str
+
+
+class Band(NamedTuple):
+    label: str
+    hex: str
+
+
+@dataclass(frozen=True)
+class Category:
+    key: str
+    title: str
+    first: int  # första frågan (inklusive)
+    last: int   # sista frågan (inklusive)
+    payload_field: str
+    texts: Tuple[str, ...]
+    question_ids: Tuple[int, ...]
+    max_sum: int
+
+    @property
+    def size(self) -> int:
+        return len(self.question_ids)
+
+
+@dataclass(frozen=True)
+class NextStep:
+    heading: str
+    paragraphs: Tuple[str, ...]
+    bullets: Tuple[Tuple[str, str], ...]
+
+
+@dataclass(frozen=True)
+class ScoringPlan:
+    id: str
+    version: int
+    language: str
+    title: str
+    report_title: str
+    scale_min: int
+    scale_max: int
+    scale_labels: Tuple[str, ...]
+    questions: Tuple[Question, ...]
+    categories: Tuple[Category, ...]
+    bands: Tuple[Tuple[Optional[float], Band], ...]  # fallande tröskel, None = resten
+    next_steps: Tuple[NextStep, ...]
+    # Kolumnblock (start, stopp) i en svarsmatris där kolumn j = fråga j+1
+    blocks: Tuple[Tuple[int, int], ...] = field(default=())
+
+    @property
+    def key(self) -> str:
+        return f"{self.id}.v{self.version}"
+
+    @property
+    def n_questions(self) -> int:
+        return len(self.questions)
+
+    @property
+    def scale_values(self) -> Tuple[int, ...]:
+        return tuple(range(self.scale_min, self.scale_max + 1))
+
+    def sums(self, answers: Mapping[int, int]) -> Tuple[int, ...]:
+        """Summa per kategori; obesvarat räknas som 0 (som sum_range)."""
+        return tuple(sum(answers.get(i) or 0 for i in cat.question_ids) for cat in self.categories)
+
+    def mean_scores(self, answers: Mapping[int, int]) -> Dict[str, float]:
+        """Medel per kategori (delat med kategorins storlek) + totalmedel över besvarade frågor."""
+        scores = {cat.key: s / cat.size for cat, s in zip(self.categories, self.sums(answers))}
+        values = [v for v in answers.values() if v is not None]
+        scores["total"] = sum(values) / len(values) if values else 0.0
+        return scores
+
+    def classify(self, score: float) -> Band:
+        for threshold, band in self.bands:
+            if threshold is None or score >= threshold:
+                return band
+        return self.bands[-1][1]
+
+    def band_edges(self) -> Tuple[Tuple[float, ...], Tuple[str, ...]]:
+        """Stigande trösklar och etiketter, för vektoriserad klassning."""
+        ordered = list(reversed(self.bands))
+        return (
+            tuple(t for t, _ in ordered if t is not None),
+            tuple(b.label for _, b in ordered),
+        )
+
+    def validate_answers(self, answers: Mapping[int, int]) -> None:
+        ids = {q.id for q in self.questions}
+        for q, v in answers.items():
+            if q not in ids:
+                raise InstrumentError(f"Okänd fråga {q} för {self.key}")
+            if v is not None and not self.scale_min <= v <= self.scale_max:
+                raise InstrumentError(f"Svar {v} på fråga {q} ligger utanför {self.scale_min}..{self.scale_max}")
+
+
+# ---------- Kompilering ----------
+def compile_instrument(spec: Mapping[str, Any]) -> ScoringPlan:
+    """Validerar en instrumentdefinition och bygger planen."""
+    try:
+        ident, version = str(spec["id"]), int(spec["version"])
+        scale = spec["scale"]
+        scale_min, scale_max = int(scale["min"]), int(scale["max"])
+        labels = tuple(scale["labels"])
+        questions = tuple(Question(int(q["id"]), str(q["text"])) for q in spec["questions"])
+        raw_categories = spec["categories"]
+        raw_bands = spec["bands"]
+    except (KeyError, TypeError, ValueError) as e:
+        raise InstrumentError(f"Ofullständig instrumentdefinition: {e!r}") from e
+
+    where = f"{ident}.v{version}"
+    if scale_min >= scale_max:
+        raise InstrumentError(f"{where}: skalan måste ha min < max")
+    # 0 betyder obesvarad i matriser och lagring, och packade kolumner rymmer 1..15
+    if scale_min < 1 or scale_max > 15:
+        raise InstrumentError(f"{where}: skalan måste ligga inom 1..15, fick {scale_min}..{scale_max}")
+    if len(labels) != scale_max - scale_min + 1:
+        raise InstrumentError(f"{where}: {len(labels)} skaletiketter för skala {scale_min}..{scale_max}")
+    if [q.id for q in questions] != list(range(1, len(questions) + 1)):
+        raise InstrumentError(f"{where}: frågorna måste numreras 1..n i ordning")
+
+    # fel längre in i definitionen (saknade nycklar, fel typ) blir också InstrumentError
+    try:
+        categories: List[Category] = []
+        covered: set = set()
+        for cat in raw_categories:
+            first, last = (int(x) for x in cat["questions"])
+            if not 1 <= first <= last <= len(questions):
+                raise InstrumentError(f"{where}: kategorin {cat['key']} har ogiltigt intervall {first}–{last}")
+            ids = tuple(range(first, last + 1))
+            if covered.intersection(ids):
+                raise InstrumentError(f"{where}: kategorin {cat['key']} överlappar en annan kategori")
+            covered.update(ids)
+            categories.append(Category(
+                key=str(cat["key"]),
+                title=str(cat["title"]),
+                first=first,
+                last=last,
+                payload_field=cat.get("payloadField") or f"sum_{cat['key']}",
+                texts=tuple(cat.get("text", ())),
+                question_ids=ids,
+                max_sum=len(ids) * scale_max,
+            ))
+        if not categories:
+            raise InstrumentError(f"{where}: minst en kategori krävs")
+
+        bands = tuple(
+            (None if b.get("min") is None else float(b["min"]), Band(str(b["label"]), str(b["color"])))
+            for b in raw_bands
+        )
+        thresholds = [t for t, _ in bands if t is not None]
+        if not bands or bands[-1][0] is not None or thresholds != sorted(thresholds, reverse=True):
+            raise InstrumentError(f"{where}: klassningen måste ha fallande trösklar och sluta med en utan min")
+
+        next_steps = tuple(
+            NextStep(
+                s["heading"],
+                tuple(s.get("paragraphs", ())),
+                tuple((b["strong"], b["text"]) for b in s.get("bullets", ())),
+            )
+            for s in spec.get("nextSteps", ())
+        )
+    except InstrumentError:
+        raise
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise InstrumentError(f"{where}: ofullständig kategori, klassning eller nästa steg: {e!r}") from e
+    return ScoringPlan(
+        id=ident,
+        version=version,
+        language=spec.get("language", "sv"),
+        title=spec.get("title", ident),
+        report_title=spec.get("reportTitle", spec.get("title", ident)),
+        scale_min=scale_min,
+        scale_max=scale_max,
+        scale_labels=labels,
+        questions=questions,
+        categories=tuple(categories),
+        bands=bands,
+        next_steps=next_steps,
+        blocks=tuple((c.first - 1, c.last) for c in categories),
+    )
+
+
+# ---------- Register ----------
+@lru_cache(maxsize=None)
+def available_instruments() -> Dict[str, Tuple[int, ...]]:
+    """Instrument-id → versioner som finns som JSON i SPEC_DIR."""
+    found: Dict[str, List[int]] = {}
+    for path in SPEC_DIR.glob("*.json"):
+        m = _SPEC_FILE.match(path.name)
+        if m:
+            found.setdefault(m["id"], []).append(int(m["version"]))
+    return {k: tuple(sorted(v)) for k, v in found.items()}
+
+
+# (id, version) → kompilerad plan; begränsat av antalet definitioner i SPEC_DIR
+_plans: Dict[Tuple[str, int], ScoringPlan] = {}
+
+
+def _load(instrument_id: str, version: int) -> ScoringPlan:
+    plan = _plans.get((instrument_id, version))
+    if plan is None:
+        # två trådar kan kompilera samtidigt; den sista vinner och båda planerna är likvärdiga
+        plan = _plans[(instrument_id, version)] = _compile_file(instrument_id, version)
+    return plan
+
+
+def _compile_file(instrument_id: str, version: int) -> ScoringPlan:
+    path = SPEC_DIR / f"{instrument_id}.v{version}.json"
+    try:
+        spec = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise InstrumentError(f"Instrumentet {instrument_id}.v{version} finns inte") from None
+    except (OSError, ValueError) as e:
+        raise InstrumentError(f"{path.name} kan inte läsas: {e}") from e
+    plan = compile_instrument(spec)
+    if (plan.id, plan.version) != (instrument_id, version):
+        raise InstrumentError(f"{path.name} innehåller {plan.key}")
+    return plan
+
+
+def get_plan(instrument_id: str = DEFAULT_INSTRUMENT, version: Optional[int] = None) -> ScoringPlan:
+    """Kompilerad plan för instrumentet; senaste versionen om ingen anges.
+
+    Bara definitioner som finns i SPEC_DIR kan laddas, så id:t blir aldrig en
+    godtycklig sökväg.
+    """
+    versions = available_instruments().get(instrument_id)
+    if not versions:
+        raise InstrumentError(f"Instrumentet {instrument_id} finns inte")
+    if version is None:
+        version = versions[-1]
+    elif version not in versions:
+        raise InstrumentError(f"Instrumentet {instrument_id}.v{version} finns inte")
+    return _load(instrument_id, version)
+
+
+def plan_for_key(key: Optional[str]) -> ScoringPlan:
+    """Plan från en nyckel som "funktionellt-ledarskap.v1" (eller bara id); None = standard.
+
+    En felformad nyckel ger InstrumentError, precis som en okänd.
+    """
+    if not key:
+        return default_plan()
+    m = _KEY.fullmatch(key) if isinstance(key, str) else None
+    if m is None:
+        raise InstrumentError(f"Ogiltig instrumentnyckel {key!r}")
+    return get_plan(m["id"], int(m["version"]) if m["version"] else None)
+
+
+def plan_for_row(row: Mapping[str, Any]) -> ScoringPlan:
+    """Planen för en inlämningsrad: "instrument" som "id.vN"; saknas fältet används standardinstrumentet."""
+    return plan_for_key(row.get("instrument") or None)
+
+
+def default_plan() -> ScoringPlan:
+    return get_plan(DEFAULT_INSTRUMENT)
+
+
+def invalidate(key: str) -> None:
+    """Glömmer en plan ("id.vN", eller alla versioner av "id") efter att dess definition ändrats på disk."""
+    m = _KEY.fullmatch(key)
+    if m is None:
+        return
+    available_instruments.cache_clear()  # en ny version kan ha lagts till
+    version = int(m["version"]) if m["version"] else None
+    for cached in [k for k in _plans if k[0] == m["id"] and version in (None, k[1])]:
+        _plans.pop(cached, None)
+
+
+def clear_cache() -> None:
+    """Glömmer alla kompilerade planer."""
+    available_instruments.cache_clear()
+    _plans.clear()
@@ -0,0 +1,294 @@
+"""Asynkron rapportpipeline: jobb-ID direkt, PDF och leverans i bakgrunden.
+
+`submit()` skapar mätnings-ID:t (som också är jobb-ID) och returnerar direkt.
+En begränsad pool av arbetstrådar renderar PDF:en – i en processpool om
+`processes > 0`, så att reportlab inte konkurrerar med webbservern om GIL –
+lagrar inlämningen och lägger webhooken i utkorgen. Gränssnittet frågar
+`status()` tills jobbet är klart:
+
+    queued → rendering → delivering → delivered
+                     ↘ failed        ↘ failed (dead-letter)
+
+Antalet arbetare och väntekön är begränsade (se admission.py). Får ett jobb
+inte plats i kön blir det `deferred`: poängen visas ändå direkt, och PDF:en
+renderas när kön är tom. Även den uppskjutna listan har ett tak; därutöver
+misslyckas jobbet direkt med "överbelastad" och kan skickas igen.
+
+Med ett idempotensindex kortsluts ett likadant inskick (omladdning, omförsök)
+till det befintliga jobbet i stället för att ge en ny PDF och en ny post.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional
+
+from .admission import FairQueue, default_limit, default_queue_size
+from .aggregates import company_key
+from .core import Answers, Contact, generate_measurement_id
+from .instrument import ScoringPlan, plan_for_key
+from .metrics import STAGE_SECONDS, counter, span
+from .report import build_pdf, report_file_name
+from .webhook import TRANSPORT, WEBHOOK_SECRET, WEBHOOK_URL, enqueue_webhook_blob, enqueue_webhook_pdf
+
+if TYPE_CHECKING:
+    from .aggregates import AggregateStore
+    from .blobstore import BlobStore
+    from .columnstore import ColumnStore
+    from .idempotency import IdempotencyIndex
+    from .outbox import Outbox
+    from .percentiles import PercentileStore
+
+log = logging.getLogger(__name__)
+
+QUEUED, DEFERRED, RENDERING, DELIVERING, DELIVERED, FAILED = (
+    "queued", "deferred", "rendering", "delivering", "delivered", "failed"
+)
+MAX_JOBS = 10_000  # avslutade jobb som behålls för statusfrågor
+MAX_DEFERRED = 5_000  # uppskjutna jobb; därefter avvisas inskicket
+
+DEDUPLICATED = counter("fl_submissions_deduplicated_total", "Inskick som kortslöts till ett tidigare jobb.")
+DEFERRED_TOTAL = counter("fl_reports_deferred_total", "Rapporter som sköts upp för att väntekön var full.")
+OVERLOADED = counter("fl_reports_overloaded_total", "Rapporter som avvisades för att även den uppskjutna listan var full.")
+
+
+@dataclass
+class ReportJob:
+    id: str
+    contact: Contact
+    answers: Answers
+    plan: ScoringPlan
+    file_name: str
+    state: str = QUEUED
+    pdf: Optional[bytes] = None
+    error: Optional[str] = None
+    message_id: Optional[int] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    rendered_at: Optional[float] = None
+    deliver: bool = True  # False: webhooken ligger redan i utkorgen, bara PDF:en behövs
+    stored: bool = False  # True: redan inräknat i aggregat, kolumnlagring och percentiler
+    ranks: Optional[Dict[str, int]] = None  # percentilrang mot tidigare respondenter, per delområde och "total"
+
+    @property
+    def done(self) -> bool:
+        return self.state in (DELIVERED, FAILED)
+
+    @property
+    def card_ranks(self) -> Optional[List[int]]:
+        """Rangerna i kategoriordning, som rapportens kort."""
+        return [self.ranks[cat.key] for cat in self.plan.categories] if self.ranks else None
+
+
+def render_report(
+    contact: Contact, answers: Answers, measurement_id: str, plan_key: str, ranks: Optional[List[int]] = None
+) -> bytes:
+    """Körs i arbetsprocessen; planen slås upp där i stället för att picklas."""
+    return build_pdf(contact, answers, measurement_id, plan=plan_for_key(plan_key), ranks=ranks)
+
+
+class ReportPipeline:
+    """Jobbkö med `workers` samtidiga rapporter och `queue_size` väntande. Trådsäker."""
+
+    def __init__(
+        self,
+        outbox: "Outbox",
+        blobs: Optional["BlobStore"] = None,
+        aggregates: Optional["AggregateStore"] = None,
+        submissions: Optional["ColumnStore"] = None,
+        idempotency: Optional["IdempotencyIndex"] = None,
+        percentiles: Optional["PercentileStore"] = None,
+        workers: Optional[int] = None,
+        processes: int = 0,
+        queue_size: Optional[int] = None,
+        max_deferred: int = MAX_DEFERRED,
+        url: str = WEBHOOK_URL,
+        secret: str = WEBHOOK_SECRET,
+        transport: str = TRANSPORT,
+    ):
+        self.outbox = outbox
+        self.blobs = blobs
+        self.aggregates = aggregates
+        self.submissions = submissions
+        self.idempotency = idempotency
+        self.percentiles = percentiles
+        self.url = url
+        self.secret = secret
+        self.transport = transport
+        self.workers = workers or default_limit()
+        self.max_deferred = max_deferred
+        self._queue: FairQueue[ReportJob] = FairQueue(
+            "report", queue_size if queue_size is not None else default_queue_size(self.workers)
+        )
+        self._deferred: Deque[ReportJob] = deque()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"report-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        # spawn: fork i en flertrådad server kan ärva låsta lås
+        self._processes = (
+            ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            if processes else None
+        )
+        self._jobs: "OrderedDict[str, ReportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._render_s: Deque[float] = deque(maxlen=1000)
+        self._queue_s: Deque[float] = deque(maxlen=1000)
+
+    def submit(self, contact: Contact, answers: Answers, plan: ScoringPlan) -> str:
+        """Köar en rapport och returnerar jobb-ID:t (= mätnings-ID) direkt."""
+        job = ReportJob(generate_measurement_id(), contact, dict(answers), plan, report_file_name(contact))
+        existing = self.idempotency.claim(contact.email, answers, plan, job.id) if self.idempotency else None
+        with self._lock:
+            if existing is not None:
+                DEDUPLICATED.inc()
+                previous = self._jobs.get(existing)
+                if previous is not None and not (previous.state == FAILED and previous.message_id is None):
+                    return existing  # pågår eller klart: samma jobb, ingen ny PDF, ingen ny post
+                job.id = existing
+                # misslyckat eller borta efter omstart: fortsätt med samma ID från det steg
+                # indexet har noterat, så att inget lagras två gånger och inget tappas
+                stored, enqueued = self.idempotency.progress(existing)
+                job.stored, job.deliver = stored, not enqueued
+            self._jobs[job.id] = job
+            self._evict()
+        if self.percentiles is not None:
+            # mot dem som svarat före: rangen är klar direkt, även om PDF:en skjuts upp
+            job.ranks = self.percentiles.ranks(plan, plan.sums(answers))
+        if self._queue.offer(company_key(contact.company), job):
+            return job.id
+        with self._lock:
+            if len(self._deferred) < self.max_deferred:
+                job.state = DEFERRED
+                self._deferred.append(job)
+                DEFERRED_TOTAL.inc()
+                return job.id
+        OVERLOADED.inc()
+        job.state, job.error = FAILED, "överbelastad, försök igen om en stund"
+        return job.id
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and job.state == DELIVERING and job.message_id is not None:
+            outbox_state = self.outbox.status(job.message_id)
+            if outbox_state == "delivered":
+                job.state = DELIVERED
+            elif outbox_state == "dead":
+                job.state, job.error = FAILED, "webhooken kunde inte levereras"
+        return job
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return {"id": job.id, "state": job.state, "hasPdf": job.pdf is not None, "error": job.error, "ranks": job.ranks}
+
+    def _evict(self) -> None:
+        # äldsta avslutade jobb först; pågående jobb släpps aldrig
+        excess = len(self._jobs) - MAX_JOBS
+        for job_id in [j.id for j in self._jobs.values() if j.done][:max(0, excess)]:
+            del self._jobs[job_id]
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            # uppskjutna jobb tas bara när väntekön är tom
+            job = self._queue.get(timeout=0 if self._deferred else 0.5)
+            if job is None:
+                with self._lock:
+                    job = self._deferred.popleft() if self._deferred else None
+                if job is None:
+                    continue
+                self._queue.start()
+            try:
+                self._run(job)
+            finally:
+                self._queue.done()
+
+    def _run(self, job: ReportJob) -> None:
+        job.started_at = time.time()
+        job.state = RENDERING
+        STAGE_SECONDS.observe(job.started_at - job.submitted_at, stage="queue")
+        try:
+            # i processpoolen hamnar delstegens spann i arbetsprocessen; här syns hela renderingen
+            with span("render", job.id):
+                if self._processes is not None:
+                    job.pdf = self._processes.submit(
+                        render_report, job.contact, job.answers, job.id, job.plan.key, job.card_ranks
+                    ).result()
+                else:
+                    job.pdf = build_pdf(job.contact, job.answers, job.id, plan=job.plan, ranks=job.card_ranks)
+            job.rendered_at = time.time()
+            with self._lock:
+                self._queue_s.append(job.started_at - job.submitted_at)
+                self._render_s.append(job.rendered_at - job.started_at)
+            if not job.deliver:
+                job.state = DELIVERED
+                return
+            if not job.stored:
+                with span("store", job.id):
+                    if self.aggregates is not None:
+                        self.aggregates.record(job.contact, job.answers, job.plan, job.id)
+                    if self.submissions is not None:
+                        self.submissions.append(job.contact, job.answers, job.plan, job.id)
+                    if self.percentiles is not None:
+                        self.percentiles.record(job.contact, job.answers, job.plan, job.id)
+                job.stored = True
+                if self.idempotency is not None:
+                    self.idempotency.mark_stored(job.id)
+            with span("payload", job.id):
+                job.message_id = self._enqueue(job)
+            if self.idempotency is not None:
+                self.idempotency.mark_enqueued(job.id)
+            job.state = DELIVERING if job.message_id is not None else DELIVERED
+        except Exception as e:
+            log.exception("Rapport %s misslyckades", job.id)
+            job.error = repr(e)
+            job.state = FAILED
+
+    def _enqueue(self, job: ReportJob) -> Optional[int]:
+        if self.transport == "blob" and self.blobs is not None:
+            return enqueue_webhook_blob(
+                self.outbox, self.blobs, self.url, job.contact, job.answers, job.pdf, job.file_name,
+                self.secret, job.id, plan=job.plan,
+            )
+        return enqueue_webhook_pdf(
+            self.outbox, self.url, job.contact, job.answers, job.pdf, job.file_name, self.secret, job.id, job.plan
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        """Antal jobb per tillstånd samt kötid och renderingstid (p50/p95)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            queue_s, render_s = sorted(self._queue_s), sorted(self._render_s)
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        stats: Dict[str, Any] = {
+            "jobs": counts, "workers": self.workers, "queued": len(self._queue), "deferred": len(self._deferred),
+        }
+        for name, values in (("queue", queue_s), ("render", render_s)):
+            if values:
+                stats[f"{name}P50"] = values[len(values) // 2]
+                stats[f"{name}P95"] = values[min(len(values) - 1, int(len(values) * 0.95))]
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stänger kön; med `wait` töms den (men inte den uppskjutna listan) först."""
+        if wait:
+            while len(self._queue):
+                time.sleep(0.05)
+        self._stop.set()
+        self._queue.close()
+        if wait:
+            for t in self._threads:
+                t.join()
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait)
@@ -0,0 +1,287 @@
+"""Spårning per steg och mätvärden i Prometheus textformat.
+
+`span(stage, key)` tidtar ett steg i rapportflödet (poängsättning, layout,
+serialisering, payload, leverans …) och matar histogram för latens, räknare
+för fel och en gauge för pågående steg. Spann med nyckel (mätnings-ID) sparas
+också i en begränsad ringbuffert så att en enskild långsam rapport kan följas.
+Allt hålls i processens minne; ett span kostar några mikrosekunder.
+Vilket steg och vilken nyckel varje tråd just nu är i syns i `active_spans()`,
+så att profileraren kan sortera sina stickprov per steg och mätnings-ID.
+
+I appen startas endpointen när `FL_METRICS_PORT` är satt:
+`/metrics` (Prometheus) och `/trace/<mätnings-ID>` (JSON).
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 1048576)
+MAX_TRACES = 2000
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+# ---------- Mätvärden ----------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        """Värdet hämtas först när mätvärdena läses (t.ex. ködjup)."""
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def samples(self) -> Iterator[str]:
+        yield from super().samples()
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                value = fn()
+            except Exception:  # en trasig callback ska inte fälla hela endpointen
+                continue
+            yield f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per etikett: [antal per hink (sista = +Inf), summa, antal]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                cumulative += c
+                le = 'le="' + _fmt_value(bound) + '"'
+                yield f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total)}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+STAGE_SECONDS = histogram("fl_stage_seconds", "Tid per steg i rapportflödet.", ("stage",))
+STAGE_ERRORS = counter("fl_stage_errors_total", "Steg som avbröts av ett undantag.", ("stage", "error"))
+STAGE_INFLIGHT = gauge("fl_stage_inflight", "Pågående steg just nu.", ("stage",))
+PAYLOAD_BYTES = histogram("fl_payload_bytes", "Storlek på PDF:er och webhook-kroppar.", ("kind",), SIZE_BUCKETS)
+
+
+# ---------- Spårning ----------
+class _Traces:
+    """Senaste spannen per nyckel; de äldsta nycklarna släpps när bufferten är full."""
+
+    def __init__(self, max_keys: int = MAX_TRACES):
+        self.max_keys = max_keys
+        self._spans: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, key: str, span: dict) -> None:
+        with self._lock:
+            spans = self._spans.get(key)
+            if spans is None:
+                spans = self._spans[key] = []
+                if len(self._spans) > self.max_keys:
+                    self._spans.popitem(last=False)
+            spans.append(span)
+
+    def get(self, key: str) -> List[dict]:
+        with self._lock:
+            return list(self._spans.get(key, ()))
+
+
+TRACES = _Traces()
+_ACTIVE: Dict[int, Tuple[str, Optional[str]]] = {}  # tråd-id → innersta pågående (steg, nyckel)
+
+
+def active_spans() -> Dict[int, Tuple[str, Optional[str]]]:
+    """Innersta pågående steg och nyckel per tråd."""
+    return dict(_ACTIVE)
+
+
+@contextmanager
+def span(stage: str, key: Optional[str] = None) -> Iterator[None]:
+    """Tidtar ett steg; med `key` (mätnings-ID) sparas spannet även för /trace/<key>."""
+    STAGE_INFLIGHT.inc(stage=stage)
+    thread = threading.get_ident()
+    outer = _ACTIVE.get(thread)
+    _ACTIVE[thread] = (stage, key if key is not None else outer[1] if outer else None)
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        STAGE_ERRORS.inc(stage=stage, error=error)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if outer is None:
+            _ACTIVE.pop(thread, None)
+        else:
+            _ACTIVE[thread] = outer
+        STAGE_INFLIGHT.dec(stage=stage)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if key is not None:
+            TRACES.record(key, {"stage": stage, "start": started_at, "seconds": elapsed, "error": error})
+
+
+def observe_size(kind: str, n_bytes: int) -> None:
+    PAYLOAD_BYTES.observe(n_bytes, kind=kind)
+
+
+# ---------- Endpoint ----------
+class _Handler(BaseHTTPRequestHandler):
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/metrics":
+            self._reply(200, REGISTRY.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        elif self.path.startswith("/trace/"):
+            spans = TRACES.get(self.path[len("/trace/"):])
+            body = json.dumps({"spans": spans}).encode("utf-8")
+            self._reply(200 if spans else 404, body, "application/json")
+        else:
+            self._reply(404, b"not found\n", "text/plain")
+
+    def _reply(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    """Startar endpointen i en bakgrundstråd."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,543 @@
+"""Beständig utkorg för webhook-leveranser.
+
+Inlämningar läggs i en SQLite-kö på disk och levereras av en arbetare med
+flera trådar över återanvända HTTP-anslutningar. Misslyckade leveranser
+försöks igen med exponentiell backoff (full jitter), 429/503 respekterar
+Retry-After (högst `max_delay`), och permanenta fel eller för många försök
+hamnar i en dead-letter-tabell i stället för att tappas.
+
+Ett meddelande som tas för leverans lånas ut i `FL_OUTBOX_LEASE` sekunder.
+Flera processer kan dela kön; ett meddelande vars lån gått ut (processen dog
+mitt i leveransen) tas upp igen, men aldrig ett som en annan arbetare håller på
+med.
+
+    python -m sjalvskattning.outbox run --db .data/outbox.sqlite3
+    python -m sjalvskattning.outbox stats --db .data/outbox.sqlite3
+"""
+from __future__ import annotations
+
+import argparse
+import email.utils
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .admission import WEBHOOK_BURST, WEBHOOK_RATE, TokenBucket
+from .metrics import STAGE_ERRORS, observe_size, span
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DB = os.environ.get("FL_OUTBOX_DB", ".data/outbox.sqlite3")
+LEASE_S = float(os.environ.get("FL_OUTBOX_LEASE", "300"))  # längre än HTTP-timeouten
+_CLAIMS = itertools.count(1)  # varje lån får ett eget id, även mellan köer i samma process
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    content_type TEXT NOT NULL DEFAULT 'application/json',
+    content_encoding TEXT,
+    key TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT,
+    claimed_until REAL,
+    claimed_by TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox(state, next_attempt_at);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    content_type TEXT NOT NULL,
+    content_encoding TEXT,
+    key TEXT,
+    attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+
+@dataclass
+class Message:
+    id: int
+    url: str
+    body: bytes
+    content_type: str
+    content_encoding: Optional[str]
+    attempts: int
+    created_at: float
+    key: Optional[str] = None  # mätnings-ID, för spårning
+    claimed_by: Optional[str] = None  # lånet; bara den som håller det får ändra raden
+
+
+# ---------- Kön ----------
+class Outbox:
+    """SQLite-backad kö. Trådsäker; en anslutning skyddad av ett lås."""
+
+    def __init__(self, path: str = DEFAULT_DB, lease_s: float = LEASE_S):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._version = 0
+        self.lease_s = lease_s
+        # Meddelanden som var "inflight" när en process dog tas upp igen när lånet gått ut
+        # (claim); andra processers pågående leveranser lämnas i fred
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _migrate(self) -> None:
+        # köer skapade före content_encoding-, key- och lånekolumnerna
+        for table in ("outbox", "dead_letter"):
+            cols = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            for col in ("content_encoding", "key"):
+                if col not in cols:
+                    self._db.execute(f"ALTER TABLE {table} ADD COLUMN {col} TEXT")
+        cols = {row[1] for row in self._db.execute("PRAGMA table_info(outbox)")}
+        for col, kind in (("claimed_until", "REAL"), ("claimed_by", "TEXT")):
+            if col not in cols:
+                self._db.execute(f"ALTER TABLE outbox ADD COLUMN {col} {kind}")
+
+    def enqueue(
+        self,
+        url: str,
+        body: bytes,
+        content_type: str = "application/json",
+        content_encoding: Optional[str] = None,
+        key: Optional[str] = None,
+    ) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (url, body, content_type, content_encoding, key, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, content_type, content_encoding, key, now, now),
+            )
+        observe_size("webhook", len(body))
+        self.notify()
+        return cur.lastrowid
+
+    def enqueue_json(self, url: str, payload: Dict[str, Any], key: Optional[str] = None) -> int:
+        return self.enqueue(url, json.dumps(payload, ensure_ascii=False).encode("utf-8"), key=key)
+
+    # Versionsräknaren gör att en väckning mellan claim() och wait() inte går förlorad
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def notify(self) -> None:
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def wait(self, seen_version: int, timeout: float) -> None:
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != seen_version, timeout)
+
+    def claim(self, max_attempts: Optional[int] = None) -> Tuple[Optional[Message], Optional[float]]:
+        """Lånar ut nästa förfallna meddelande; annars (None, tid tills nästa förfaller).
+
+        Ett "inflight"-meddelande vars lån gått ut räknas som förfallet, och det
+        avbrutna försöket räknas; når det `max_attempts` flyttas det till
+        dead-letter i stället, så att ett meddelande som fäller sin arbetare
+        inte levereras om i all evighet. Lån från före lånekolumnerna (NULL) har
+        alltid gått ut.
+        """
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: två processer kan inte låna samma rad
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._db.execute(
+                        "SELECT id, url, body, content_type, content_encoding, attempts, created_at, key FROM outbox"
+                        " WHERE state = 'inflight' AND COALESCE(claimed_until, 0) <= ? ORDER BY id LIMIT 1",
+                        (now,),
+                    ).fetchone()
+                    if row is None:
+                        break
+                    row = (*row[:5], row[5] + 1, *row[6:])
+                    if max_attempts is None or row[5] < max_attempts:
+                        break
+                    log.warning("Webhook-leverans %s gav upp efter %s försök: lånet gick ut", row[0], row[5])
+                    self._bury(Message(*row), row[5], "Lånet gick ut (arbetaren dog eller hängde)", now)
+                row = row or self._db.execute(
+                    "SELECT id, url, body, content_type, content_encoding, attempts, created_at, key FROM outbox"
+                    " WHERE state = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    nxt = self._db.execute(
+                        "SELECT MIN(CASE state WHEN 'pending' THEN next_attempt_at ELSE claimed_until END)"
+                        " FROM outbox"
+                    ).fetchone()[0]
+                    self._db.execute("COMMIT")
+                    return None, (max(0.0, nxt - now) if nxt is not None else None)
+                claim = f"{self.owner}:{next(_CLAIMS)}"
+                self._db.execute(
+                    "UPDATE outbox SET state = 'inflight', attempts = ?, claimed_until = ?, claimed_by = ? WHERE id = ?",
+                    (row[5], now + self.lease_s, claim, row[0]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return Message(*row, claimed_by=claim), None
+
+    # release/delivered/retry/dead ändrar bara raden om lånet fortfarande är vårt;
+    # False betyder att det gått ut och att någon annan kan ha tagit över meddelandet
+    def release(self, msg: Message) -> bool:
+        """Lämnar tillbaka ett lånat meddelande utan att räkna ett försök (t.ex. vid stopp)."""
+        with self._lock:
+            owned = self._db.execute(
+                "UPDATE outbox SET state = 'pending', claimed_until = NULL, claimed_by = NULL"
+                " WHERE id = ? AND claimed_by = ?",
+                (msg.id, msg.claimed_by),
+            ).rowcount == 1
+        self.notify()
+        return owned
+
+    def delivered(self, msg: Message) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM outbox WHERE id = ? AND claimed_by = ?", (msg.id, msg.claimed_by)
+            ).rowcount == 1
+
+    def retry(self, msg: Message, delay: float, error: str) -> bool:
+        with self._lock:
+            owned = self._db.execute(
+                "UPDATE outbox SET state = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?,"
+                " claimed_until = NULL, claimed_by = NULL WHERE id = ? AND claimed_by = ?",
+                (time.time() + delay, error, msg.id, msg.claimed_by),
+            ).rowcount == 1
+        self.notify()
+        return owned
+
+    def dead(self, msg: Message, error: str) -> bool:
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                owned = self._db.execute(
+                    "SELECT 1 FROM outbox WHERE id = ? AND claimed_by = ?", (msg.id, msg.claimed_by)
+                ).fetchone() is not None
+                if owned:
+                    self._bury(msg, msg.attempts + 1, error, time.time())
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return owned
+
+    def _bury(self, msg: Message, attempts: int, error: str, now: float) -> None:
+        """Flyttar meddelandet till dead-letter; körs inom en öppen transaktion."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO dead_letter"
+            " (id, url, body, content_type, content_encoding, key, attempts, created_at, failed_at, last_error)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (msg.id, msg.url, msg.body, msg.content_type, msg.content_encoding, msg.key, attempts,
+             msg.created_at, now, error),
+        )
+        self._db.execute("DELETE FROM outbox WHERE id = ?", (msg.id,))
+
+    def requeue_dead(self) -> int:
+        """Flyttar tillbaka allt i dead-letter till kön (t.ex. efter att flödet lagats)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            n = self._db.execute(
+                "INSERT INTO outbox (url, body, content_type, content_encoding, key, next_attempt_at, created_at)"
+                " SELECT url, body, content_type, content_encoding, key, ?, created_at FROM dead_letter",
+                (now,),
+            ).rowcount
+            self._db.execute("DELETE FROM dead_letter")
+            self._db.execute("COMMIT")
+        self.notify()
+        return n
+
+    def status(self, message_id: int) -> str:
+        """pending, inflight, dead eller delivered (levererade meddelanden tas bort ur kön)."""
+        with self._lock:
+            row = self._db.execute("SELECT state FROM outbox WHERE id = ?", (message_id,)).fetchone()
+            if row is not None:
+                return row[0]
+            dead = self._db.execute("SELECT 1 FROM dead_letter WHERE id = ?", (message_id,)).fetchone()
+        return "dead" if dead else "delivered"
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            pending, inflight = self._db.execute(
+                "SELECT COALESCE(SUM(state = 'pending'), 0), COALESCE(SUM(state = 'inflight'), 0) FROM outbox"
+            ).fetchone()
+            dead = self._db.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {"pending": pending, "inflight": inflight, "dead": dead}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# ---------- HTTP-anslutningspool ----------
+class ConnectionPool:
+    """Håller keep-alive-anslutningar per värd så att TLS-handskakningen görs en gång."""
+
+    def __init__(self, max_per_host: int = 8, timeout: float = 30.0):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return parts.scheme, parts.hostname or "", port
+
+    def _connect(self, key: Tuple[str, str, int]) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def _acquire(self, key) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def post(self, url: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        key = self._key(url)
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        conn, reused = self._acquire(key)
+        try:
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                if not reused:
+                    raise
+                # servern stängde en vilande anslutning – försök en gång till på en ny
+                conn.close()
+                conn = self._connect(key)
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return resp.status, {k.lower(): v for k, v in resp.getheaders()}, data
+
+    def close(self) -> None:
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+# ---------- Leverans ----------
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After kan vara sekunder eller ett HTTP-datum."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class DeliveryWorker:
+    """Tömmer utkorgen med `concurrency` trådar som delar en anslutningspool och en taktgräns."""
+
+    RETRYABLE = {408, 425, 429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        concurrency: int = 4,
+        max_attempts: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        pool: Optional[ConnectionPool] = None,
+        rate: Optional[TokenBucket] = None,
+    ):
+        self.outbox = outbox
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.pool = pool or ConnectionPool(max_per_host=concurrency)
+        self.rate = rate or TokenBucket("webhook", WEBHOOK_RATE, WEBHOOK_BURST)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self.delivered_total = 0
+        self.retries_total = 0
+        self.dead_total = 0
+        self.throttled_total = 0
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+    def backoff(self, attempts: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempts))
+
+    def start(self) -> "DeliveryWorker":
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self.outbox.notify()
+        for t in self._threads:
+            t.join(timeout)
+        self.pool.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            seen = self.outbox.version
+            msg, wait_s = self.outbox.claim(self.max_attempts)
+            if msg is None:
+                self.outbox.wait(seen, min(wait_s, 5.0) if wait_s is not None else 5.0)
+                continue
+            if not self.rate.acquire(self._stop):
+                self.outbox.release(msg)  # stoppad innan leveransen började
+                return
+            self.deliver(msg)
+
+    def deliver(self, msg: Message) -> None:
+        try:
+            headers = {"Content-Type": msg.content_type}
+            if msg.content_encoding:
+                headers["Content-Encoding"] = msg.content_encoding
+            with span("deliver", msg.key):
+                status, headers, data = self.pool.post(msg.url, msg.body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            self._fail(msg, f"{type(e).__name__}: {e}", None)
+            return
+        if 200 <= status < 300:
+            if not self.outbox.delivered(msg):
+                log.warning("Webhook-leverans %s levererades efter att lånet gått ut", msg.id)
+            with self._stats_lock:
+                self.delivered_total += 1
+                self._latencies.append(time.time() - msg.created_at)
+            return
+        error = f"HTTP {status} {data[:200].decode('utf-8', 'replace')}"
+        STAGE_ERRORS.inc(stage="deliver", error=f"HTTP {status}")
+        if status not in self.RETRYABLE:
+            self._dead(msg, error)
+            return
+        if status == 429:
+            with self._stats_lock:
+                self.throttled_total += 1
+        self._fail(msg, error, retry_after_seconds(headers.get("retry-after")))
+
+    def _fail(self, msg: Message, error: str, retry_after: Optional[float]) -> None:
+        if msg.attempts + 1 >= self.max_attempts:
+            self._dead(msg, error)
+            return
+        # Retry-After följs, men aldrig längre än max_delay
+        delay = min(retry_after, self.max_delay) if retry_after is not None else self.backoff(msg.attempts)
+        log.info("Webhook-leverans %s misslyckades (%s), nytt försök om %.1f s", msg.id, error, delay)
+        if not self.outbox.retry(msg, delay, error):
+            log.warning("Webhook-leverans %s: lånet hade gått ut, en annan arbetare har tagit över", msg.id)
+            return
+        with self._stats_lock:
+            self.retries_total += 1
+
+    def _dead(self, msg: Message, error: str) -> None:
+        log.warning("Webhook-leverans %s gav upp efter %s försök: %s", msg.id, msg.attempts + 1, error)
+        if not self.outbox.dead(msg, error):
+            log.warning("Webhook-leverans %s: lånet hade gått ut, en annan arbetare har tagit över", msg.id)
+            return
+        with self._stats_lock:
+            self.dead_total += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Ködjup, leveranslatens (köad → levererad) och antal omförsök."""
+        with self._stats_lock:
+            lat = sorted(self._latencies)
+            stats: Dict[str, Any] = {
+                "delivered": self.delivered_total,
+                "retries": self.retries_total,
+                "throttled": self.throttled_total,
+                "deadLettered": self.dead_total,
+            }
+        if lat:
+            stats["latencyP50"] = lat[len(lat) // 2]
+            stats["latencyP95"] = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+            stats["latencyMax"] = lat[-1]
+        stats["depth"] = self.outbox.depth()
+        return stats
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hantera webhook-utkorgen.")
+    parser.add_argument("command", choices=("run", "stats", "requeue-dead"))
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"sökväg till kön (default: {DEFAULT_DB})")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--max-attempts", type=int, default=8)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    outbox = Outbox(args.db)
+    if args.command == "stats":
+        print(json.dumps(outbox.depth()))
+        return 0
+    if args.command == "requeue-dead":
+        print(f"{outbox.requeue_dead()} meddelanden tillbaka i kön", file=sys.stderr)
+        return 0
+
+    worker = DeliveryWorker(outbox, concurrency=args.concurrency, max_attempts=args.max_attempts).start()
+    try:
+        while True:
+            time.sleep(10)
+            log.info("utkorg: %s", json.dumps(worker.metrics()))
+    except KeyboardInterrupt:
+        worker.stop(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
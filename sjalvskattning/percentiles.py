@@ -0,0 +1,259 @@
+"""Percentilrang per delområde jämfört med tidigare respondenter, totalt och per företag.
+
+Summorna är små heltal (t.ex. 7–49 för sju frågor på en 7-gradig skala).
+I stället för en approximativ skiss (t-digest, KLL) hålls därför en exakt
+frekvenstabell per möjlig summa. Den är lika sammanslagbar (tabeller
+adderas), tar lika lite plats oavsett antal inlämningar och ger exakt rang.
+Varje inlämning ökar en rad per delområde och omfång i SQLite. Läsningen
+går mot ett Fenwickträd i minnet, så en rang slås upp i O(log k) utan att
+några rådata läses. Andra processers inlämningar syns efter `refresh_s`
+sekunder.
+
+Rangen är mittrang: andelen med lägre summa plus halva andelen med samma
+summa, i procent. Under `MIN_N` jämförelser visas ingen rang.
+
+    python -m sjalvskattning.percentiles show --company "Acme AB"
+    python -m sjalvskattning.percentiles ingest export-fran-sharepoint.csv
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .aggregates import company_key
+from .core import Answers, Contact, answers_from_row, measurement_id_from_row
+from .instrument import ScoringPlan, plan_for_key, plan_for_row
+
+DEFAULT_DB = os.environ.get("FL_PERCENTILES_DB", ".data/percentiles.sqlite3")
+MIN_N = int(os.environ.get("FL_PERCENTILE_MIN_N", "30"))
+REFRESH_S = float(os.environ.get("FL_PERCENTILE_REFRESH", "60"))
+ALL = "*"
+TOTAL = "total"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dist (
+    scope TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    category TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (scope, instrument, category, value)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counted (
+    measurement_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+def company_scope(company: str) -> str:
+    return "company:" + company_key(company)
+
+
+def _bounds(plan: ScoringPlan) -> Dict[str, Tuple[int, int]]:
+    """Lägsta och högsta summa per delområde och totalt."""
+    bounds = {cat.key: (len(cat.question_ids) * plan.scale_min, cat.max_sum) for cat in plan.categories}
+    bounds[TOTAL] = (sum(lo for lo, _ in bounds.values()), sum(hi for _, hi in bounds.values()))
+    return bounds
+
+
+def _values(plan: ScoringPlan, sums: Sequence[int]) -> Dict[str, int]:
+    values = {cat.key: s for cat, s in zip(plan.categories, sums)}
+    values[TOTAL] = sum(sums)
+    return values
+
+
+# ---------- Fördelning ----------
+class Fenwick:
+    """Prefixsummor över 0..size-1 med uppdatering och uppslag i O(log size)."""
+
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def add(self, i: int, delta: int) -> None:
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Summan av position 0..i-1."""
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class Distribution:
+    """Exakt fördelning av heltalssummor i [lo, hi]; sammanslagbar genom addition."""
+
+    def __init__(self, lo: int, hi: int):
+        self.lo, self.hi = lo, hi
+        self.counts = [0] * (hi - lo + 1)
+        self.n = 0
+        self._tree = Fenwick(len(self.counts))
+
+    def add(self, value: int, n: int = 1) -> None:
+        i = min(max(value, self.lo), self.hi) - self.lo
+        self.counts[i] += n
+        self._tree.add(i, n)
+        self.n += n
+
+    def merge(self, other: "Distribution") -> None:
+        for i, c in enumerate(other.counts):
+            if c:
+                self.add(self.lo + i, c)
+
+    def rank(self, value: int) -> Optional[float]:
+        """Mittrang i procent (0–100); None för en tom fördelning."""
+        if not self.n:
+            return None
+        i = min(max(value, self.lo), self.hi) - self.lo
+        below = self._tree.prefix(i)
+        return 100.0 * (below + self.counts[i] / 2) / self.n
+
+    def quantile(self, q: float) -> Optional[int]:
+        """Minsta summa med minst andelen `q` av fördelningen vid eller under sig."""
+        if not self.n:
+            return None
+        need, seen = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= need and seen:
+                return self.lo + i
+        return self.hi
+
+
+# ---------- Lagring ----------
+class PercentileStore:
+    """SQLite-backade fördelningar med en cache i minnet. Trådsäker."""
+
+    def __init__(
+        self, path: str = DEFAULT_DB, refresh_s: float = REFRESH_S, min_n: int = MIN_N, read_only: bool = False
+    ):
+        self.refresh_s = refresh_s
+        self.min_n = min_n
+        if read_only:
+            # bara läsning (t.ex. API:t): filen måste finnas och skapas aldrig
+            uri = f"file:{Path(path).resolve().as_posix()}?mode=ro"
+            self._db = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None, timeout=30)
+        else:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Distribution]]] = {}
+
+    def record(self, contact: Contact, answers: Answers, plan: ScoringPlan, measurement_id: Optional[str] = None) -> bool:
+        """Räknar in en inlämning totalt och för företaget; False om mätnings-ID:t redan är räknat."""
+        values = _values(plan, plan.sums(answers))
+        scopes = (ALL, company_scope(contact.company))
+        rows = [(scope, plan.key, key, value) for scope in scopes for key, value in values.items()]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if measurement_id is not None:
+                    cur = self._db.execute("INSERT OR IGNORE INTO counted (measurement_id) VALUES (?)", (measurement_id,))
+                    if not cur.rowcount:
+                        self._db.execute("ROLLBACK")
+                        return False
+                self._db.executemany(
+                    "INSERT INTO dist (scope, instrument, category, value, n) VALUES (?, ?, ?, ?, 1)"
+                    " ON CONFLICT (scope, instrument, category, value) DO UPDATE SET n = n + 1",
+                    rows,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            # inlästa fördelningar uppdateras på plats i stället för att läsas om
+            for scope in scopes:
+                cached = self._cache.get((scope, plan.key))
+                if cached is not None:
+                    for key, value in values.items():
+                        cached[1][key].add(value)
+        return True
+
+    def distributions(self, plan: ScoringPlan, scope: str = ALL) -> Dict[str, Distribution]:
+        """Fördelning per delområde (och "total") för planen i omfånget."""
+        key = (scope, plan.key)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.refresh_s:
+                return cached[1]
+            rows = self._db.execute(
+                "SELECT category, value, n FROM dist WHERE scope = ? AND instrument = ?", key
+            ).fetchall()
+            dists = {k: Distribution(lo, hi) for k, (lo, hi) in _bounds(plan).items()}
+            for category, value, n in rows:
+                if category in dists:
+                    dists[category].add(value, n)
+            self._cache[key] = (time.monotonic(), dists)
+        return dists
+
+    def ranks(self, plan: ScoringPlan, sums: Sequence[int], scope: str = ALL) -> Optional[Dict[str, int]]:
+        """Avrundad percentilrang per delområde och "total"; None om jämförelsegruppen är för liten."""
+        dists = self.distributions(plan, scope)
+        if dists[TOTAL].n < self.min_n:
+            return None
+        with self._lock:
+            return {key: round(dists[key].rank(value)) for key, value in _values(plan, sums).items()}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.percentiles", description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=DEFAULT_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_show = sub.add_parser("show", help="Antal och kvartiler per delområde")
+    p_show.add_argument("--instrument", help="t.ex. funktionellt-ledarskap.v1 (default: standard)")
+    p_show.add_argument("--company")
+    p_ingest = sub.add_parser("ingest", help="Räkna in historiska inlämningar (CSV/JSONL)")
+    p_ingest.add_argument("source", type=Path)
+    args = ap.parse_args(argv)
+
+    store = PercentileStore(args.db)
+    try:
+        if args.cmd == "show":
+            plan = plan_for_key(args.instrument)
+            scope = company_scope(args.company) if args.company else ALL
+            titles = {cat.key: cat.title for cat in plan.categories}
+            out = {
+                titles.get(key, "Totalt"): {
+                    "n": d.n, "p25": d.quantile(0.25), "p50": d.quantile(0.5), "p75": d.quantile(0.75),
+                }
+                for key, d in store.distributions(plan, scope).items()
+            }
+            print(json.dumps(out, ensure_ascii=False, indent=2))
+            return 0
+        from .batch import read_submissions
+
+        added = skipped = 0
+        for row in read_submissions(args.source):
+            contact = Contact(name=row.get("name", ""), email=row.get("email", ""), company=row.get("company") or "")
+            if store.record(contact, answers_from_row(row), plan_for_row(row), measurement_id_from_row(row)):
+                added += 1
+            else:
+                skipped += 1
+        print(f"{added} inlämningar tillagda, {skipped} redan räknade", file=sys.stderr)
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
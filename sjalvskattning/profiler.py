@@ -0,0 +1,370 @@
+"""Stickprovsprofilering av den körande processen, med flamgraf.
+
+En bakgrundstråd läser alla trådars stackar med `sys._current_frames()` med
+jämna mellanrum (default var 5:e ms) och räknar identiska stackar. Inget
+instrumenteras och inget externt verktyg behövs, så det fungerar även på
+Streamlit Cloud. Kostnaden är ett stackbyte per tråd och stickprov; den mäts
+och redovisas som `overhead`.
+
+Samplartråden behöver GIL:en för att läsa stackarna och får den annars
+först när den arbetande tråden släpper den – ofta i C-kod som zlib, vilket
+ger en skev bild. Med `precise` (`FL_PROFILE_PRECISE=1`, `--precise`) sänks
+växlingsintervallet (`sys.setswitchinterval`) till `SWITCH_INTERVAL` under
+profileringen, så att stickprovet tas inom en bråkdel av en millisekund var
+tråden än befinner sig. Intervallet gäller hela processen och kostar alla
+trådar mer växlingar, så det är avslaget som standard.
+
+I en körande process (`start()`) får en profilering vara högst
+`FL_PROFILE_MAX_SECONDS` sekunder; en längre ger `ProfilerError`.
+
+Två lägen:
+
+- under en tidsperiod: alla trådar utom de som bara väntar (lås, kö, select)
+- för ett mätnings-ID: bara trådar som just då är i ett span med den nyckeln
+  (rendering, lagring, payload, webhook-leverans, se `metrics.active_spans()`),
+  tills `until(key)` säger att rapporten är klar. `NEXT` följer nästa rapport
+  som startar. Med `FL_REPORT_PROCESSES > 0` renderas PDF:en i en annan
+  process; då syns bara väntan på den här.
+
+Resultatet är kollapsade stackar (`tråd;funktion;…;funktion antal`, läses av
+flamegraph.pl och speedscope), en färdig SVG-flamgraf och en topplista över
+funktioner med egen och kumulativ andel, plus andel per steg. I appen startas
+profileringen från adminpanelen (`?admin=<FL_ADMIN_TOKEN>`). Ett skript eller
+en modul kan också profileras direkt:
+
+    python -m sjalvskattning.profiler -o .data/profiles -m sjalvskattning.batch export.csv
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import active_spans
+
+INTERVAL = float(os.environ.get("FL_PROFILE_INTERVAL", "0.005"))
+MAX_SECONDS = float(os.environ.get("FL_PROFILE_MAX_SECONDS", "120"))
+PRECISE = os.environ.get("FL_PROFILE_PRECISE") == "1"
+RESULTS_DIR = Path(os.environ.get("FL_PROFILE_DIR", ".data/profiles"))
+SWITCH_INTERVAL = 0.0001
+MAX_DEPTH = 200
+NEXT = "next"
+NO_STAGE = "—"
+
+# Blad som betyder att tråden väntar, inte arbetar (filnamn, funktion)
+IDLE = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socketserver.py", "serve_forever"),
+    ("connection.py", "wait"),
+})
+
+_ROOTS = sorted({str(Path(p).resolve()) for p in sys.path if p and os.path.isdir(p)}, key=len, reverse=True)
+
+
+class ProfilerError(ValueError):
+    """Ogiltig profilering, t.ex. längre än MAX_SECONDS."""
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _label(name: str, filename: str, line: int) -> str:
+    """`funktion (modul/fil.py:rad)`, med sökvägen relativ till sys.path."""
+    for root in _ROOTS:
+        if filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    else:
+        filename = "/".join(Path(filename).parts[-2:])
+    return f"{name} ({filename}:{line})"
+
+
+def _thread_name(name: str) -> str:
+    """Löpnumret bort (report-3 → report) så att likadana trådar slås ihop."""
+    return re.sub(r"[-_]?\d+(_\d+)?$", "", name) or name
+
+
+# ---------- Resultat ----------
+@dataclass
+class Profile:
+    interval: float
+    key: Optional[str] = None
+    stacks: "Counter[str]" = field(default_factory=Counter)
+    stages: "Counter[str]" = field(default_factory=Counter)
+    samples: int = 0  # stackar som räknades
+    idle: int = 0  # stackar som bara väntade
+    ticks: int = 0
+    seconds: float = 0.0
+    sampling_s: float = 0.0
+
+    @property
+    def overhead(self) -> float:
+        """Andel av väggtiden som gick åt till att ta stickproven."""
+        return self.sampling_s / self.seconds if self.seconds else 0.0
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 25) -> List[Tuple[str, int, int]]:
+        """(funktion, egna stickprov, kumulativa stickprov), flest egna först."""
+        own: "Counter[str]" = Counter()
+        total: "Counter[str]" = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [(frame, c, total[frame]) for frame, c in own.most_common(n)]
+
+    def summary(self, n: int = 25) -> str:
+        pct = lambda c: 100.0 * c / self.samples if self.samples else 0.0  # noqa: E731
+        lines = [
+            f"{self.samples} stickprov ({self.idle} vilande uteslutna) under {self.seconds:.1f} s, "
+            f"var {self.interval * 1000:.0f}:e ms, overhead {self.overhead * 100:.1f} %"
+            + (f", mätnings-ID {self.key}" if self.key else ""),
+            "",
+            "Per steg:",
+        ]
+        lines += [f"  {stage:<24}{pct(c):>6.1f} %" for stage, c in self.stages.most_common()]
+        lines += ["", f"{'egen %':>8}{'kum. %':>8}  funktion"]
+        lines += [f"{pct(own):>8.1f}{pct(total):>8.1f}  {frame}" for frame, own, total in self.top(n)]
+        return "\n".join(lines) + "\n"
+
+    def flamegraph_svg(self, width: int = 1200, row: int = 16) -> str:
+        """Flamgraf som fristående SVG; hovra för funktion och andel."""
+        root: Dict[str, list] = {}
+        depth = 0
+        for stack, count in self.stacks.items():
+            node = root
+            frames = stack.split(";")
+            depth = max(depth, len(frames))
+            for frame in frames:
+                entry = node.setdefault(frame, [0, {}])
+                entry[0] += count
+                node = entry[1]
+        total = self.samples or 1
+        height = (depth + 2) * row
+        out = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="Verdana" font-size="11">',
+            f'<rect width="{width}" height="{height}" fill="#fafafa"/>',
+            f'<text x="6" y="{row - 4}">{html.escape(f"{self.samples} stickprov, {self.seconds:.1f} s")}</text>',
+        ]
+
+        def draw(node: Dict[str, list], x: float, level: int) -> None:
+            for frame, (count, children) in sorted(node.items()):
+                w = width * count / total
+                if w >= 0.5:
+                    y = height - (level + 1) * row
+                    # varma färger som i flamegraph.pl, stabila per funktionsnamn
+                    h = zlib.crc32(frame.split(" (")[0].encode())
+                    fill = f"#{205 + h % 50:02x}{(h >> 8) % 230:02x}{(h >> 16) % 55:02x}"
+                    title = html.escape(f"{frame} – {count} ({100 * count / total:.1f} %)")
+                    text = html.escape(frame[:int(w / 7)]) if w > 21 else ""
+                    out.append(
+                        f'<g><title>{title}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                        f'fill="{fill}"/><text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>'
+                    )
+                    draw(children, x, level + 1)
+                x += w
+
+        draw(root, 0.0, 0)
+        out.append("</svg>")
+        return "\n".join(out)
+
+    def save(self, prefix: Path) -> List[Path]:
+        """Skriver `<prefix>.collapsed`, `.svg` och `.txt`."""
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for suffix, text in ((".collapsed", self.collapsed()), (".svg", self.flamegraph_svg()), (".txt", self.summary())):
+            path = prefix.with_name(prefix.name + suffix)
+            path.write_text(text, encoding="utf-8")
+            paths.append(path)
+        return paths
+
+
+# ---------- Insamling ----------
+class Sampler:
+    """Samlar stickprov i en bakgrundstråd tills `seconds` gått (None = ingen gräns), `until(key)` är sant eller `stop()`."""
+
+    def __init__(
+        self,
+        seconds: Optional[float],
+        interval: float = INTERVAL,
+        key: Optional[str] = None,
+        until: Optional[Callable[[str], bool]] = None,
+        precise: bool = PRECISE,
+    ):
+        self.seconds = seconds
+        self.precise = precise
+        self.key = key
+        self.until = until
+        self.profile = Profile(interval, None if key == NEXT else key)
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        # i NEXT-läget räknas bara rapporter som startar efter profileringen
+        self._skip = {k for _, k in active_spans().values()} if key == NEXT else set()
+        self._seen = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Profile:
+        self._thread.join(timeout)
+        return self.profile
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + self.seconds if self.seconds is not None else float("inf")
+        checked = start
+        switch = sys.getswitchinterval()
+        if self.precise:
+            sys.setswitchinterval(min(switch, SWITCH_INTERVAL))
+        try:
+            self._loop(me, deadline, checked)
+        finally:
+            if self.precise:
+                sys.setswitchinterval(switch)
+        self.profile.seconds = time.perf_counter() - start
+
+    def _loop(self, me: int, deadline: float, checked: float) -> None:
+        while not self._stop.wait(self.profile.interval):
+            t0 = time.perf_counter()
+            self._sample(me)
+            t1 = time.perf_counter()
+            self.profile.sampling_s += t1 - t0
+            self.profile.ticks += 1
+            if t1 >= deadline:
+                break
+            # följer en rapport: klart när den är levererad (frågas högst var 10:e ms)
+            if self._seen and self.until is not None and t1 - checked > 0.01:
+                checked = t1
+                if self.until(self.profile.key):
+                    break
+
+    def _sample(self, me: int) -> None:
+        profile = self.profile
+        spans = active_spans()
+        names = {t.ident: _thread_name(t.name) for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stage, key = spans.get(ident, (NO_STAGE, None))
+            if self.key is not None:
+                if profile.key is None and key is not None and key not in self._skip:
+                    profile.key = key  # NEXT: första nya rapporten
+                if key is None or key != profile.key:
+                    continue
+                self._seen = True
+            code = frame.f_code
+            if self.key is None and (Path(code.co_filename).name, code.co_name) in IDLE:
+                profile.idle += 1
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_DEPTH:
+                code = frame.f_code
+                frames.append(_label(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            frames.append(names.get(ident, "thread"))
+            profile.stacks[";".join(reversed(frames))] += 1
+            profile.stages[stage] += 1
+            profile.samples += 1
+
+
+_lock = threading.Lock()
+_last: Optional[Sampler] = None
+
+
+def start(
+    seconds: float,
+    interval: float = INTERVAL,
+    key: Optional[str] = None,
+    until: Optional[Callable[[str], bool]] = None,
+    precise: bool = PRECISE,
+) -> Sampler:
+    """Startar en profilering; en i taget per process och högst MAX_SECONDS sekunder."""
+    global _last
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ProfilerError(f"profileringen får vara 0–{MAX_SECONDS:g} s, inte {seconds:g} s (FL_PROFILE_MAX_SECONDS)")
+    with _lock:
+        if _last is not None and _last.running:
+            raise ProfilerBusy("en profilering pågår redan")
+        _last = Sampler(seconds, interval, key, until, precise).start()
+        return _last
+
+
+def last() -> Optional[Sampler]:
+    """Pågående eller senast avslutade profilering."""
+    return _last
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.profiler", description=__doc__.splitlines()[0])
+    ap.add_argument("-o", "--out", type=Path, default=RESULTS_DIR, help="katalog för .collapsed/.svg/.txt")
+    ap.add_argument("--interval", type=float, default=INTERVAL, help="sekunder mellan stickproven")
+    ap.add_argument("--top", type=int, default=25)
+    ap.add_argument("--seconds", type=float, help="sluta ta stickprov efter så många sekunder (default: tills målet är klart)")
+    ap.add_argument("--precise", action="store_true", help="sänk växlingsintervallet under profileringen (se ovan)")
+    ap.add_argument("-m", dest="module", help="kör modulen som __main__ (som python -m)")
+    ap.add_argument("target", nargs=argparse.REMAINDER, help="skript (utan -m) och dess argument")
+    argv = sys.argv[1:] if argv is None else argv
+    # allt efter -m <modul> hör till modulen, även flaggor som --help
+    split = argv.index("-m") + 2 if "-m" in argv else len(argv)
+    args = ap.parse_args(argv[:split])
+    if args.module:
+        args.target = argv[split:]
+    if not args.module and not args.target:
+        ap.error("ange -m <modul> eller ett skript")
+
+    # en egen process för målet: ingen övre gräns utöver --seconds
+    sampler = Sampler(args.seconds, args.interval, precise=args.precise or PRECISE).start()
+    try:
+        if args.module:
+            sys.argv = [args.module, *args.target]
+            runpy.run_module(args.module, run_name="__main__", alter_sys=True)
+        else:
+            sys.argv = list(args.target)
+            runpy.run_path(args.target[0], run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"målet avslutades med {e.code}", file=sys.stderr)
+    finally:
+        sampler.stop()
+        profile = sampler.wait()
+    paths = profile.save(args.out / time.strftime("%Y%m%d-%H%M%S"))
+    print(profile.summary(args.top), file=sys.stderr)
+    for path in paths:
+        print(f"→ {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
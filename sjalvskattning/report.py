@@ -0,0 +1,626 @@
+"""PDF-rapporten ritad som vektorgrafik med reportlab.
+
+Ersätter html2canvas-vägen (skärmdump av `report-root` som bild per sida) med
+riktig text, paneler och staplar. Layouten följer ReportView i app.tsx och
+pagineras blockvis; panelen "Nästa steg" kan delas över sidbrytning. Rubriker,
+kategorier, maxsummor och texter kommer från instrumentplanen.
+
+Nästan allt i rapporten är lika för alla. Layouten körs därför en gång per
+instrumentversion till en `ReportTemplate`: färdig sidkod för det statiska
+innehållet plus "stämplar" för det som skiljer (uppgifter, datum, summor,
+staplar, chips). En rapport är sedan bara sidkoden, stämplarna och
+serialiseringen. Kortens värden och chipsen ritas i sin tur en gång per
+summa och återanvänds (`card_asset`, `chip_asset`).
+"""
+from __future__ import annotations
+
+import io
+import os
+import re
+import threading
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple
+
+from reportlab.lib.colors import HexColor
+from reportlab.lib.rl_accel import fp_str
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfdoc import PDFZCompress
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph
+
+from .core import PALETTE, Answers, Contact, sv_date, sv_date_file
+from .instrument import Category, ScoringPlan, default_plan
+from .metrics import observe_size, span
+from .streams import Base64Writer, CountingWriter
+
+# ---------- Mått och stilar ----------
+PAGE_W, PAGE_H = A4
+MARGIN = 12 * mm
+CONTENT_W = PAGE_W - 2 * MARGIN
+PAD = 4 * mm
+COL_GAP = 4 * mm
+CARD_W = (CONTENT_W - 2 * COL_GAP) / 3  # grid-cols-3 gap-4
+CARD_H = 36 * mm
+ROW_H = 6.5 * mm
+
+C = {k: HexColor(v) for k, v in PALETTE.items()}
+
+FONT = "Helvetica"
+FONT_BOLD = "Helvetica-Bold"
+TARGET_ALPHA = 0.85  # målstapeln
+ASSET_CACHE_SIZE = int(os.environ.get("FL_REPORT_ASSET_CACHE", "1024"))
+
+BODY = ParagraphStyle("body", fontName=FONT, fontSize=9.5, leading=13.5, textColor=C["gray700"])
+BULLET = ParagraphStyle("bullet", parent=BODY, leftIndent=6 * mm, bulletIndent=2 * mm)
+SUBHEAD = ParagraphStyle("subhead", parent=BODY, fontName=FONT_BOLD, fontSize=10.5, textColor=C["navy700"])
+PANEL_TITLE = ParagraphStyle("panel_title", parent=BODY, fontName=FONT_BOLD, fontSize=12.5, leading=16, textColor=C["navy700"])
+
+
+# ---------- Mall och stämplar ----------
+def pdf_canvas(out: BinaryIO, title: Optional[str] = None) -> Canvas:
+    """Canvas för en färdig PDF: A4, byte-stabil och sidströmmar med bara Flate.
+
+    reportlab lägger ASCII85 ovanpå Flate när sidkomprimering är på
+    (`rl_config.useA85`, processglobalt). ASCII85 gör sidströmmarna 25 % större
+    och är rapportens dyraste steg i ren Python, och PDF:en är binär ändå
+    (blobstore, Base64 i webhooken). Här sätts i stället dokumentets
+    standardfilter, så att valet bara gäller den här canvasen.
+    """
+    # invariant: samma innehåll ger samma bytes, så blobstore kan deduplicera omsändningar
+    c = Canvas(out, pagesize=A4, pageCompression=0, invariant=1)
+    c._doc.defaultStreamFilters = [PDFZCompress]
+    if title:
+        c.setTitle(title)
+    return c
+
+
+@dataclass(frozen=True)
+class _Fields:
+    """Det som skiljer en rapport från en annan."""
+
+    contact: Contact
+    sums: Tuple[int, ...]
+    measurement_id: str
+    generated: date
+    ranks: Optional[Tuple[int, ...]] = None  # percentilrang per delområde, om jämförelsegruppen räcker
+
+
+Stamp = Callable[[Canvas, _Fields], None]
+
+
+def _prepare(c: Canvas) -> None:
+    """Typsnitt och genomskinlighet registreras i samma ordning i varje canvas och sida.
+
+    Då får de samma interna namn (/F2, /gRLs0 …) överallt och färdig sidkod
+    (mall, kort, chips) kan klistras in i vilken rapport som helst. Anropas
+    innan sidan har något innehåll.
+    """
+    for font in (FONT, FONT_BOLD):
+        c._doc.getInternalFontName(font)
+    c.saveState()
+    c.setFillAlpha(TARGET_ALPHA)
+    c.restoreState()
+    del c._code[:]
+
+
+class _Recorder(Canvas):
+    """Canvas som spelar in mallen: statisk sidkod per sida, stämplar för resten."""
+
+    def __init__(self):
+        super().__init__(io.BytesIO(), pagesize=A4, invariant=1)
+        _prepare(self)
+        self.pages: List[List[str]] = []
+        self.stamps: List[List[Stamp]] = [[]]
+
+    def stamp(self, fn: Stamp) -> None:
+        self.stamps[-1].append(fn)
+
+    def showPage(self) -> None:
+        self.pages.append(list(self._code))
+        self.stamps.append([])
+        super().showPage()
+        _prepare(self)
+
+
+# ---------- Block (höjd + ritning) ----------
+# Para, Panel, Heading och flow() är det publika layout-API:t som även
+# teamrapporten bygger på. Ett block har `space_before`, `h`, `wrap(width)` och
+# `draw(c, x, top, width)`, och kan ha `split(width, avail)`.
+class Para:
+    """Ett radbrutet stycke med luft ovanför (motsvarar mt-1/mt-2)."""
+
+    def __init__(self, text: str, style: ParagraphStyle, space_before: float = 0, bullet: Optional[str] = None):
+        self.p = Paragraph(text, style, bulletText=bullet)
+        self.space_before = space_before
+        self.h = 0.0
+
+    def wrap(self, width: float) -> float:
+        self.h = self.p.wrap(width, PAGE_H)[1] + self.space_before
+        return self.h
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        self.p.drawOn(c, x, top - self.h)
+
+
+class _Chips:
+    """Sammanfattningsraden med summorna som "chips"; antalet rader hör till mallen."""
+
+    LABEL = "Sammanfattning:"
+
+    def __init__(self, chips: Callable[[_Fields], Sequence[str]], n_rows: int, space_before: float = 0):
+        self.chips = chips
+        self.n_rows = n_rows
+        self.space_before = space_before
+        self.h = 0.0
+
+    @staticmethod
+    def _chip_w(text: str) -> float:
+        return stringWidth(text, FONT, 8.5) + 4 * mm
+
+    @classmethod
+    def layout(cls, chips: Sequence[str], width: float) -> List[List[Tuple[str, float]]]:
+        inner = width - 4 * mm
+        rows: List[List[Tuple[str, float]]] = [[]]
+        x = stringWidth(cls.LABEL, FONT_BOLD, 9) + 2 * mm
+        for chip in chips:
+            w = chip_asset(chip)[1]
+            if x + w > inner and rows[-1]:
+                rows.append([])
+                x = 0
+            rows[-1].append((chip, x))
+            x += w + 2 * mm
+        return rows
+
+    def wrap(self, width: float) -> float:
+        self.h = self.space_before + 4 * mm + self.n_rows * 7 * mm
+        return self.h
+
+    def draw(self, c: _Recorder, x: float, top: float, width: float) -> None:
+        box_h = self.h - self.space_before
+        y0 = top - self.space_before - box_h
+        c.setFillColor(C["gray100"])
+        c.setStrokeColor(C["gray300"])
+        c.roundRect(x, y0, width, box_h, 2 * mm, stroke=1, fill=1)
+        first_row = top - self.space_before - 2 * mm
+        c.setFillColor(C["navy700"])
+        c.setFont(FONT_BOLD, 9)
+        c.drawString(x + 2 * mm, first_row - 4.8 * mm, self.LABEL)
+
+        def chips(c: Canvas, f: _Fields) -> None:
+            row_top = first_row
+            for row in self.layout(self.chips(f), width):
+                for chip, cx in row:
+                    _place(c, chip_asset(chip)[0], x + 2 * mm + cx, row_top)
+                row_top -= 7 * mm
+
+        c.stamp(chips)
+
+
+class Panel:
+    """Panel med ram och titel – kan delas mellan sidor på barnnivå."""
+
+    def __init__(self, title: Optional[str], children: Sequence, space_before: float = 0):
+        self.title = Para(title, PANEL_TITLE) if title else None
+        self.title_text = title
+        self.children = list(children)
+        self.space_before = space_before
+        self.h = 0.0
+
+    def _title_h(self, inner: float) -> float:
+        return self.title.wrap(inner) + 2 * mm if self.title else 0.0
+
+    def wrap(self, width: float) -> float:
+        inner = width - 2 * PAD
+        self.h = self.space_before + 2 * PAD + self._title_h(inner) + sum(ch.wrap(inner) for ch in self.children)
+        return self.h
+
+    def split(self, width: float, avail: float):
+        inner = width - 2 * PAD
+        used = self.space_before + 2 * PAD + self._title_h(inner)
+        n = 0
+        for ch in self.children:
+            ch_h = ch.wrap(inner)
+            if used + ch_h > avail:
+                break
+            used += ch_h
+            n += 1
+        if n == 0 or n == len(self.children):
+            return None
+        head = Panel(self.title_text, self.children[:n], self.space_before)
+        tail = Panel(f"{self.title_text} (forts.)" if self.title_text else None, self.children[n:])
+        return head, tail
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        top -= self.space_before
+        box_h = self.h - self.space_before
+        c.setFillColor(C["white"])
+        c.setStrokeColor(C["gray400"])
+        c.roundRect(x, top - box_h, width, box_h, 2 * mm, stroke=1, fill=1)
+        inner = width - 2 * PAD
+        y = top - PAD
+        if self.title:
+            self.title.draw(c, x + PAD, y, inner)
+            y -= self.title.h + 2 * mm
+        for ch in self.children:
+            ch.draw(c, x + PAD, y, inner)
+            y -= ch.h
+
+
+class Heading:
+    """Titelrutan och "Delområden"-rutan."""
+
+    def __init__(self, title: str, size: float, pad: float, dated: bool = False, space_before: float = 0):
+        self.title, self.size, self.pad, self.dated = title, size, pad, dated
+        self.space_before = space_before
+        self.h = space_before + 2 * pad + size * 1.1 + (5 * mm if dated else 0)
+
+    def wrap(self, width: float) -> float:
+        return self.h
+
+    def draw(self, c: _Recorder, x: float, top: float, width: float) -> None:
+        top -= self.space_before
+        box_h = self.h - self.space_before
+        c.setFillColor(C["white"])
+        c.setStrokeColor(C["gray400"])
+        c.roundRect(x, top - box_h, width, box_h, 2 * mm, stroke=1, fill=1)
+        c.setFillColor(C["navy700"])
+        c.setFont(FONT_BOLD, self.size)
+        c.drawString(x + self.pad, top - self.pad - self.size * 0.85, self.title)
+        if self.dated:
+            y = top - self.pad - self.size * 1.1 - 3.5 * mm
+
+            def subtitle(c: Canvas, f: _Fields) -> None:
+                c.setFillColor(C["gray700"])
+                c.setFont(FONT, 9.5)
+                c.drawString(x + self.pad, y, sv_date(f.generated))
+
+            c.stamp(subtitle)
+
+
+class _Details:
+    """Uppgifter: etikett till vänster, värde (per rapport) till höger, linje under."""
+
+    def __init__(self, rows: Sequence[Tuple[str, Callable[[_Fields], str]]], space_before: float = 0):
+        self.rows = rows
+        self.space_before = space_before
+        self.h = len(rows) * ROW_H
+
+    def wrap(self, width: float) -> float:
+        return self.h
+
+    def draw(self, c: _Recorder, x: float, top: float, width: float) -> None:
+        y = top
+        for label, _ in self.rows:
+            c.setFillColor(C["text"])
+            c.setFont(FONT_BOLD, 9.5)
+            c.drawString(x, y - 4.5 * mm, label)
+            y -= ROW_H
+            c.setStrokeColor(C["gray200"])
+            c.line(x, y, x + width, y)
+
+        def values(c: Canvas, f: _Fields) -> None:
+            c.setFillColor(C["text"])
+            c.setFont(FONT, 9.5)
+            for i, (_, value) in enumerate(self.rows):
+                c.drawRightString(x + width, top - i * ROW_H - 4.5 * mm, value(f))
+
+        c.stamp(values)
+
+
+def _card_frame(c: Canvas, x: float, top: float, title: str) -> None:
+    """Det som är lika för alla: kortet, rubriken och målstapeln."""
+    inner = CARD_W - 2 * PAD
+    c.setFillColor(C["white"])
+    c.setStrokeColor(C["gray300"])
+    c.roundRect(x, top - CARD_H, CARD_W, CARD_H, 3 * mm, stroke=1, fill=1)
+    c.setFillColor(C["navy700"])
+    c.setFont(FONT_BOLD, 9)
+    c.drawString(x + PAD, top - PAD - 3 * mm, title)
+    c.saveState()
+    c.setFillColor(C["orange"])
+    c.setFillAlpha(TARGET_ALPHA)
+    c.roundRect(x + PAD, top - PAD - 24 * mm, inner, 3 * mm, 1 * mm, stroke=0, fill=1)
+    c.restoreState()
+
+
+def _card_values(c: Canvas, x: float, top: float, total_sum: float, total: int) -> None:
+    pct = max(0.0, min(100.0, total_sum / total * 100))
+    shown = round(total_sum)
+    inner = CARD_W - 2 * PAD
+    c.setFillColor(C["text"])
+    c.setFont(FONT_BOLD, 24)
+    c.drawString(x + PAD, top - PAD - 13 * mm, str(shown))
+    bar_y = top - PAD - 19 * mm
+    c.setFillColor(C["gray200"])
+    c.roundRect(x + PAD, bar_y, inner, 3 * mm, 1 * mm, stroke=0, fill=1)
+    if pct > 0:
+        c.setFillColor(C["green"])
+        c.roundRect(x + PAD, bar_y, inner * pct / 100, 3 * mm, 1 * mm, stroke=0, fill=1)
+    c.setFillColor(C["gray700"])
+    c.setFont(FONT, 8)
+    c.drawString(x + PAD, top - CARD_H + PAD, f"Summa {shown}/{total}")
+
+
+def draw_category_card(c: Canvas, x: float, top: float, title: str, total_sum: float, total: int) -> None:
+    """Högerkort: totalsumma (stor siffra) + stapel (summa vs total)."""
+    _card_frame(c, x, top, title)
+    _card_values(c, x, top, total_sum, total)
+
+
+# ---------- Förritade kort och chips ----------
+def _asset(draw: Callable[[Canvas], None]) -> str:
+    """Sidkoden för något ritat kring origo, att flytta på plats med `_place`."""
+    c = Canvas(io.BytesIO(), pagesize=A4, invariant=1)
+    _prepare(c)
+    draw(c)
+    return "\n".join(c._code)
+
+
+@lru_cache(maxsize=ASSET_CACHE_SIZE)
+def card_asset(total_sum: int, total: int) -> str:
+    """Kortets siffra, stapel och summarad för en summa; kortets övre vänstra hörn i origo."""
+    return _asset(lambda c: _card_values(c, 0, 0, total_sum, total))
+
+
+@lru_cache(maxsize=128)
+def rank_asset(rank: int) -> str:
+    """Percentilrangen i kortets nedre högra hörn; kortets övre vänstra hörn i origo."""
+
+    def draw(c: Canvas) -> None:
+        c.setFillColor(C["navy700"])
+        c.setFont(FONT_BOLD, 8)
+        c.drawRightString(CARD_W - PAD, -CARD_H + PAD, f"Percentil {rank}")
+
+    return _asset(draw)
+
+
+@lru_cache(maxsize=ASSET_CACHE_SIZE)
+def chip_asset(text: str) -> Tuple[str, float]:
+    """Ett chip (sidkod, bredd); radens överkant och chipets vänsterkant i origo."""
+    w = _Chips._chip_w(text)
+
+    def draw(c: Canvas) -> None:
+        c.setFillColor(C["navy50"])
+        c.setStrokeColor(C["navy300"])
+        c.roundRect(0, -6 * mm, w, 5.5 * mm, 2.75 * mm, stroke=1, fill=1)
+        c.setFillColor(C["navy700"])
+        c.setFont(FONT, 8.5)
+        c.drawString(2 * mm, -4.3 * mm, text)
+
+    return _asset(draw), w
+
+
+def _place(c: Canvas, asset: str, x: float, y: float) -> None:
+    c._code.append(f"q 1 0 0 1 {fp_str(x, y)} cm\n{asset}\nQ")
+
+
+def warm_assets(plan: ScoringPlan) -> None:
+    """Ritar alla kort och chips planen kan ge (obesvarat = 0 till maxsumman)."""
+    for cat in plan.categories:
+        for s in range(cat.max_sum + 1):
+            card_asset(s, cat.max_sum)
+            chip_asset(_chip_text(cat, s))
+
+
+class _CategoryRow:
+    """Textpanel (2/3) + CategoryRightCard (1/3), ritas odelat; kortets värden stämplas."""
+
+    def __init__(self, category: Category, index: int, space_before: float):
+        self.panel = Panel(category.title, [Para(t, BODY, 2 * mm if i else 0) for i, t in enumerate(category.texts)])
+        self.title, self.index, self.total = category.title, index, category.max_sum
+        self.space_before = space_before
+        self.h = 0.0
+
+    def wrap(self, width: float) -> float:
+        self.h = self.space_before + max(self.panel.wrap(width - CARD_W - COL_GAP), CARD_H)
+        return self.h
+
+    def draw(self, c: _Recorder, x: float, top: float, width: float) -> None:
+        top -= self.space_before
+        left_w = width - CARD_W - COL_GAP
+        self.panel.draw(c, x, top, left_w)
+        card_x = x + left_w + COL_GAP
+        _card_frame(c, card_x, top, self.title)
+
+        def values(c: Canvas, f: _Fields) -> None:
+            _place(c, card_asset(f.sums[self.index], self.total), card_x, top)
+            if f.ranks is not None:
+                _place(c, rank_asset(f.ranks[self.index]), card_x, top)
+
+        c.stamp(values)
+
+
+def _chip_text(category: Category, total_sum: int) -> str:
+    return f"{category.title} {total_sum}/{category.max_sum}"
+
+
+def _chip_texts(plan: ScoringPlan, sums: Sequence[int]) -> List[str]:
+    return [_chip_text(cat, s) for cat, s in zip(plan.categories, sums)]
+
+
+def _chip_rows(plan: ScoringPlan, sums: Sequence[int]) -> int:
+    """Chipsen får panelens innerbredd; fler siffror kan ge en rad till."""
+    return len(_Chips.layout(_chip_texts(plan, sums), CONTENT_W - 2 * PAD))
+
+
+def _next_steps_children(plan: ScoringPlan, chip_rows: int) -> list:
+    children: list = [_Chips(lambda f: _chip_texts(plan, f.sums), chip_rows)]
+    for step in plan.next_steps:
+        children.append(Para(step.heading, SUBHEAD, 4 * mm))
+        for i, text in enumerate(step.paragraphs):
+            children.append(Para(text, BODY, 2 * mm if i else 1 * mm))
+        for i, (strong, text) in enumerate(step.bullets):
+            before = 1 * mm if i or not step.paragraphs else 2 * mm
+            children.append(Para(f"<b>{strong}:</b> {text}", BULLET, before, bullet="•"))
+    return children
+
+
+# ---------- Rapport ----------
+def _blocks(plan: ScoringPlan, chip_rows: int) -> list:
+    last = len(plan.categories) - 1
+    return [
+        Heading(plan.report_title, 20, PAD, dated=True),
+        Panel("Uppgifter", [_Details((
+            ("Rubrik (Mätnings-ID)", lambda f: f.measurement_id),
+            ("Namn", lambda f: f.contact.name),
+            ("Företag", lambda f: f.contact.company or "—"),
+            ("E-post", lambda f: f.contact.email),
+        ))], space_before=4 * mm),
+        Heading("Delområden", 14, 3 * mm, space_before=3 * mm),
+        # mt-6 före sista kategorin, som i ReportView
+        *(
+            _CategoryRow(cat, i, 6 * mm if i == last and i else 3 * mm)
+            for i, cat in enumerate(plan.categories)
+        ),
+        Panel("Nästa steg", _next_steps_children(plan, chip_rows), space_before=8 * mm),
+    ]
+
+
+def _new_page(c: Canvas) -> None:
+    c.setFillColor(C["eggshell"])
+    c.rect(0, 0, PAGE_W, PAGE_H, stroke=0, fill=1)
+    c.setLineWidth(0.75)
+
+
+def flow(c: Canvas, blocks: list) -> None:
+    """Lägger blocken uppifrån och ned och bryter sida när nästa block inte får plats."""
+    queue = list(blocks)
+    _new_page(c)
+    top, first = PAGE_H - MARGIN, True
+    while queue:
+        block = queue.pop(0)
+        if first:
+            block.space_before = 0
+        h = block.wrap(CONTENT_W)
+        avail = top - MARGIN
+        if h > avail:
+            parts = block.split(CONTENT_W, avail) if hasattr(block, "split") else None
+            if parts:
+                head, tail = parts
+                head.wrap(CONTENT_W)
+                head.draw(c, MARGIN, top, CONTENT_W)
+                queue.insert(0, tail)
+                c.showPage()
+                _new_page(c)
+                top, first = PAGE_H - MARGIN, True
+                continue
+            if not first:
+                queue.insert(0, block)
+                c.showPage()
+                _new_page(c)
+                top, first = PAGE_H - MARGIN, True
+                continue
+        block.draw(c, MARGIN, top, CONTENT_W)
+        top -= h
+        first = False
+    c.showPage()
+
+
+class ReportTemplate:
+    """En instrumentversions färdiga layout: statisk sidkod och stämplar per sida."""
+
+    def __init__(self, plan: ScoringPlan, chip_rows: int):
+        rec = _Recorder()
+        flow(rec, _blocks(plan, chip_rows))
+        warm_assets(plan)
+        self.plan = plan
+        self.chip_rows = chip_rows
+        # typsnitten får samma interna namn (/F1, /F2 …) i varje rapport som i inspelningen
+        self.fonts = tuple(rec._doc.fontMapping)
+        # q/Q: stämplarna börjar från ett rent grafiktillstånd
+        self.pages = tuple("\n".join(["q", *code, "Q"]) for code in rec.pages)
+        self.stamps = tuple(tuple(stamps) for stamps in rec.stamps[:len(rec.pages)])
+
+    def render(self, fields: _Fields, out: BinaryIO) -> None:
+        """Skriver rapporten till `out` (fil, nedladdning, uppladdningskropp)."""
+        c = pdf_canvas(out, self.plan.report_title)
+        for font in self.fonts:
+            c._doc.getInternalFontName(font)
+        c.setSubject(fields.measurement_id)
+        for code, stamps in zip(self.pages, self.stamps):
+            _prepare(c)  # genomskinligheten registreras per sida i reportlab
+            c._code.append(code)
+            c.setLineWidth(0.75)
+            for stamp in stamps:
+                stamp(c, fields)
+            c.showPage()
+        c.save()
+
+
+_TEMPLATES: Dict[Tuple[str, int], ReportTemplate] = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def report_template(plan: ScoringPlan, sums: Sequence[int]) -> ReportTemplate:
+    """Mallen för planen (och antalet chipsrader summorna ger); byggs första gången."""
+    key = (plan.key, _chip_rows(plan, sums))
+    template = _TEMPLATES.get(key)
+    # en omladdad plan med samma nyckel (ändrad JSON) får en ny mall
+    if template is None or template.plan is not plan:
+        with _TEMPLATES_LOCK:
+            template = _TEMPLATES.get(key)
+            if template is None or template.plan is not plan:
+                template = _TEMPLATES[key] = ReportTemplate(plan, key[1])
+    return template
+
+
+def report_file_name(contact: Contact, d: Optional[date] = None) -> str:
+    name = re.sub(r"\s+", "_", contact.name)
+    return f"Självskattning_{name}_{sv_date_file(d)}.pdf"
+
+
+def write_pdf(
+    contact: Contact,
+    answers: Answers,
+    measurement_id: str,
+    out: BinaryIO,
+    generated: Optional[date] = None,
+    plan: Optional[ScoringPlan] = None,
+    ranks: Optional[Sequence[int]] = None,
+) -> int:
+    """Skriver rapporten till `out` och returnerar antalet bytes.
+
+    reportlab sätter ihop dokumentet i ett svep innan det skrivs, så en
+    rapport kostar en PDF i minnet, inte en per kopia längs vägen. `ranks`
+    (percentilrang per delområde) skrivs på korten om de finns.
+    """
+    plan = plan or default_plan()
+    with span("score", measurement_id):
+        sums = plan.sums(answers)
+    with span("layout", measurement_id):
+        template = report_template(plan, sums)
+    sink = CountingWriter(out)
+    with span("serialize", measurement_id):
+        fields = _Fields(contact, sums, measurement_id, generated or date.today(), tuple(ranks) if ranks else None)
+        template.render(fields, sink)
+    observe_size("pdf", sink.n)
+    return sink.n
+
+
+def build_pdf(
+    contact: Contact,
+    answers: Answers,
+    measurement_id: str,
+    generated: Optional[date] = None,
+    plan: Optional[ScoringPlan] = None,
+    ranks: Optional[Sequence[int]] = None,
+) -> bytes:
+    """Bygger rapporten och returnerar PDF:en som bytes."""
+    buf = io.BytesIO()
+    write_pdf(contact, answers, measurement_id, buf, generated, plan, ranks)
+    return buf.getvalue()
+
+
+def build_pdf_base64(
+    contact: Contact, answers: Answers, measurement_id: str, plan: Optional[ScoringPlan] = None
+) -> Tuple[str, str]:
+    """PDF som Base64 + filnamn (för SharePoint-bilaga)."""
+    buf = io.BytesIO()
+    with Base64Writer(buf) as b64:
+        write_pdf(contact, answers, measurement_id, b64, plan=plan)
+    return buf.getvalue().decode("ascii"), report_file_name(contact)
@@ -0,0 +1,255 @@
+"""Sessioner på serversidan: svar som deltan, skrivna i omgångar, återupptas med token.
+
+React-versionen sparade hela `answers` i localStorage vid varje klick. Här
+läggs varje ändring (ett svar, ett steg- eller sidbyte) i en buffert i minnet
+och en bakgrundstråd skriver bufferten i en transaktion var `flush_s` sekund,
+så tjugo snabba klick blir en skrivning. Tappar websocketen anslutningen
+eller startas instansen om, återupptas sessionen med sin token (i URL:en). En
+krasch kan som mest kosta de senaste `flush_s` sekundernas klick; en vanlig
+avstängning tömmer bufferten. Kontaktuppgifterna sparas inte.
+
+    python -m sjalvskattning.sessions stats
+    python -m sjalvskattning.sessions prune --days 30
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .metrics import counter
+
+DEFAULT_DB = os.environ.get("FL_SESSIONS_DB", ".data/sessions.sqlite3")
+FLUSH_S = float(os.environ.get("FL_SESSION_FLUSH", "1.0"))
+TTL_S = float(os.environ.get("FL_SESSION_TTL", str(30 * 86400)))
+
+DELTAS = counter("fl_session_deltas_total", "Sessionsändringar (svar, steg, sida) som buffrats.")
+FLUSHES = counter("fl_session_flushes_total", "Skrivtransaktioner mot sessionslagret.")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session (
+    token TEXT PRIMARY KEY,
+    instrument TEXT NOT NULL,
+    step TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_updated ON session(updated_at);
+CREATE TABLE IF NOT EXISTS answer (
+    token TEXT NOT NULL,
+    question INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (token, question)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class SavedSession:
+    token: str
+    instrument: str
+    step: str
+    page: int
+    answers: Dict[int, int]
+
+
+@dataclass
+class _Pending:
+    """Oskrivna ändringar för en session; senaste värdet vinner."""
+
+    instrument: Optional[str] = None
+    step: Optional[str] = None
+    page: Optional[int] = None
+    answers: Dict[int, int] = field(default_factory=dict)
+    at: float = field(default_factory=time.time)
+
+
+class SessionStore:
+    """Trådsäker; ändringar buffras och skrivs av `start()`-tråden eller `flush()`."""
+
+    def __init__(self, path: str = DEFAULT_DB, flush_s: float = FLUSH_S):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.flush_s = flush_s
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- Ändringar (bara i minnet) ----------
+    def new(self, instrument: str) -> str:
+        """Ny session; token är det enda respondenten behöver för att återuppta."""
+        token = secrets.token_urlsafe(16)
+        self.save_state(token, instrument, "start", 0)
+        return token
+
+    def save_state(self, token: str, instrument: str, step: str, page: int) -> None:
+        with self._lock:
+            pending = self._pending.setdefault(token, _Pending())
+            pending.instrument, pending.step, pending.page, pending.at = instrument, step, page, time.time()
+        DELTAS.inc()
+
+    def set_answer(self, token: str, question: int, value: int) -> None:
+        with self._lock:
+            pending = self._pending.setdefault(token, _Pending())
+            pending.answers[question] = value
+            pending.at = time.time()
+        DELTAS.inc()
+
+    def forget(self, token: str) -> None:
+        """Tar bort sessionen direkt (börja om)."""
+        # under _db_lock: en pågående flush hinner antingen inte ta med sessionen
+        # eller har redan skrivit den, så att den raderas här och inte återuppstår
+        with self._db_lock:
+            with self._lock:
+                self._pending.pop(token, None)
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM answer WHERE token = ?", (token,))
+            self._db.execute("DELETE FROM session WHERE token = ?", (token,))
+            self._db.execute("COMMIT")
+
+    # ---------- Läsning ----------
+    def load(self, token: str) -> Optional[SavedSession]:
+        """Sparat läge plus det som ännu inte skrivits; None om token är okänd."""
+        with self._lock:
+            pending = self._pending.get(token)
+            pending = _Pending(pending.instrument, pending.step, pending.page, dict(pending.answers)) if pending else None
+        with self._db_lock:
+            row = self._db.execute("SELECT instrument, step, page FROM session WHERE token = ?", (token,)).fetchone()
+            answers = dict(self._db.execute("SELECT question, value FROM answer WHERE token = ?", (token,)).fetchall())
+        if row is None and (pending is None or pending.instrument is None):
+            return None
+        instrument, step, page = row or (None, None, None)
+        if pending is not None:
+            if pending.instrument is not None:
+                instrument, step, page = pending.instrument, pending.step, pending.page
+            answers.update(pending.answers)
+        return SavedSession(token, instrument, step, page, answers)
+
+    # ---------- Skrivning ----------
+    def flush(self) -> int:
+        """Skriver alla buffrade ändringar i en transaktion; returnerar antalet sessioner."""
+        with self._db_lock:  # se forget()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            states = [
+                (t, p.instrument, p.step, p.page, p.at, p.at)
+                for t, p in pending.items() if p.instrument is not None
+            ]
+            touched = [(p.at, t) for t, p in pending.items() if p.instrument is None]
+            answers = [(t, q, v, t) for t, p in pending.items() for q, v in p.answers.items()]
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO session (token, instrument, step, page, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(token) DO UPDATE SET"
+                    " instrument = excluded.instrument, step = excluded.step, page = excluded.page,"
+                    " updated_at = excluded.updated_at",
+                    states,
+                )
+                self._db.executemany("UPDATE session SET updated_at = ? WHERE token = ?", touched)
+                # svar till en borttagen session (sent klick efter "börja om") skrivs inte
+                self._db.executemany(
+                    "INSERT INTO answer (token, question, value)"
+                    " SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM session WHERE token = ?)"
+                    " ON CONFLICT(token, question) DO UPDATE SET value = excluded.value",
+                    answers,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                with self._lock:  # tillbaka i bufferten; nyare ändringar vinner
+                    for token, p in pending.items():
+                        newer = self._pending.setdefault(token, p)
+                        if newer is not p:
+                            newer.answers = {**p.answers, **newer.answers}
+                            if newer.instrument is None:
+                                newer.instrument, newer.step, newer.page = p.instrument, p.step, p.page
+                raise
+        FLUSHES.inc()
+        return len(pending)
+
+    def prune(self, older_than_s: float = TTL_S) -> int:
+        """Tar bort sessioner som inte rörts på `older_than_s` sekunder."""
+        cutoff = time.time() - older_than_s
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "DELETE FROM answer WHERE token IN (SELECT token FROM session WHERE updated_at < ?)", (cutoff,)
+            )
+            n = self._db.execute("DELETE FROM session WHERE updated_at < ?", (cutoff,)).rowcount
+            self._db.execute("COMMIT")
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        with self._db_lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM session").fetchone()[0]
+            answers = self._db.execute("SELECT COUNT(*) FROM answer").fetchone()[0]
+        with self._lock:
+            pending = len(self._pending)
+        return {"sessions": sessions, "answers": answers, "pending": pending}
+
+    # ---------- Bakgrundstråd ----------
+    def start(self) -> "SessionStore":
+        self._thread = threading.Thread(target=self._run, name="sessions", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_s):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # ligger kvar i bufferten till nästa varv
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.sessions", description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=DEFAULT_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="Antal sessioner och sparade svar")
+    p_prune = sub.add_parser("prune", help="Ta bort gamla sessioner")
+    p_prune.add_argument("--days", type=float, default=TTL_S / 86400)
+    args = ap.parse_args(argv)
+
+    store = SessionStore(args.db)
+    try:
+        if args.cmd == "stats":
+            for key, value in store.stats().items():
+                print(f"{key:<10}{value}")
+        else:
+            print(f"Tog bort {store.prune(args.days * 86400)} sessioner")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
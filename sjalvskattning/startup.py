@@ -0,0 +1,210 @@
+"""Kallstartsprofil: import- och initieringstid per modul och fas.
+
+Appen markerar sina startfaser med `phase()` (självtester, plan, session,
+uppvärmning av rapportdelen) och `mark()` (tid sedan processstart, t.ex.
+första vyn). Första värdet per fas gäller – det är kallstarten som räknas.
+Tiderna finns i `phases()` och som mätvärdet `fl_startup_seconds{phase=…}`.
+
+Importtid per modul mäts av CLI:t: en ny process med `-X importtime` kör
+appen en gång (startvyn) via Streamlits AppTest, väntar in uppvärmningen och
+jämför mot en sparad baslinje, som benchmarks/bench.py:
+
+    python -m sjalvskattning.startup
+    python -m sjalvskattning.startup --save-baseline
+    python -m sjalvskattning.startup --fail-on-regression
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import gauge
+
+STARTED = time.perf_counter()  # appen importerar modulen först, så nära processstart som det går
+HEAVY = ("numpy", "reportlab", "sjalvskattning.report", "sjalvskattning.columnstore")
+RESULTS_DIR = Path(os.environ.get("FL_STARTUP_DIR", ".data/startup"))
+DEFAULT_APP = Path(__file__).resolve().parent.parent / "app.py"
+
+STARTUP_SECONDS = gauge("fl_startup_seconds", "Tid per startfas (första gången i processen).", ("phase",))
+
+_phases: "OrderedDict[str, float]" = OrderedDict()
+_loaded: Dict[str, List[str]] = {}
+_warm: List[threading.Thread] = []
+_lock = threading.Lock()
+
+
+# ---------- Faser ----------
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        if name in _phases:
+            return
+        _phases[name] = seconds
+    STARTUP_SECONDS.set(seconds, phase=name)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def mark(name: str) -> None:
+    """Tid sedan start, och vilka tunga moduler som redan var laddade då."""
+    with _lock:
+        _loaded.setdefault(name, [m for m in HEAVY if m in sys.modules])
+    record(name, time.perf_counter() - STARTED)
+
+
+def phases() -> Dict[str, float]:
+    with _lock:
+        return dict(_phases)
+
+
+def loaded_at(name: str) -> Optional[List[str]]:
+    with _lock:
+        return _loaded.get(name)
+
+
+def warm_in_background(name: str, fn: Callable[[], None]) -> threading.Thread:
+    """Kör `fn` i en bakgrundstråd som fasen `name`."""
+
+    def run() -> None:
+        with phase(name):
+            fn()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    with _lock:
+        _warm.append(thread)
+    return thread
+
+
+def wait_warm(timeout: Optional[float] = None) -> None:
+    with _lock:
+        threads = list(_warm)
+    for thread in threads:
+        thread.join(timeout)
+
+
+# ---------- Importprofil ----------
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Körs i en ny process under -X importtime; skriver faserna som JSON sist på stdout
+_DRIVER = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+from sjalvskattning import startup
+startup.wait_warm(120)
+print(json.dumps({
+    "phases": startup.phases(),
+    "loadedAtFirstPaint": startup.loaded_at("first_paint"),
+    "exception": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(modul, egen µs, kumulativ µs, djup) per rad från -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def profile(app: Path = DEFAULT_APP) -> Dict[str, object]:
+    """Kör appen en gång i en ny process och samlar importtider och faser."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(app.parent), os.environ.get("PYTHONPATH")]))}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _DRIVER, str(app)],
+        capture_output=True, text=True, env=env, cwd=app.parent, timeout=300,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Appen kunde inte startas:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    top_level = [(name, cum) for name, _, cum, depth in rows if depth == 0]
+    by_package: Dict[str, int] = {}
+    for name, cum in top_level:
+        root = name.split(".")[0] if not name.startswith("sjalvskattning.") else name
+        by_package[root] = by_package.get(root, 0) + cum
+    metrics: Dict[str, float] = {"wall.s": wall, "import.total_ms": sum(c for _, c in top_level) / 1000}
+    for root, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:12]:
+        metrics[f"import.{root}_ms"] = us / 1000
+    for name, seconds in result["phases"].items():
+        metrics[f"phase.{name}_ms"] = seconds * 1000
+    return {
+        "metrics": metrics,
+        "loadedAtFirstPaint": result["loadedAtFirstPaint"],
+        "slowest": sorted(((n, c / 1000) for n, _, c, _ in rows), key=lambda r: -r[1])[:15],
+        "exception": result["exception"],
+    }
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Mätvärden som blivit mer än `threshold` (andel) långsammare än baslinjen."""
+    worse = []
+    for key, value in current.items():
+        base = baseline.get(key)
+        if base and value > base * (1 + threshold) and value - base > 5:  # < 5 ms är brus
+            worse.append(f"{key}: {base:.1f} → {value:.1f} (+{(value / base - 1) * 100:.0f} %)")
+    return worse
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.startup", description=__doc__.splitlines()[0])
+    ap.add_argument("--app", type=Path, default=DEFAULT_APP)
+    ap.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.25, help="tillåten försämring som andel (0.25 = 25 %%)")
+    args = ap.parse_args(argv)
+
+    result = profile(args.app)
+    metrics = result["metrics"]
+    for key, value in metrics.items():
+        print(f"{key:<40}{value:>10.1f}")
+    print(f"tunga moduler vid första vyn: {', '.join(result['loadedAtFirstPaint'] or []) or '—'}")
+    print("långsammaste importerna (kumulativ ms):")
+    for name, ms in result["slowest"]:
+        print(f"  {name:<50}{ms:>8.1f}")
+    if result["exception"]:
+        print("undantag i appen:", *result["exception"], sep="\n  ")
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"→ {out}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(metrics, indent=2))
+        print(f"baslinje sparad: {args.baseline}")
+        return 0
+    if args.baseline.exists():
+        worse = compare(metrics, json.loads(args.baseline.read_text()), args.threshold)
+        for line in worse:
+            print(f"FÖRSÄMRING {line}")
+        if worse and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,85 @@
+"""Skrivbara mål för PDF:en: räkna bytes, Base64 i bitar.
+
+Rapporten skrivs till ett filobjekt (fil, nedladdning, uppladdningskropp) i
+stället för att lämnas som en sträng som sedan kodas och kopieras vidare.
+Där Base64 verkligen krävs (PDF:en inbäddad i webhookens JSON) kodas den
+bit för bit rakt in i kroppen, så ingen hel Base64-sträng skapas.
+"""
+from __future__ import annotations
+
+import base64
+from typing import BinaryIO, Union
+
+CHUNK = 48 * 1024  # delbart med 3: hela Base64-grupper per bit
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class CountingWriter:
+    """Skickar vidare till `out` och räknar bytes."""
+
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.n = 0
+
+    def write(self, data: Buffer) -> int:
+        self.n += len(data)
+        return self.out.write(data)
+
+    def flush(self) -> None:
+        self.out.flush()
+
+
+class Base64Writer:
+    """Base64-kodar det som skrivs och skickar vidare till `out`; `close()` skriver utfyllnaden.
+
+    Som mest två bytes väntar mellan anropen; stora skrivningar kodas i
+    bitar om `CHUNK` bytes.
+    """
+
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self._rest = b""
+        self.n = 0  # kodade bytes skrivna till out
+
+    def write(self, data: Buffer) -> int:
+        view = memoryview(data).cast("B")
+        if self._rest:
+            need = 3 - len(self._rest)
+            self._rest += bytes(view[:need])
+            view = view[need:]
+            if len(self._rest) < 3:
+                return len(data)
+            self._emit(self._rest)
+            self._rest = b""
+        whole = len(view) - len(view) % 3
+        for i in range(0, whole, CHUNK):
+            self._emit(view[i:min(i + CHUNK, whole)])
+        self._rest = bytes(view[whole:])
+        return len(data)
+
+    def _emit(self, data: Buffer) -> None:
+        encoded = base64.b64encode(data)
+        self.n += len(encoded)
+        self.out.write(encoded)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._rest:
+            self._emit(self._rest)
+            self._rest = b""
+
+    def __enter__(self) -> "Base64Writer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_base64(data: Buffer, out: BinaryIO) -> int:
+    """`data` som Base64 till `out` i bitar; returnerar antalet skrivna tecken."""
+    with Base64Writer(out) as b64:
+        b64.write(data)
+    return b64.n
@@ -0,0 +1,107 @@
+"""Lokal ersättare för Power Automate-flödet, för test och lasttester.
+
+Tar emot POST, svarar 202 och räknar inlämningar. Latens och andel 429-svar
+(med Retry-After) kan ställas in för att efterlikna strypning vid toppar.
+
+    python -m sjalvskattning.stub_endpoint --port 8765 --latency 0.2 --rate-429 0.1
+
+Peka webhooken mot http://127.0.0.1:8765/invoke?sig=stub.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+class StubConfig:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.received = 0
+        self.throttled = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def count(self, n_bytes: int, throttled: bool) -> None:
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+            else:
+                self.received += 1
+                self.bytes += n_bytes
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, så att anslutningspoolen kan återanvändas
+    # huvud och kropp skrivs separat; med Nagle väntar kroppen på klientens fördröjda ACK (~40 ms)
+    disable_nagle_algorithm = True
+    config: StubConfig
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        cfg = self.config
+        delay = cfg.latency + random.uniform(0, cfg.jitter)
+        if delay:
+            time.sleep(delay)
+        throttled = random.random() < cfg.rate_429
+        cfg.count(len(body), throttled)
+        if throttled:
+            self._reply(429, {"error": "Too Many Requests"}, {"Retry-After": str(cfg.retry_after)})
+        else:
+            self._reply(202, {"ok": True})
+
+    def do_GET(self) -> None:
+        cfg = self.config
+        self._reply(200, {"received": cfg.received, "throttled": cfg.throttled, "bytes": cfg.bytes})
+
+    def _reply(self, status: int, obj: dict, headers: Optional[dict] = None) -> None:
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:  # tyst som standard
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, config: Optional[StubConfig] = None) -> Tuple[ThreadingHTTPServer, StubConfig]:
+    """Startar stubben i en bakgrundstråd. Port 0 ger en ledig port (server.server_port)."""
+    config = config or StubConfig()
+    handler = type("StubHandler", (_Handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-endpoint", daemon=True).start()
+    return server, config
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokal stand-in för Power Automate-webhooken.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="fast svarstid i sekunder")
+    parser.add_argument("--jitter", type=float, default=0.0, help="slumpad extra svarstid i sekunder")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="andel förfrågningar som får 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After i sekunder vid 429")
+    args = parser.parse_args()
+    server, config = serve(args.host, args.port, StubConfig(args.latency, args.jitter, args.rate_429, args.retry_after))
+    print(f"Lyssnar på http://{args.host}:{server.server_port}/invoke?sig=stub")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
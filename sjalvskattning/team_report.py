@@ -0,0 +1,577 @@
+"""Teamrapport per företag: all statistik i ett svep, en vektor-PDF.
+
+Underlaget strömmas i block om `CHUNK` rader: kolumnlagringen (minnesmappad)
+eller en CSV/JSONL-export. Varje block poängsätts med `score_matrix` och
+räknas in i fasta histogram per företag:
+
+- svarsfördelning per fråga (skalvärde × fråga)
+- fördelning av summan per delområde, som ger medel, spridning och kvartiler
+  jämfört med maxsumman
+- antal per klassning per delområde och totalt
+
+Minnet beror alltså på instrumentet och antalet företag, inte på antalet
+respondenter, och alla företag räknas i samma svep. PDF:en ritas med samma
+byggblock och färger som den personliga rapporten. Grupper under `--min-n`
+respondenter får ingen rapport, så att enskilda svar inte kan utläsas.
+
+    python -m sjalvskattning.team_report "Acme AB" -o acme.pdf
+    python -m sjalvskattning.team_report --all -o teamrapporter/ --since 2026-01-01
+    python -m sjalvskattning.team_report "Acme AB" --source export.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from reportlab.lib.colors import Color
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfgen.canvas import Canvas
+
+from .aggregates import company_key
+from .columnstore import Columns, ColumnStore, DEFAULT_ROOT, unpack_nibbles
+from .core import answers_from_row, sv_date
+from .instrument import InstrumentError, ScoringPlan, plan_for_key, plan_for_row
+from .metrics import observe_size, span
+from .report import BODY, C, FONT, FONT_BOLD, PAD, ROW_H, Heading, Panel, Para, flow, pdf_canvas
+from .streams import CountingWriter
+from .vectorized import answers_matrix, score_matrix
+
+log = logging.getLogger(__name__)
+
+CHUNK = 65_536
+MIN_N = int(os.environ.get("FL_TEAM_MIN_N", "5"))
+
+QUESTION = ParagraphStyle("team_question", parent=BODY, fontSize=8.5, leading=11)
+BAND_COLORS = (C["orange"], C["navy300"], C["green"])  # stigande klassning
+BAR_H = 4 * mm
+
+
+class TeamReportError(ValueError):
+    """För liten grupp, okänt företag eller tomt underlag."""
+
+
+# ---------- Statistik ----------
+@dataclass
+class TeamStats:
+    """Fasta histogram för en grupp; `add()` tar ett block rader i taget."""
+
+    plan: ScoringPlan
+    n: int = 0
+    questions: np.ndarray = field(init=False)  # fråga × (0 = obesvarad, skalvärden …)
+    sums: List[np.ndarray] = field(init=False)  # per delområde: antal per summa 0..max
+    bands: np.ndarray = field(init=False)       # (delområden + totalt) × klassning
+    first_ms: Optional[int] = None
+    last_ms: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        width = self.plan.scale_max + 1
+        self.questions = np.zeros((self.plan.n_questions, width), dtype=np.int64)
+        self.sums = [np.zeros(cat.max_sum + 1, dtype=np.int64) for cat in self.plan.categories]
+        self.bands = np.zeros((len(self.plan.categories) + 1, len(self.plan.bands)), dtype=np.int64)
+
+    def add(self, answers: np.ndarray, ts_ms: Optional[np.ndarray] = None) -> None:
+        """Räknar in ett block N×frågor (0 = obesvarad)."""
+        if not len(answers):
+            return
+        # score_matrix kontrollerar skalan först; annars hamnar t.ex. 8 i nästa frågas histogram
+        answers = np.asarray(answers)
+        scores = score_matrix(answers, plan=self.plan)
+        n_q, width = self.questions.shape
+        # en bincount för alla frågor: fråga j får värdena j·width … j·width + width − 1
+        offsets = np.arange(n_q, dtype=np.int64) * width
+        self.questions += np.bincount((answers + offsets).ravel(), minlength=n_q * width).reshape(n_q, width)
+        n_bands = self.bands.shape[1]
+        for k, counts in enumerate(self.sums):
+            counts += np.bincount(scores.sums[:, k], minlength=len(counts))[: len(counts)]
+            codes = scores.bands[:, k]
+            self.bands[k] += np.bincount(codes[codes >= 0], minlength=n_bands)
+        codes = scores.total_band
+        self.bands[-1] += np.bincount(codes[codes >= 0], minlength=n_bands)
+        self.n += len(answers)
+        if ts_ms is not None and len(ts_ms):
+            lo, hi = int(ts_ms.min()), int(ts_ms.max())
+            self.first_ms = lo if self.first_ms is None else min(self.first_ms, lo)
+            self.last_ms = hi if self.last_ms is None else max(self.last_ms, hi)
+
+    def category(self, k: int) -> Dict[str, Any]:
+        """Medel, spridning och kvartiler för summan i delområde `k`."""
+        counts = self.sums[k]
+        values = np.arange(len(counts))
+        n = int(counts.sum())
+        if not n:
+            return {"mean": None, "std": None, "p25": None, "median": None, "p75": None}
+        mean = float((values * counts).sum() / n)
+        var = float(((values - mean) ** 2 * counts).sum() / (n - 1)) if n > 1 else 0.0
+        cum = np.cumsum(counts)
+        quantile = lambda q: int(np.searchsorted(cum, q * n))  # noqa: E731
+        return {"mean": mean, "std": var ** 0.5, "p25": quantile(0.25), "median": quantile(0.5), "p75": quantile(0.75)}
+
+    def summary(self) -> Dict[str, Any]:
+        labels = list(self.plan.band_edges()[1])
+        values = np.arange(self.questions.shape[1])
+        return {
+            "instrument": self.plan.key,
+            "n": self.n,
+            "categories": [
+                {
+                    "key": cat.key,
+                    "title": cat.title,
+                    "max": cat.max_sum,
+                    **{k: (round(v, 2) if isinstance(v, float) else v) for k, v in self.category(i).items()},
+                    "bands": dict(zip(labels, self.bands[i].tolist())),
+                }
+                for i, cat in enumerate(self.plan.categories)
+            ],
+            "totalBands": dict(zip(labels, self.bands[-1].tolist())),
+            "questions": [
+                {
+                    "id": q.id,
+                    "counts": row[self.plan.scale_min:].tolist(),
+                    "unanswered": int(row[0]),
+                    "mean": round(float((values * row).sum() / row[1:].sum()), 2) if row[1:].sum() else None,
+                }
+                for q, row in zip(self.plan.questions, self.questions)
+            ],
+        }
+
+
+def _since_ms(day: Optional[str]) -> Optional[int]:
+    """Midnatt UTC för dagen, samma dygnsgräns som scan_rows använder."""
+    return int(datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp() * 1000) if day else None
+
+
+def _submitted_at(row: Dict[str, Any]) -> Optional[datetime]:
+    """`submittedAt` som UTC-tid; tid utan zon räknas som UTC. ValueError om fältet inte går att tolka."""
+    submitted = row.get("submittedAt")
+    if not submitted:
+        return None
+    if not isinstance(submitted, str):
+        raise ValueError(f"submittedAt ska vara en sträng, fick {submitted!r}")
+    at = datetime.fromisoformat(submitted.replace("Z", "+00:00"))
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at.astimezone(timezone.utc)
+
+
+def scan_columns(
+    cols: Columns,
+    company: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    chunk: int = CHUNK,
+) -> Dict[str, TeamStats]:
+    """Ett svep över kolumnlagringen; statistik per företag (eller bara `company`)."""
+    only = cols.company_code(company) if company is not None else None
+    if company is not None and only is None:
+        return {}
+    lo, hi = _since_ms(since), _since_ms(until)
+    groups: Dict[int, TeamStats] = {}
+    for start in range(0, len(cols), chunk):
+        stop = min(start + chunk, len(cols))
+        codes = np.asarray(cols.company[start:stop])
+        ts = np.asarray(cols.ts_ms[start:stop])
+        keep = np.ones(len(codes), dtype=bool) if only is None else codes == only
+        if lo is not None:
+            keep &= ts >= lo
+        if hi is not None:
+            keep &= ts < hi + 86_400_000  # till och med dagen
+        raw = np.asarray(cols.answers_raw[start:stop])[keep]
+        answers = unpack_nibbles(raw, cols.plan.n_questions) if cols.packed else raw
+        codes, ts = codes[keep], ts[keep]
+        # sortera blocket på företag och räkna in varje företags del på en gång
+        order = np.argsort(codes, kind="stable")
+        codes, answers, ts = codes[order], answers[order], ts[order]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        for lo_i, hi_i in zip(np.r_[0, bounds], np.r_[bounds, len(codes)]):
+            if hi_i > lo_i:
+                stats = groups.setdefault(int(codes[lo_i]), TeamStats(cols.plan))
+                stats.add(answers[lo_i:hi_i], ts[lo_i:hi_i])
+    return {cols.companies[code]: stats for code, stats in groups.items()}
+
+
+def scan_rows(
+    rows: Iterable[Dict[str, Any]],
+    plan: ScoringPlan,
+    company: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    chunk: int = CHUNK,
+) -> Dict[str, TeamStats]:
+    """Ett svep över en CSV/JSONL-export (batchformatet).
+
+    Rader för andra instrument hoppas över, liksom rader vars instrument inte
+    finns och rader med ogiltiga svar eller tidsstämpel (de räknas och
+    loggas). Dagarna i `since`/`until` är UTC-dygn. Högst `chunk` rader
+    buffras, oavsett antalet företag.
+    """
+    only = company_key(company) if company is not None else None
+    groups: Dict[str, TeamStats] = {}
+    pending: Dict[str, Tuple[List[Dict[int, int]], List[int]]] = {}
+    buffered = 0
+    unknown: Dict[str, int] = {}
+    invalid = 0
+
+    def flush() -> None:
+        for key, (answer_sets, ts) in pending.items():
+            groups.setdefault(key, TeamStats(plan)).add(answers_matrix(answer_sets, plan), np.array(ts, dtype=np.int64))
+        pending.clear()
+
+    for row in rows:
+        key = company_key(row.get("company") or "")
+        if only is not None and key != only:
+            continue
+        try:
+            if plan_for_row(row).key != plan.key:
+                continue
+        except InstrumentError:
+            instrument = str(row.get("instrument"))
+            unknown[instrument] = unknown.get(instrument, 0) + 1
+            continue
+        try:
+            at = _submitted_at(row)
+            answers = answers_from_row(row)
+            plan.validate_answers(answers)
+        except (ValueError, TypeError) as e:  # även InstrumentError och trasig answersJson
+            invalid += 1
+            log.debug("Ogiltig rad %s hoppades över: %s", row.get("title"), e)
+            continue
+        day = at.date().isoformat() if at else None
+        if day and (since and day < since or until and day > until):
+            continue
+        answer_sets, ts = pending.setdefault(key, ([], []))
+        answer_sets.append(answers)
+        if at:
+            ts.append(int(at.timestamp() * 1000))
+        buffered += 1
+        if buffered >= chunk:
+            flush()
+            buffered = 0
+    flush()
+    for instrument, count in sorted(unknown.items()):
+        log.warning("%d rader med okänt instrument %s hoppades över", count, instrument)
+    if invalid:
+        log.warning("%d rader med ogiltiga svar eller tidsstämpel hoppades över", invalid)
+    return groups
+
+
+# ---------- PDF-block ----------
+def _sv(x: float, decimals: int = 1) -> str:
+    return f"{x:.{decimals}f}".replace(".", ",")
+
+
+def _pct(count: int, n: int) -> str:
+    return f"{round(100 * count / n)} %" if n else "–"
+
+
+def _scale_colors(n: int) -> List[Color]:
+    """Från ljusgrått (lägsta) till marinblått (högsta skalvärdet)."""
+    a, b = C["gray200"], C["navy700"]
+    steps = max(1, n - 1)
+    return [
+        Color(a.red + (b.red - a.red) * i / steps, a.green + (b.green - a.green) * i / steps, a.blue + (b.blue - a.blue) * i / steps)
+        for i in range(n)
+    ]
+
+
+def _stacked_bar(c: Canvas, x: float, y: float, width: float, counts: Sequence[int], colors: Sequence[Color]) -> None:
+    total = sum(counts)
+    c.setFillColor(C["gray100"])
+    c.rect(x, y, width, BAR_H, stroke=0, fill=1)
+    if not total:
+        return
+    for count, color in zip(counts, colors):
+        w = width * count / total
+        if w > 0:
+            c.setFillColor(color)
+            c.rect(x, y, w, BAR_H, stroke=0, fill=1)
+            x += w
+
+
+class _Facts:
+    """Etikett till vänster, värde till höger, linje under (som Uppgifter)."""
+
+    def __init__(self, rows: Sequence[Tuple[str, str]]):
+        self.rows = rows
+        self.space_before = 0.0
+        self.h = len(rows) * ROW_H
+
+    def wrap(self, width: float) -> float:
+        return self.h
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        for label, value in self.rows:
+            c.setFillColor(C["text"])
+            c.setFont(FONT_BOLD, 9.5)
+            c.drawString(x, top - 4.5 * mm, label)
+            c.setFont(FONT, 9.5)
+            c.drawRightString(x + width, top - 4.5 * mm, value)
+            top -= ROW_H
+            c.setStrokeColor(C["gray200"])
+            c.line(x, top, x + width, top)
+
+
+class _Bands:
+    """Andel per klassning som en staplad stapel med förklaring."""
+
+    def __init__(self, labels: Sequence[str], counts: Sequence[int], space_before: float = 0):
+        self.labels, self.counts = labels, [int(x) for x in counts]
+        self.space_before = space_before
+        self.h = space_before + BAR_H + 6 * mm
+
+    def wrap(self, width: float) -> float:
+        return self.h
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        top -= self.space_before
+        colors = [BAND_COLORS[i % len(BAND_COLORS)] for i in range(len(self.labels))]
+        _stacked_bar(c, x, top - BAR_H, width, self.counts, colors)
+        n = sum(self.counts)
+        lx = x
+        c.setFont(FONT, 8)
+        for label, count, color in zip(self.labels, self.counts, colors):
+            c.setFillColor(color)
+            c.rect(lx, top - BAR_H - 4.6 * mm, 2.5 * mm, 2.5 * mm, stroke=0, fill=1)
+            text = f"{label} {_pct(count, n)}"
+            c.setFillColor(C["gray700"])
+            c.drawString(lx + 3.5 * mm, top - BAR_H - 4.3 * mm, text)
+            lx += 3.5 * mm + c.stringWidth(text, FONT, 8) + 5 * mm
+
+
+class _CategoryStats:
+    """Medelsumma mot max, kvartiler och klassning till vänster; summornas fördelning till höger."""
+
+    def __init__(self, stats: TeamStats, index: int):
+        self.stats, self.index = stats, index
+        self.cat = stats.plan.categories[index]
+        self.space_before = 0.0
+        self.h = 34 * mm
+
+    def wrap(self, width: float) -> float:
+        return self.h
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        s = self.stats.category(self.index)
+        left_w = width * 0.55
+        if s["mean"] is None:
+            c.setFillColor(C["gray700"])
+            c.setFont(FONT, 9.5)
+            c.drawString(x, top - 6 * mm, "Inga svar")
+            return
+        c.setFillColor(C["text"])
+        c.setFont(FONT_BOLD, 22)
+        big = _sv(s["mean"])
+        c.drawString(x, top - 9 * mm, big)
+        c.setFillColor(C["gray700"])
+        c.setFont(FONT, 9)
+        c.drawString(x + c.stringWidth(big, FONT_BOLD, 22) + 2 * mm, top - 9 * mm, f"av {self.cat.max_sum} i medel")
+        bar_y = top - 15 * mm
+        c.setFillColor(C["gray200"])
+        c.roundRect(x, bar_y, left_w, 3 * mm, 1 * mm, stroke=0, fill=1)
+        c.setFillColor(C["green"])
+        c.roundRect(x, bar_y, left_w * min(1.0, s["mean"] / self.cat.max_sum), 3 * mm, 1 * mm, stroke=0, fill=1)
+        c.setFillColor(C["gray700"])
+        c.setFont(FONT, 8)
+        c.drawString(
+            x, top - 19.5 * mm,
+            f"Median {s['median']} · kvartiler {s['p25']}–{s['p75']} · standardavvikelse {_sv(s['std'])}",
+        )
+        _Bands(self.stats.plan.band_edges()[1], self.stats.bands[self.index]).draw(c, x, top - 23 * mm, left_w)
+        self._histogram(c, x + left_w + 8 * mm, top, width - left_w - 8 * mm)
+
+    def _histogram(self, c: Canvas, x: float, top: float, width: float) -> None:
+        lo = self.cat.size * self.stats.plan.scale_min
+        counts = self.stats.sums[self.index][lo:]
+        peak = max(1, int(counts.max()))
+        chart_h, base = 22 * mm, top - 27 * mm
+        bar_w = width / len(counts)
+        c.setFillColor(C["navy300"])
+        for i, count in enumerate(counts):
+            if count:
+                c.rect(x + i * bar_w, base, max(bar_w - 0.3, 0.3), chart_h * count / peak, stroke=0, fill=1)
+        c.setStrokeColor(C["gray400"])
+        c.line(x, base, x + width, base)
+        c.setFillColor(C["gray700"])
+        c.setFont(FONT, 7)
+        c.drawString(x, base - 3 * mm, str(lo))
+        c.drawRightString(x + width, base - 3 * mm, str(self.cat.max_sum))
+        c.drawCentredString(x + width / 2, base - 3 * mm, "Fördelning av summor")
+
+
+class _ScaleLegend:
+    def __init__(self, plan: ScoringPlan):
+        self.plan = plan
+        self.space_before = 0.0
+        self.h = 7 * mm
+
+    def wrap(self, width: float) -> float:
+        return self.h
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        c.setFont(FONT, 7.5)
+        step = width / len(self.plan.scale_values)
+        for i, (color, label) in enumerate(zip(_scale_colors(len(self.plan.scale_values)), self.plan.scale_labels)):
+            c.setFillColor(color)
+            c.rect(x + i * step, top - 3.5 * mm, 2.5 * mm, 2.5 * mm, stroke=0, fill=1)
+            c.setFillColor(C["gray700"])
+            c.drawString(x + i * step + 3.5 * mm, top - 3.2 * mm, label[:22])
+        c.setFont(FONT_BOLD, 7.5)
+        c.drawRightString(x + width, top - 3.2 * mm, "Medel")
+
+
+class _QuestionRow:
+    """Frågetext till vänster, svarsfördelningen som staplad stapel och medel till höger."""
+
+    def __init__(self, question_id: int, text: str, counts: np.ndarray, plan: ScoringPlan, colors: Sequence[Color]):
+        self.p = Para(f"<b>{question_id}.</b> {text}", QUESTION)
+        self.counts, self.colors = [int(x) for x in counts[plan.scale_min:]], colors  # ett antal per skalvärde
+        answered = sum(self.counts)
+        self.mean = sum(v * n for v, n in zip(plan.scale_values, self.counts)) / answered if answered else None
+        self.space_before = 0.0
+        self.h = 0.0
+
+    def wrap(self, width: float) -> float:
+        self.h = max(self.p.wrap(width * 0.52), BAR_H + 1 * mm) + 2 * mm
+        return self.h
+
+    def draw(self, c: Canvas, x: float, top: float, width: float) -> None:
+        self.p.draw(c, x, top, width * 0.52)
+        bar_x, bar_w = x + width * 0.55, width * 0.37
+        bar_y = top - 1 * mm - BAR_H
+        _stacked_bar(c, bar_x, bar_y, bar_w, self.counts, self.colors)
+        c.setFillColor(C["text"])
+        c.setFont(FONT_BOLD, 9)
+        c.drawRightString(x + width, bar_y + 1 * mm, _sv(self.mean) if self.mean is not None else "–")
+
+
+def _blocks(stats: TeamStats, company: str, generated: date) -> list:
+    plan = stats.plan
+    period = "–"
+    if stats.first_ms is not None:
+        first, last = (date.fromtimestamp(ms / 1000) for ms in (stats.first_ms, stats.last_ms))
+        period = sv_date(first) if first == last else f"{sv_date(first)} – {sv_date(last)}"
+    colors = _scale_colors(len(plan.scale_values))
+    labels = plan.band_edges()[1]
+    return [
+        Heading(f"Teamrapport – {company}", 20, PAD),
+        Panel("Underlag", [_Facts((
+            ("Instrument", plan.title),
+            ("Version", plan.key),
+            ("Respondenter", f"{stats.n:,}".replace(",", " ")),
+            ("Period", period),
+            ("Genererad", sv_date(generated)),
+        ))], space_before=4 * mm),
+        Heading("Delområden", 14, 3 * mm, space_before=3 * mm),
+        *(Panel(cat.title, [_CategoryStats(stats, i)], space_before=3 * mm) for i, cat in enumerate(plan.categories)),
+        Panel("Klassning av totalmedel", [_Bands(labels, stats.bands[-1])], space_before=3 * mm),
+        Panel("Svarsfördelning per fråga", [
+            _ScaleLegend(plan),
+            *(
+                _QuestionRow(q.id, q.text, row, plan, colors)
+                for q, row in zip(plan.questions, stats.questions)
+            ),
+        ], space_before=8 * mm),
+    ]
+
+
+def write_team_pdf(
+    stats: TeamStats, company: str, out: BinaryIO, generated: Optional[date] = None, min_n: int = MIN_N
+) -> int:
+    """Skriver teamrapporten till `out`; returnerar antalet bytes."""
+    if stats.n < min_n:
+        raise TeamReportError(f"{company}: {stats.n} respondenter, minst {min_n} krävs för en teamrapport")
+    sink = CountingWriter(out)
+    with span("team_report", company_key(company)):
+        c = pdf_canvas(sink, f"Teamrapport – {company}")
+        flow(c, _blocks(stats, company, generated or date.today()))
+        c.save()
+    observe_size("team_pdf", sink.n)
+    return sink.n
+
+
+def build_team_pdf(stats: TeamStats, company: str, generated: Optional[date] = None, min_n: int = MIN_N) -> bytes:
+    buf = io.BytesIO()
+    write_team_pdf(stats, company, buf, generated, min_n)
+    return buf.getvalue()
+
+
+def team_file_name(company: str, d: Optional[date] = None, taken: Optional[Set[str]] = None) -> str:
+    """Filnamnet för företagets rapport; finns det redan i `taken` (oavsett skiftläge) läggs _2, _3 … till."""
+    d = d or date.today()
+    stem = f"Teamrapport_{re.sub(r'[^0-9A-Za-zÅÄÖåäö]+', '_', company).strip('_') or 'team'}_{d:%Y%m%d}"
+    name, i = f"{stem}.pdf", 1
+    while taken is not None and name.lower() in taken:
+        i += 1
+        name = f"{stem}_{i}.pdf"
+    if taken is not None:
+        taken.add(name.lower())
+    return name
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sjalvskattning.team_report", description=__doc__.splitlines()[0])
+    ap.add_argument("company", nargs="?", help="företaget (utelämna med --all)")
+    ap.add_argument("--all", action="store_true", help="en rapport per företag, i samma svep")
+    ap.add_argument("-o", "--out", type=Path, help="PDF-fil, eller katalog med --all")
+    ap.add_argument("--instrument", help="t.ex. funktionellt-ledarskap.v1 (default: standard)")
+    ap.add_argument("--source", type=Path, help="CSV/JSONL-export i stället för kolumnlagringen")
+    ap.add_argument("--root", default=DEFAULT_ROOT, help=f"kolumnlagringen (default: {DEFAULT_ROOT})")
+    ap.add_argument("--since", help="första dag, YYYY-MM-DD")
+    ap.add_argument("--until", help="sista dag, YYYY-MM-DD")
+    ap.add_argument("--min-n", type=int, default=MIN_N, help=f"minsta gruppstorlek (default: {MIN_N})")
+    ap.add_argument("--json", action="store_true", help="skriv statistiken som JSON i stället för PDF")
+    args = ap.parse_args(argv)
+    if not args.all and not args.company:
+        ap.error("ange ett företag eller --all")
+
+    plan = plan_for_key(args.instrument)
+    company = None if args.all else args.company
+    started = time.perf_counter()
+    if args.source is not None:
+        from .batch import read_submissions
+
+        groups = scan_rows(read_submissions(args.source), plan, company, args.since, args.until)
+    else:
+        groups = scan_columns(ColumnStore(args.root).columns(plan.key), company, args.since, args.until)
+    n = sum(s.n for s in groups.values())
+    print(f"{n} inlämningar, {len(groups)} företag på {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    if not groups:
+        print("Inga inlämningar matchade", file=sys.stderr)
+        return 1
+    # små grupper varken som PDF eller JSON, så att enskilda svar inte kan utläsas
+    for name in sorted(groups):
+        if groups[name].n < args.min_n:
+            print(f"{name}: {groups[name].n} respondenter, hoppas över (minst {args.min_n})", file=sys.stderr)
+            del groups[name]
+    if not groups:
+        print(f"Ingen grupp har minst {args.min_n} respondenter", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps({name: s.summary() for name, s in groups.items()}, ensure_ascii=False, indent=2))
+        return 0
+    if args.all:
+        out_dir = args.out or Path("teamrapporter")
+        out_dir.mkdir(parents=True, exist_ok=True)
+    taken: Set[str] = set()  # företag vars namn ger samma filnamn får olika filer
+    for name, stats in sorted(groups.items()):
+        path = out_dir / team_file_name(name, taken=taken) if args.all else args.out or Path(team_file_name(name))
+        with open(path, "wb") as f:
+            size = write_team_pdf(stats, name, f, min_n=args.min_n)
+        print(f"{path} ({size // 1024} kB, {stats.n} respondenter)", file=sys.stderr)
+    print(f"klart på {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,216 @@
+"""POST till Power Automate-webhooken (SharePoint-listan)."""
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import logging
+import os
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Optional, Tuple
+
+from .core import Answers, Contact
+from .instrument import ScoringPlan, default_plan
+from .streams import write_base64
+
+if TYPE_CHECKING:
+    from .blobstore import BlobRef, BlobStore
+    from .outbox import Outbox
+
+log = logging.getLogger(__name__)
+
+# --- Power Automate webhook (anonym URL med sig=) ---
+# Byt endast om du roterar nyckeln i PA. FL_WEBHOOK_URL pekar om leveransen, t.ex. till
+# den lokala insamlingstjänsten (sjalvskattning.ingest).
+WEBHOOK_URL = os.environ.get("FL_WEBHOOK_URL") or "https://default1ad3791223f4412ea6272223201343.20.environment.api.powerplatform.com:443/powerautomate/automations/direct/workflows/bff5923897b04a39bc6ba69ea4afde69/triggers/manual/paths/invoke?api-version=1&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=B1rjO0FhY0ZxXO8VJvWPmcLAv-LMCgICG6tDguPmhwQ"
+WEBHOOK_SECRET = ""  # valfritt: använd om du lagt en Condition på secret i flödet
+
+TIMEOUT_S = 30
+
+# "inline": PDF som base64 i JSON-kroppen (det Power Automate-flödet tar emot idag)
+# "blob": PDF:en i blobstore, webhooken bär en kompakt post med referens (PAYLOAD_VERSION)
+TRANSPORT = os.environ.get("FL_WEBHOOK_TRANSPORT", "inline")
+PAYLOAD_VERSION = 2
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def build_payload(
+    contact: Contact,
+    answers: Answers,
+    secret: Optional[str] = None,
+    pdf: Optional[Dict[str, str]] = None,
+    title_override: Optional[str] = None,
+    plan: Optional[ScoringPlan] = None,
+) -> Dict[str, Any]:
+    """Samma fält som flödet i Power Automate förväntar sig (summorna enligt planens payloadField)."""
+    plan = plan or default_plan()
+    has_pdf = bool(pdf and pdf.get("pdfBase64"))
+    payload: Dict[str, Any] = {
+        "title": title_override or contact.email,  # SharePoint-kolumn "Rubrik"
+        "name": contact.name,
+        "company": contact.company or "",
+        "email": contact.email,
+    }
+    for cat, s in zip(plan.categories, plan.sums(answers)):
+        payload[cat.payload_field] = s
+    payload["answersJson"] = json.dumps({str(k): v for k, v in sorted(answers.items())})
+    payload["submittedAt"] = _utc_now()
+    payload["hasPdf"] = has_pdf
+    if secret:
+        payload["secret"] = secret
+    if has_pdf:
+        payload["pdfBase64"] = pdf["pdfBase64"]
+        payload["fileName"] = pdf["fileName"]
+    return payload
+
+
+def build_compact_payload(
+    contact: Contact,
+    answers: Answers,
+    pdf: Optional["BlobRef"] = None,
+    file_name: Optional[str] = None,
+    secret: Optional[str] = None,
+    title_override: Optional[str] = None,
+    plan: Optional[ScoringPlan] = None,
+) -> Dict[str, Any]:
+    """Versionerad metadatapost utan PDF-innehåll; svaren som lista i frågeordning."""
+    plan = plan or default_plan()
+    payload: Dict[str, Any] = {
+        "v": PAYLOAD_VERSION,
+        "instrument": plan.key,
+        "title": title_override or contact.email,
+        "name": contact.name,
+        "company": contact.company or "",
+        "email": contact.email,
+        "sums": list(plan.sums(answers)),
+        "answers": [answers.get(q.id) for q in plan.questions],  # null = obesvarad
+        "submittedAt": _utc_now(),
+    }
+    if secret:
+        payload["secret"] = secret
+    if pdf is not None:
+        payload["pdf"] = {**pdf.as_dict(), "fileName": file_name}
+    return payload
+
+
+def encode_payload(payload: Dict[str, Any], compress: bool = False) -> Tuple[bytes, Optional[str]]:
+    """Kompakt JSON, valfritt gzip. Returnerar (kropp, Content-Encoding)."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if compress:
+        return gzip.compress(body, mtime=0), "gzip"
+    return body, None
+
+
+def write_payload_with_pdf(out: BinaryIO, payload: Dict[str, Any], pdf: bytes, file_name: str) -> None:
+    """`payload` som kompakt JSON med `pdfBase64` och `fileName` sist, som i build_payload.
+
+    PDF:en Base64-kodas i bitar rakt in i `out`; ingen hel Base64-sträng
+    eller JSON-sträng med PDF:en skapas på vägen.
+    """
+    head = json.dumps({**payload, "hasPdf": True}, ensure_ascii=False, separators=(",", ":"))
+    out.write(head[:-1].encode("utf-8"))
+    out.write(b',"pdfBase64":"')
+    write_base64(pdf, out)
+    out.write(b'","fileName":' + json.dumps(file_name, ensure_ascii=False).encode("utf-8") + b"}")
+
+
+def valid_webhook_url(url: str) -> bool:
+    if not url or "sig=" not in url:
+        log.warning("Webhook URL saknas eller är inte anonym (ingen sig= hittad)")
+        return False
+    return True
+
+
+def enqueue_webhook(
+    outbox: "Outbox",
+    url: str,
+    contact: Contact,
+    answers: Answers,
+    secret: Optional[str] = None,
+    pdf: Optional[Dict[str, str]] = None,
+    title_override: Optional[str] = None,
+    plan: Optional[ScoringPlan] = None,
+) -> Optional[int]:
+    """Lägger inlämningen i utkorgen; leveransen sköts av outbox.DeliveryWorker."""
+    if not valid_webhook_url(url):
+        return None
+    payload = build_payload(contact, answers, secret, pdf, title_override, plan)
+    return outbox.enqueue_json(url, payload, key=title_override)
+
+
+def enqueue_webhook_pdf(
+    outbox: "Outbox",
+    url: str,
+    contact: Contact,
+    answers: Answers,
+    pdf_bytes: bytes,
+    file_name: str,
+    secret: Optional[str] = None,
+    title_override: Optional[str] = None,
+    plan: Optional[ScoringPlan] = None,
+) -> Optional[int]:
+    """Som enqueue_webhook med PDF:en inline, men kroppen byggs i en enda buffert."""
+    if not valid_webhook_url(url):
+        return None
+    buf = io.BytesIO()
+    write_payload_with_pdf(buf, build_payload(contact, answers, secret, None, title_override, plan), pdf_bytes, file_name)
+    return outbox.enqueue(url, buf.getbuffer(), key=title_override)
+
+
+def enqueue_webhook_blob(
+    outbox: "Outbox",
+    blobs: "BlobStore",
+    url: str,
+    contact: Contact,
+    answers: Answers,
+    pdf_bytes: Optional[bytes],
+    file_name: Optional[str] = None,
+    secret: Optional[str] = None,
+    title_override: Optional[str] = None,
+    compress: bool = True,
+    plan: Optional[ScoringPlan] = None,
+) -> Optional[int]:
+    """Som enqueue_webhook, men PDF:en går till blobstore och kroppen blir en kompakt v2-post."""
+    if not valid_webhook_url(url):
+        return None
+    ref = blobs.put(pdf_bytes) if pdf_bytes else None
+    payload = build_compact_payload(contact, answers, ref, file_name, secret, title_override, plan)
+    body, encoding = encode_payload(payload, compress)
+    return outbox.enqueue(url, body, content_encoding=encoding, key=title_override)
+
+
+def post_to_webhook(
+    url: str,
+    contact: Contact,
+    answers: Answers,
+    secret: Optional[str] = None,
+    pdf: Optional[Dict[str, str]] = None,
+    title_override: Optional[str] = None,
+    plan: Optional[ScoringPlan] = None,
+) -> bool:
+    """Skickar en inlämning direkt, utan kö. Returnerar False (och loggar) vid fel."""
+    if not valid_webhook_url(url):
+        return False  # gör inget om URL inte är korrekt ännu
+
+    payload = build_payload(contact, answers, secret, pdf, title_override, plan)
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=TIMEOUT_S) as res:
+            res.read()
+        return True
+    except urllib.error.HTTPError as e:
+        txt = e.read().decode("utf-8", "replace")
+        log.warning("Webhook POST misslyckades: %s %s", e.code, txt)
+    except (urllib.error.URLError, OSError) as e:
+        log.warning("Kunde inte posta till Power Automate: %s", e)
+    return False
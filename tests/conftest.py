@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _data_dir(tmp_path, monkeypatch):
+    # standardsökvägarna (.data/…) hamnar i testets katalog, inte i arbetskopian
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from sjalvskattning import admission
+from sjalvskattning.admission import FairQueue, TokenBucket
+
+
+def test_keys_take_turns_and_each_key_is_fifo():
+    q = FairQueue("t_fair", maxsize=10)
+    for item in ("a1", "a2", "a3"):
+        assert q.offer("a", item)
+    q.offer("b", "b1")
+    q.offer("c", "c1")
+    assert [q.get(0) for _ in range(5)] == ["a1", "b1", "c1", "a2", "a3"]
+    assert q.get(0) is None
+
+
+def test_full_queue_rejects_and_counts():
+    q = FairQueue("t_full", maxsize=2)
+    before = admission.REJECTED.value(pool="t_full")
+    assert q.offer("a", 1) and q.offer("b", 2)
+    assert not q.offer("c", 3)
+    assert admission.REJECTED.value(pool="t_full") == before + 1
+    assert len(q) == 2
+
+
+def test_active_is_counted_until_done():
+    q = FairQueue("t_active", maxsize=2)
+    q.offer("a", 1)
+    q.get(0)
+    q.start()
+    assert q._active == 2
+    q.done()
+    q.done()
+    assert q._active == 0
+
+
+def test_close_wakes_a_waiting_get():
+    q = FairQueue("t_close", maxsize=2)
+    got = []
+    t = threading.Thread(target=lambda: got.append(q.get(5)))
+    t.start()
+    time.sleep(0.05)
+    q.close()
+    t.join(1)
+    assert got == [None] and not q.offer("a", 1)
+
+
+def test_token_bucket_allows_the_burst_then_paces():
+    bucket = TokenBucket("t_rate", rate=100, burst=5)
+    assert [bucket._reserve() for _ in range(5)] == [0.0] * 5
+    assert bucket._reserve() > 0
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_unlimited_bucket_never_waits_and_stop_interrupts():
+    assert TokenBucket("t_free", rate=0).acquire()
+    slow = TokenBucket("t_slow", rate=0.1, burst=1)
+    slow.acquire()
+    stop = threading.Event()
+    stop.set()
+    assert not slow.acquire(stop)
+
+
+def test_default_limit_respects_env_and_memory(monkeypatch):
+    monkeypatch.setenv("FL_REPORT_WORKERS", "3")
+    assert admission.default_limit() == 3
+    monkeypatch.delenv("FL_REPORT_WORKERS")
+    monkeypatch.setattr(admission, "available_memory_mb", lambda: 100.0)
+    assert admission.default_limit(memory_mb=64) == 1
+    monkeypatch.setattr(admission, "available_memory_mb", lambda: None)
+    assert admission.default_limit() >= 1
@@ -0,0 +1,90 @@
+import random
+import statistics
+from datetime import datetime
+
+import pytest
+
+from sjalvskattning.aggregates import AggregateStore, CohortStats, Welford, company_key
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import InstrumentError, default_plan
+
+PLAN = default_plan()
+ACME = Contact("P", "p@x.se", "Acme  AB")
+
+
+def answers(rng: random.Random) -> dict:
+    return {q.id: rng.randint(PLAN.scale_min, PLAN.scale_max) for q in PLAN.questions}
+
+
+def at(month: int) -> float:
+    return datetime(2026, month, 15).timestamp()
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = AggregateStore(str(tmp_path / "aggregates.sqlite3"))
+    yield s
+    s.close()
+
+
+def test_welford_matches_statistics():
+    values = [random.Random(1).uniform(1, 7) for _ in range(200)]
+    w = Welford()
+    for v in values:
+        w.add(v)
+    assert w.mean == pytest.approx(statistics.mean(values))
+    assert w.variance == pytest.approx(statistics.variance(values))
+
+
+@pytest.mark.parametrize("split", [0, 1, 50, 199, 200])
+def test_welford_merge_equals_one_pass(split):
+    values = [random.Random(2).uniform(1, 7) for _ in range(200)]
+    left, right, whole = Welford(), Welford(), Welford()
+    for v in values[:split]:
+        left.add(v)
+    for v in values[split:]:
+        right.add(v)
+    for v in values:
+        whole.add(v)
+    left.merge(right)
+    assert (left.n, left.mean, left.variance) == (whole.n, pytest.approx(whole.mean), pytest.approx(whole.variance))
+
+
+def test_cohort_stats_json_round_trip():
+    rng = random.Random(3)
+    stats = CohortStats.empty(PLAN)
+    for i in range(5):
+        stats.add(answers(rng), PLAN, at(1) + i)
+    again = CohortStats.from_json(stats.to_json())
+    assert again.summary(PLAN) == stats.summary(PLAN)
+    assert (again.first_at, again.last_at) == (at(1), at(1) + 4)
+
+
+def test_same_measurement_id_is_counted_once(store):
+    rng = random.Random(4)
+    assert store.record(ACME, answers(rng), PLAN, "FL-20260115-120000-0001", at(1))
+    assert not store.record(ACME, answers(rng), PLAN, "FL-20260115-120000-0001", at(1))
+    assert store.record(ACME, answers(rng), PLAN, None, at(1))
+    assert store.record(ACME, answers(rng), PLAN, None, at(1))
+    assert store.get(PLAN.key, "Acme AB").n == 3
+
+
+def test_invalid_answers_do_not_consume_the_measurement_id(store):
+    with pytest.raises(InstrumentError):
+        store.record(ACME, {1: PLAN.scale_max + 1}, PLAN, "FL-20260115-120000-0002", at(1))
+    assert store.record(ACME, answers(random.Random(5)), PLAN, "FL-20260115-120000-0002", at(1))
+
+
+def test_months_merge_like_a_single_pass(store):
+    rng = random.Random(6)
+    sets = [(answers(rng), month) for month in (1, 2, 3) for _ in range(20)]
+    for a, month in sets:
+        store.record(ACME, a, PLAN, None, at(month))
+    assert [c["bucket"] for c in store.cohorts("Acme AB")] == ["2026-01", "2026-02", "2026-03"]
+    merged = store.get(PLAN.key, company_key(ACME.company), since="2026-02")
+    in_range = [PLAN.mean_scores(a) for a, month in sets if month >= 2]
+    (total,) = [c for c in merged.summary(PLAN)["categories"] if c["key"] == "total"]
+    assert merged.n == 40
+    assert total["mean"] == pytest.approx(statistics.mean(s["total"] for s in in_range), abs=1e-3)
+    assert total["std"] == pytest.approx(statistics.stdev(s["total"] for s in in_range), abs=1e-3)
+    assert sum(merged.histogram[0]) == 40
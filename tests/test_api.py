@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from sjalvskattning import api
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.percentiles import PercentileStore
+
+PLAN = default_plan()
+ANSWERS = {q.id: 1 + q.id % 7 for q in PLAN.questions}
+
+
+@pytest.fixture(autouse=True)
+def _fresh(monkeypatch):
+    monkeypatch.setattr(api, "_percentiles", None)
+    monkeypatch.setattr(api, "_percentiles_opened", False)
+
+
+def call(path: str, body: dict, headers=()):
+    scope = {"type": "http", "path": path, "method": "POST", "headers": list(headers)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api.app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def test_score_without_distribution_creates_no_file(monkeypatch, tmp_path):
+    path = tmp_path / "percentiles.sqlite3"
+    monkeypatch.setattr(api, "PERCENTILES_DB", str(path))
+    status, data = call("/score", {"answers": {str(k): v for k, v in ANSWERS.items()}})
+    assert status == 200 and data["total"]["percentile"] is None
+    assert not os.path.exists(path)
+
+
+def test_score_reads_distribution_read_only(monkeypatch, tmp_path):
+    path = str(tmp_path / "percentiles.sqlite3")
+    writer = PercentileStore(path, min_n=1)
+    for i in range(5):
+        writer.record(Contact("P", f"p{i}@x.se", "Acme"), ANSWERS, PLAN, f"FL-{i}")
+    monkeypatch.setattr(api, "PERCENTILES_DB", path)
+    store = api._percentile_store()
+    store.min_n = 1
+    status, data = call("/score", {"answers": {str(k): v for k, v in ANSWERS.items()}})
+    assert status == 200 and data["total"]["percentile"] is not None
+    with pytest.raises(Exception):
+        store.record(Contact("P", "q@x.se", "Acme"), ANSWERS, PLAN, "FL-x")
+
+
+def test_api_key_is_required(monkeypatch):
+    monkeypatch.setattr(api, "API_KEY", "hemlig-å")
+    api.use_percentiles(None)
+    body = {"answers": {"1": 5}}
+    assert call("/score", body)[0] == 401
+    assert call("/score", body, [(b"authorization", b"Bearer fel")])[0] == 401
+    assert call("/score", body, [(b"authorization", "Bearer hemlig-å".encode())])[0] == 200
+
+
+@pytest.mark.parametrize("value", [True, 4.9, 5.0, "5", [5]])
+def test_non_integer_answer_is_422(monkeypatch, value):
+    monkeypatch.setattr(api, "PERCENTILES_DB", "")
+    body = {"answers": {**{str(k): v for k, v in ANSWERS.items()}, "1": value}}
+    assert call("/score", body)[0] == 422
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from sjalvskattning.batch import run_batch
+from sjalvskattning.core import answers_from_row, measurement_id_from_row
+from sjalvskattning.instrument import default_plan, plan_for_row
+
+PLAN = default_plan()
+ANSWERS = {str(q.id): 1 + q.id % 7 for q in PLAN.questions}
+A, B = "FL-20260101-120000-000A", "FL-20260101-120000-000B"
+
+
+def row(i: int, title: str) -> dict:
+    return {"name": "P", "email": f"p{i}@x.se", "company": "Acme", "answersJson": json.dumps(ANSWERS), "title": title}
+
+
+def test_row_helpers():
+    assert answers_from_row({"answersJson": {"1": 5, "2": None}}) == {1: 5}
+    assert answers_from_row({"answersJson": '{"3": 4}'}) == {3: 4}
+    assert measurement_id_from_row({"title": A}) == A
+    assert measurement_id_from_row({"title": "p@x.se"}) is None
+    assert measurement_id_from_row({"measurementId": B, "title": A}) == B
+    assert plan_for_row({}) is PLAN
+
+
+def test_duplicate_measurement_ids_are_rejected(tmp_path):
+    source = tmp_path / "in.jsonl"
+    rows = [row(0, A), row(1, B), row(2, A), row(3, "p3@x.se")]
+    source.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    stats = run_batch(source, tmp_path / "out", workers=1, chunk_size=1)
+    assert (stats["reports"], stats["failed"]) == (3, 1)
+    manifest = [json.loads(line) for line in (tmp_path / "out" / "manifest.jsonl").read_text().splitlines()]
+    (rejected,) = [m for m in manifest if "error" in m]
+    assert rejected["id"] == A and rejected["email"] == "p2@x.se"
+    assert next(m for m in manifest if m["id"] == A and "error" not in m)["email"] == "p0@x.se"
+
+
+@pytest.mark.parametrize("bad", ["FL-1", "FL-/../../x", "FL-20260101-120000-000a", "../../x"])
+def test_malformed_measurement_id_is_rejected(bad):
+    with pytest.raises(ValueError):
+        measurement_id_from_row({"measurementId": bad} if bad.startswith("..") else {"title": bad})
+
+
+def test_traversal_id_writes_nothing_outside(tmp_path):
+    source = tmp_path / "in.jsonl"
+    rows = [{**row(0, "p0@x.se"), "measurementId": "../../escaped"}, row(1, "FL-/../../x"), row(2, A)]
+    source.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    stats = run_batch(source, tmp_path / "out", workers=1, chunk_size=1)
+    assert (stats["reports"], stats["failed"]) == (1, 2)
+    assert sorted(p.name for p in tmp_path.rglob("*.pdf")) == [f"{A}.pdf"]
+    manifest = [json.loads(line) for line in (tmp_path / "out" / "manifest.jsonl").read_text().splitlines()]
+    assert sorted(m["email"] for m in manifest if "error" in m) == ["p0@x.se", "p1@x.se"]
@@ -0,0 +1,22 @@
+import hashlib
+
+from sjalvskattning.blobstore import BlobStore
+
+
+def test_put_is_content_addressed_and_idempotent(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"), base_url="https://r.example.se/b/")
+    data = b"%PDF-1.4 test"
+    sha = hashlib.sha256(data).hexdigest()
+    ref = store.put(data)
+    assert (ref.sha256, ref.size, ref.url) == (sha, len(data), f"https://r.example.se/b/{sha}.pdf")
+    assert store.path(sha) == tmp_path / "blobs" / sha[:2] / f"{sha}.pdf"
+    mtime = store.path(sha).stat().st_mtime_ns
+    assert store.put(data) == ref
+    assert store.path(sha).stat().st_mtime_ns == mtime  # skrivs inte en gång till
+    assert store.get(sha) == data and store.exists(sha)
+    assert not list((tmp_path / "blobs").rglob(".tmp-*"))
+
+
+def test_ref_without_base_url_has_no_url(tmp_path):
+    ref = BlobStore(str(tmp_path)).put(b"x")
+    assert ref.url is None and ref.as_dict() == {"sha256": ref.sha256, "size": 1}
@@ -0,0 +1,57 @@
+import multiprocessing
+from datetime import datetime, timedelta
+
+from sjalvskattning import ids
+from sjalvskattning.ids import ID_PATTERN, MeasurementIds
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def test_ids_are_well_formed_unique_and_sorted(tmp_path):
+    gen = MeasurementIds(str(tmp_path / "seq"))
+    issued = [gen.next(NOW) for _ in range(100)]
+    assert all(ID_PATTERN.fullmatch(i) for i in issued)
+    assert issued == sorted(set(issued))
+    assert issued[0] == "FL-20260301-120000-0000" and issued[36] == "FL-20260301-120000-0010"
+
+
+def test_clock_going_backwards_continues_on_the_last_second(tmp_path):
+    gen = MeasurementIds(str(tmp_path / "seq"))
+    first = gen.next(NOW)
+    second = gen.next(NOW - timedelta(hours=1))
+    assert second > first and second.startswith("FL-20260301-120000-")
+
+
+def test_counter_overflow_borrows_the_next_second_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(ids, "_PER_SECOND", 3)
+    gen = MeasurementIds(str(tmp_path / "seq"))
+    issued = [gen.next(NOW) for _ in range(7)]
+    assert issued == sorted(issued) and len(set(issued)) == 7
+    assert [i[3:18] for i in issued] == ["20260301-120000"] * 3 + ["20260301-120001"] * 3 + ["20260301-120002"]
+    # när klockan hinner ikapp fortsätter den lånade sekunden i stället för att börja om
+    assert gen.next(NOW + timedelta(seconds=1)) > issued[-1]
+
+
+def test_state_is_shared_between_generators(tmp_path):
+    path = str(tmp_path / "seq")
+    a, b = MeasurementIds(path), MeasurementIds(path)
+    issued = [g.next(NOW) for _ in range(10) for g in (a, b)]
+    assert issued == sorted(set(issued))
+
+
+def _issue(path, n, queue):
+    gen = MeasurementIds(path)
+    queue.put([gen.next(NOW) for _ in range(n)])
+
+
+def test_processes_never_collide(tmp_path):
+    path = str(tmp_path / "seq")
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_issue, args=(path, 200, queue)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    issued = [i for _ in procs for i in queue.get(timeout=30)]
+    for p in procs:
+        p.join(30)
+    assert len(set(issued)) == 800
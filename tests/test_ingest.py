@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import gzip
+import json
+
+import pytest
+
+from sjalvskattning import ingest
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.webhook import build_compact_payload, build_payload
+
+PLAN = default_plan()
+ANSWERS = {q.id: 1 + q.id % 7 for q in PLAN.questions}
+
+
+def v1(i: int = 0, **extra) -> dict:
+    payload = build_payload(Contact(f"P{i}", f"p{i}@x.se", "Acme"), ANSWERS, title_override=f"FL-T-{i}", plan=PLAN)
+    payload.update(extra)
+    return payload
+
+
+def v2(i: int = 0, pdf=None) -> dict:
+    payload = build_compact_payload(Contact(f"P{i}", f"p{i}@x.se", "Acme"), ANSWERS, title_override=f"FL-V-{i}", plan=PLAN)
+    if pdf is not None:
+        payload["pdf"] = pdf
+    return payload
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    s = ingest.IngestStore(str(tmp_path / "ingest.sqlite3"), str(tmp_path / "pdfs"))
+    monkeypatch.setattr(ingest, "_store", s)
+    yield s
+    s.close()
+
+
+async def _call(path: str, body: bytes, headers=()):
+    scope = {"type": "http", "path": path, "method": "POST", "headers": list(headers)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await ingest.app(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def call(path: str, body, headers=()):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    return asyncio.run(_call(path, body, headers))
+
+
+def test_v1_and_v2_are_stored_once(store):
+    pdf = b"%PDF-1.4 test"
+    body = v1(1, pdfBase64=base64.b64encode(pdf).decode(), fileName="r.pdf", hasPdf=True)
+    assert call("/invoke", body) == (202, {"ok": True, "id": "FL-T-1", "duplicate": False})
+    assert call("/invoke", body)[1]["duplicate"] is True
+    assert call("/invoke", v2(2))[0] == 202
+    assert store.stats()["submissions"] == 2
+    assert store.stats()["withPdf"] == 1
+    (row,) = [r for r in store.export() if r["title"] == "FL-T-1"]
+    assert row["answers"] == {str(k): v for k, v in ANSWERS.items()}
+    with open(row["pdf"]["path"], "rb") as f:
+        assert f.read() == pdf
+
+
+@pytest.mark.parametrize("pdf", [
+    {"sha256": {"x": 1}},
+    {"sha256": "a" * 63},
+    {"sha256": "g" * 64},
+    {"sha256": "a" * 64, "size": -1},
+    {"sha256": "a" * 64, "size": "12"},
+    {"sha256": "a" * 64, "size": 2**70},
+    {"sha256": "a" * 64, "fileName": ["x"]},
+])
+def test_bad_pdf_ref_is_422(store, pdf):
+    assert call("/invoke", v2(pdf=pdf))[0] == 422
+    assert store.stats()["submissions"] == 0
+
+
+def test_bad_file_name_with_inline_pdf_is_422(store):
+    assert call("/invoke", v1(pdfBase64="QUJD", fileName={"a": 1}))[0] == 422
+
+
+@pytest.mark.parametrize("answers_json", ["[1,2]", "3", '"x"', '{"1": [1]}', '{"x": 1}', "{", '{"1": true}', '{"1": 4.9}'])
+def test_bad_answers_json_is_422(store, answers_json):
+    assert call("/invoke", v1(answersJson=answers_json))[0] == 422
+
+
+def test_bad_row_does_not_fail_the_group(store):
+    # en rad som klarar tolkningen men inte bindningen (ensamt surrogat) får bara sitt eget fel
+    bad = ingest.parse_submission(v1(9))
+    bad.name = "\ud800"
+    good = [ingest.parse_submission(v1(i)) for i in range(3)]
+    outcomes = store.write([good[0], bad, *good[1:]])
+    assert outcomes[0] is True and outcomes[2] is True and outcomes[3] is True
+    assert isinstance(outcomes[1], ingest.IngestError) and outcomes[1].status == 422
+    assert store.stats()["submissions"] == 3
+
+
+def test_batch_reports_errors_per_line(store):
+    lines = [json.dumps(v1(1)), "{trasig", json.dumps(v1(2, answersJson="[1]")), "[]", json.dumps(v1(3))]
+    status, result = call("/batch", "\n".join(lines).encode())
+    assert status == 200
+    assert result["accepted"] == 2
+    assert [e["line"] for e in result["errors"]] == [2, 3, 4]
+
+
+def test_gzip_bomb_is_413(store, monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_BODY", 64 * 1024)
+    bomb = gzip.compress(b" " * (10 * 1024 * 1024))
+    assert len(bomb) < ingest.MAX_BODY
+    assert call("/invoke", bomb, [(b"content-encoding", b"gzip")])[0] == 413
+
+
+def test_gzip_body_is_accepted(store):
+    body = gzip.compress(json.dumps(v1(5)).encode())
+    assert call("/invoke", body, [(b"content-encoding", b"gzip")])[0] == 202
+    assert call("/invoke", body[:-4], [(b"content-encoding", b"gzip")])[0] == 400
+
+
+def test_non_ascii_secret_is_401_not_500(store, monkeypatch):
+    monkeypatch.setattr(ingest, "SECRET", "hemligt")
+    with pytest.raises(ingest.IngestError) as e:
+        ingest.parse_submission(v1(secret="hemlighét"), secret="hemligt")
+    assert e.value.status == 401
+    assert ingest.parse_submission(v1(secret="hemligt"), secret="hemligt").title == "FL-T-0"
+
+
+def test_failing_callback_does_not_stop_the_writer(store):
+    def boom(result, error):
+        raise RuntimeError("händelseslingan är stängd")
+
+    assert store.submit([ingest.parse_submission(v1(1))], boom)
+    assert store.write([ingest.parse_submission(v1(2))]) == [True]
+
+
+class _Crash(BaseException):
+    pass
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_writer_fails_instead_of_hanging(store, monkeypatch):
+    def crash(items):
+        raise _Crash()
+
+    monkeypatch.setattr(store, "_commit", crash)
+    with pytest.raises(ingest.IngestError) as e:
+        store.write([ingest.parse_submission(v1(1))])
+    assert e.value.status == 503
+    store._thread.join(5)
+    with pytest.raises(ingest.IngestError):
+        store.write([ingest.parse_submission(v1(2))])
+    assert store.pending == 0
+
+
+@pytest.mark.parametrize("value", [True, 4.9, "5"])
+def test_non_integer_v2_answer_is_422(store, value):
+    body = v2()
+    body["answers"][0] = value
+    assert call("/invoke", body)[0] == 422
@@ -0,0 +1,68 @@
+import copy
+import json
+
+import pytest
+
+from sjalvskattning.instrument import (
+    DEFAULT_INSTRUMENT, SPEC_DIR, InstrumentError, compile_instrument, default_plan, invalidate, plan_for_key,
+)
+
+SPEC = json.loads((SPEC_DIR / f"{default_plan().key}.json").read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("key", ["../../etc/passwd", "x.vabc", f"{DEFAULT_INSTRUMENT}.v1x", "nope", f"{DEFAULT_INSTRUMENT}.v99"])
+def test_plan_for_key_rejects_bad_keys(key):
+    with pytest.raises(InstrumentError):
+        plan_for_key(key)
+
+
+def test_plan_for_key_accepts_id_and_version():
+    plan = default_plan()
+    assert plan_for_key(plan.key) is plan
+    assert plan_for_key(plan.id) is plan
+    assert plan_for_key(None) is plan
+
+
+def test_invalidate_recompiles_only_that_key():
+    plan = default_plan()
+    invalidate("annat-instrument.v1")
+    assert default_plan() is plan
+    invalidate(plan.key)
+    fresh = default_plan()
+    assert fresh is not plan and fresh.key == plan.key
+
+
+def broken(edit) -> dict:
+    spec = copy.deepcopy(SPEC)
+    edit(spec)
+    return spec
+
+
+@pytest.mark.parametrize("edit", [
+    lambda s: s["categories"][0].pop("key"),
+    lambda s: s["categories"][0].pop("title"),
+    lambda s: s["categories"][0].update(questions=[1, 2, 3]),
+    lambda s: s["categories"][0].update(questions=[1]),
+    lambda s: s["categories"][0].update(questions=["a", "b"]),
+    lambda s: s["categories"].append("inte ett objekt"),
+    lambda s: s["bands"][0].pop("label"),
+    lambda s: s["bands"][0].pop("color"),
+    lambda s: s["bands"][0].update(min="hög"),
+    lambda s: s.update(nextSteps=[{"paragraphs": []}]),
+    lambda s: s.update(nextSteps=[{"heading": "x", "bullets": [{"strong": "y"}]}]),
+])
+def test_malformed_nested_spec_is_instrument_error(edit):
+    with pytest.raises(InstrumentError):
+        compile_instrument(broken(edit))
+
+
+@pytest.mark.parametrize("lo, hi", [(0, 6), (-1, 5), (1, 16)])
+def test_scale_outside_storage_range_is_rejected(lo, hi):
+    spec = broken(lambda s: s.update(scale={"min": lo, "max": hi, "labels": [str(i) for i in range(lo, hi + 1)]}))
+    with pytest.raises(InstrumentError, match="1..15"):
+        compile_instrument(spec)
+
+
+def test_widest_allowed_scale_compiles():
+    spec = broken(lambda s: s.update(scale={"min": 1, "max": 15, "labels": [str(i) for i in range(1, 16)]}))
+    assert compile_instrument(spec).scale_max == 15
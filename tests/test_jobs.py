@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from sjalvskattning import jobs
+from sjalvskattning.columnstore import ColumnStore
+from sjalvskattning.core import Contact
+from sjalvskattning.idempotency import IdempotencyIndex
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.outbox import Outbox
+
+PLAN = default_plan()
+ANSWERS = {q.id: 1 + q.id % 7 for q in PLAN.questions}
+CONTACT = Contact("Pia", "pia@x.se", "Acme")
+URL = "http://127.0.0.1:9/hook?sig=test"
+
+
+@pytest.fixture
+def stores(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    index = IdempotencyIndex(str(tmp_path / "idem.sqlite3"))
+    columns = ColumnStore(str(tmp_path / "columns"))
+    yield outbox, index, columns
+    outbox.close()
+
+
+def pipeline(stores) -> jobs.ReportPipeline:
+    outbox, index, columns = stores
+    return jobs.ReportPipeline(outbox, submissions=columns, idempotency=index, workers=1, url=URL, transport="pdf")
+
+
+def wait(p: jobs.ReportPipeline, job_id: str) -> jobs.ReportJob:
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        job = p.get(job_id)
+        if job.state in (jobs.DELIVERING, jobs.DELIVERED, jobs.FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"jobbet blev aldrig klart: {job.state}")
+
+
+def stored_rows(stores) -> int:
+    return len(stores[2].columns(PLAN.key))
+
+
+def test_duplicate_submit_returns_same_job(stores):
+    p = pipeline(stores)
+    try:
+        first = p.submit(CONTACT, ANSWERS, PLAN)
+        assert wait(p, first).state == jobs.DELIVERING
+        assert p.submit(CONTACT, ANSWERS, PLAN) == first
+    finally:
+        p.shutdown()
+    assert stores[0].depth()["pending"] == 1
+    assert stored_rows(stores) == 1
+
+
+def test_restart_before_enqueue_delivers(stores):
+    # inskicket hann registreras i indexet men processen dog innan något lagrades
+    outbox, index, _ = stores
+    index.claim(CONTACT.email, ANSWERS, PLAN, "FL-20260101-000000-0001")
+    p = pipeline(stores)
+    try:
+        job_id = p.submit(CONTACT, ANSWERS, PLAN)
+        assert job_id == "FL-20260101-000000-0001"
+        assert wait(p, job_id).state == jobs.DELIVERING
+    finally:
+        p.shutdown()
+    assert outbox.depth()["pending"] == 1
+    assert stored_rows(stores) == 1
+    assert index.progress(job_id) == (True, True)
+
+
+def test_restart_after_enqueue_only_renders(stores):
+    p = pipeline(stores)
+    try:
+        job_id = p.submit(CONTACT, ANSWERS, PLAN)
+        wait(p, job_id)
+    finally:
+        p.shutdown()
+    p = pipeline(stores)
+    try:
+        assert p.submit(CONTACT, ANSWERS, PLAN) == job_id
+        job = wait(p, job_id)
+        assert job.state == jobs.DELIVERED and job.pdf
+    finally:
+        p.shutdown()
+    assert stores[0].depth()["pending"] == 1
+    assert stored_rows(stores) == 1
+
+
+def test_retry_after_failed_enqueue_does_not_store_twice(stores, monkeypatch):
+    p = pipeline(stores)
+    enqueue = p._enqueue
+    calls = []
+
+    def flaky(job):
+        calls.append(job.id)
+        if len(calls) == 1:
+            raise OSError("disken full")
+        return enqueue(job)
+
+    monkeypatch.setattr(p, "_enqueue", flaky)
+    try:
+        job_id = p.submit(CONTACT, ANSWERS, PLAN)
+        assert wait(p, job_id).state == jobs.FAILED
+        assert p.submit(CONTACT, ANSWERS, PLAN) == job_id
+        assert wait(p, job_id).state == jobs.DELIVERING
+    finally:
+        p.shutdown()
+    assert len(calls) == 2
+    assert stores[0].depth()["pending"] == 1
+    assert stored_rows(stores) == 1
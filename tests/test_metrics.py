@@ -0,0 +1,83 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from sjalvskattning import metrics
+from sjalvskattning.metrics import Counter, Gauge, Histogram, Registry, span
+
+
+def test_counter_and_gauge_render():
+    c = Counter("t_total", "Hjälp.", ("kind",))
+    c.inc(kind="a")
+    c.inc(2.5, kind='b"\n')
+    assert c.value(kind="a") == 1
+    assert c.render().splitlines() == [
+        "# HELP t_total Hjälp.", "# TYPE t_total counter", 't_total{kind="a"} 1', 't_total{kind="b\\"\\n"} 2.5',
+    ]
+    g = Gauge("t_depth", "Djup.")
+    g.set(3)
+    g.dec()
+    g.set_function(lambda: 1 / 0, kind="trasig")  # en trasig callback hoppas över
+    assert list(g.samples()) == ["t_depth 2"]
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "Tid.", buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    assert h.count() == 4
+    assert list(h.samples()) == [
+        't_seconds_bucket{le="0.1"} 2', 't_seconds_bucket{le="1"} 3', 't_seconds_bucket{le="+Inf"} 4',
+        "t_seconds_sum 3.65", "t_seconds_count 4",
+    ]
+
+
+def test_registry_returns_the_first_metric_per_name():
+    registry = Registry()
+    first = registry.register(Counter("t_once", "A."))
+    assert registry.register(Counter("t_once", "B.")) is first
+    assert registry.render().count("# TYPE t_once") == 1
+
+
+def test_span_records_timing_errors_and_trace():
+    key = "FL-20260101-000000-TEST"
+    before = metrics.STAGE_SECONDS.count(stage="t_outer")
+    errors = metrics.STAGE_ERRORS.value(stage="t_inner", error="KeyError")
+    with span("t_outer", key):
+        assert metrics.active_spans()[threading.get_ident()] == ("t_outer", key)
+        with pytest.raises(KeyError):
+            with span("t_inner"):
+                assert metrics.active_spans()[threading.get_ident()] == ("t_inner", key)
+                raise KeyError("x")
+    assert threading.get_ident() not in metrics.active_spans()
+    assert metrics.STAGE_SECONDS.count(stage="t_outer") == before + 1
+    assert metrics.STAGE_ERRORS.value(stage="t_inner", error="KeyError") == errors + 1
+    assert metrics.STAGE_INFLIGHT.value(stage="t_outer") == 0
+    assert [s["stage"] for s in metrics.TRACES.get(key)] == ["t_outer"]
+
+
+def test_traces_drop_the_oldest_key():
+    traces = metrics._Traces(max_keys=2)
+    for key in ("a", "b", "c"):
+        traces.record(key, {"stage": "s"})
+    assert traces.get("a") == [] and traces.get("c") == [{"stage": "s"}]
+
+
+def test_endpoint_serves_metrics_and_traces():
+    with span("t_endpoint", "FL-20260101-000000-HTTP"):
+        pass
+    server = metrics.serve("127.0.0.1", 0)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        body = urllib.request.urlopen(f"{base}/metrics", timeout=5).read().decode()
+        assert 'fl_stage_seconds_count{stage="t_endpoint"}' in body
+        trace = json.loads(urllib.request.urlopen(f"{base}/trace/FL-20260101-000000-HTTP", timeout=5).read())
+        assert trace["spans"][0]["stage"] == "t_endpoint"
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"{base}/trace/saknas", timeout=5)
+        assert e.value.code == 404
+    finally:
+        server.shutdown()
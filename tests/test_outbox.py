@@ -0,0 +1,100 @@
+import time
+
+from sjalvskattning.outbox import DeliveryWorker, Outbox, retry_after_seconds
+
+
+def test_live_lease_is_not_reclaimed_by_another_process(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    first = Outbox(path)
+    first.enqueue("http://x/hook", b"{}", key="FL-1")
+    msg, _ = first.claim()
+    assert msg is not None
+    other = Outbox(path)  # t.ex. en omstartad eller parallell process
+    assert other.claim()[0] is None
+    assert other.depth() == {"pending": 0, "inflight": 1, "dead": 0}
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    dying = Outbox(path, lease_s=0.05)
+    dying.enqueue("http://x/hook", b"{}", key="FL-1")
+    assert dying.claim()[0] is not None
+    other = Outbox(path)
+    msg, wait_s = other.claim()
+    assert msg is None and wait_s is not None and wait_s <= 0.05
+    time.sleep(0.06)
+    msg, _ = other.claim()
+    assert msg is not None and msg.key == "FL-1" and msg.attempts == 1
+    assert other.delivered(msg)
+    assert other.depth() == {"pending": 0, "inflight": 0, "dead": 0}
+
+
+def test_inflight_without_lease_is_reclaimed(tmp_path):
+    # köer från före lånekolumnerna har inflight-rader utan claimed_until
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(path)
+    outbox.enqueue("http://x/hook", b"{}")
+    outbox._db.execute("UPDATE outbox SET state = 'inflight'")
+    assert Outbox(path).claim()[0] is not None
+
+
+def test_release_and_retry_clear_the_lease(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("http://x/hook", b"{}")
+    msg, _ = outbox.claim()
+    outbox.release(msg)
+    msg, _ = outbox.claim()
+    assert msg.attempts == 0
+    outbox.retry(msg, 0, "HTTP 503")
+    msg, _ = outbox.claim()
+    assert msg.attempts == 1
+
+
+def test_retry_after_is_capped_at_max_delay(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("http://x/hook", b"{}")
+    msg, _ = outbox.claim()
+    worker = DeliveryWorker(outbox, max_delay=5.0)
+    worker._fail(msg, "HTTP 429", retry_after_seconds("86400"))
+    (next_at,) = outbox._db.execute("SELECT next_attempt_at FROM outbox").fetchone()
+    assert next_at <= time.time() + 5.0
+    worker.pool.close()
+
+
+def test_message_that_keeps_expiring_is_dead_lettered(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), lease_s=0.01)
+    outbox.enqueue("http://x/hook", b"{}")
+    for attempts in range(3):
+        msg, _ = outbox.claim(max_attempts=3)
+        assert msg.attempts == attempts
+        time.sleep(0.02)  # arbetaren dör mitt i leveransen
+    assert outbox.claim(max_attempts=3)[0] is None
+    assert outbox.depth() == {"pending": 0, "inflight": 0, "dead": 1}
+    assert outbox._db.execute("SELECT attempts FROM dead_letter").fetchone() == (3,)
+
+
+def test_expired_holder_cannot_touch_the_new_lease(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    slow = Outbox(path, lease_s=0.01)
+    slow.enqueue("http://x/hook", b"{}")
+    stale, _ = slow.claim()
+    time.sleep(0.02)
+    other = Outbox(path)
+    current, _ = other.claim()
+    assert current.id == stale.id and current.claimed_by != stale.claimed_by
+    assert not slow.retry(stale, 0, "HTTP 503")
+    assert not slow.release(stale)
+    assert not slow.dead(stale, "HTTP 400")
+    assert not slow.delivered(stale)
+    assert other.depth() == {"pending": 0, "inflight": 1, "dead": 0}
+    assert other.delivered(current)
+
+
+def test_same_process_leases_are_distinct(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), lease_s=0.01)
+    outbox.enqueue("http://x/hook", b"{}")
+    first, _ = outbox.claim()
+    time.sleep(0.02)
+    second, _ = outbox.claim()
+    assert not outbox.retry(first, 0, "timeout")
+    assert outbox.status(second.id) == "inflight"
@@ -0,0 +1,108 @@
+import random
+import sqlite3
+
+import pytest
+
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.percentiles import ALL, TOTAL, Distribution, Fenwick, PercentileStore, company_scope
+
+PLAN = default_plan()
+
+
+def exact_rank(values, value) -> float:
+    below = sum(v < value for v in values)
+    same = sum(v == value for v in values)
+    return 100.0 * (below + same / 2) / len(values)
+
+
+def answers(rng: random.Random) -> dict:
+    return {q.id: rng.randint(PLAN.scale_min, PLAN.scale_max) for q in PLAN.questions}
+
+
+def test_fenwick_prefix_matches_running_sum():
+    rng = random.Random(1)
+    counts = [0] * 40
+    tree = Fenwick(len(counts))
+    for _ in range(500):
+        i, d = rng.randrange(len(counts)), rng.randint(1, 5)
+        counts[i] += d
+        tree.add(i, d)
+    assert [tree.prefix(i) for i in range(len(counts) + 1)] == [sum(counts[:i]) for i in range(len(counts) + 1)]
+
+
+def test_rank_matches_exact_midrank():
+    rng = random.Random(2)
+    values = [rng.randint(7, 49) for _ in range(1000)]
+    dist = Distribution(7, 49)
+    for v in values:
+        dist.add(v)
+    for value in range(7, 50):
+        assert dist.rank(value) == pytest.approx(exact_rank(values, value))
+    assert Distribution(7, 49).rank(10) is None
+
+
+def test_merge_equals_adding_everything():
+    rng = random.Random(3)
+    values = [rng.randint(0, 20) for _ in range(300)]
+    left, right, whole = Distribution(0, 20), Distribution(0, 20), Distribution(0, 20)
+    for i, v in enumerate(values):
+        (left if i % 3 else right).add(v)
+        whole.add(v)
+    left.merge(right)
+    assert left.counts == whole.counts and left.n == whole.n
+    assert [left.rank(v) for v in range(21)] == [whole.rank(v) for v in range(21)]
+
+
+def test_quantile():
+    dist = Distribution(0, 10)
+    for v in (1, 2, 2, 3, 9):
+        dist.add(v)
+    assert (dist.quantile(0.25), dist.quantile(0.5), dist.quantile(1.0)) == (2, 2, 9)
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = PercentileStore(str(tmp_path / "percentiles.sqlite3"), refresh_s=3600, min_n=5)
+    yield s
+    s.close()
+
+
+def test_no_rank_below_min_n(store):
+    rng = random.Random(4)
+    sets = [answers(rng) for _ in range(5)]
+    sums = PLAN.sums(sets[0])
+    assert store.ranks(PLAN, sums) is None
+    for i, a in enumerate(sets[:4]):
+        store.record(Contact("P", f"p{i}@x.se", "Acme"), a, PLAN)
+    assert store.ranks(PLAN, sums) is None
+    store.record(Contact("P", "p4@x.se", "Acme"), sets[4], PLAN)
+    ranks = store.ranks(PLAN, sums)  # cachen uppdateras på plats, utan omläsning
+    totals = [sum(PLAN.sums(a)) for a in sets]
+    assert ranks[TOTAL] == round(exact_rank(totals, sum(sums)))
+    assert set(ranks) == {cat.key for cat in PLAN.categories} | {TOTAL}
+
+
+def test_measurement_id_is_counted_once_and_scopes_are_separate(store):
+    rng = random.Random(5)
+    assert store.record(Contact("P", "p@x.se", "Acme"), answers(rng), PLAN, "FL-20260101-000000-0001")
+    assert not store.record(Contact("P", "p@x.se", "Acme"), answers(rng), PLAN, "FL-20260101-000000-0001")
+    store.record(Contact("P", "q@x.se", "Bolag"), answers(rng), PLAN)
+    assert store.distributions(PLAN, ALL)[TOTAL].n == 2
+    assert store.distributions(PLAN, company_scope(" Acme "))[TOTAL].n == 1
+
+
+def test_other_processes_show_up_after_refresh(tmp_path):
+    path = str(tmp_path / "percentiles.sqlite3")
+    reader = PercentileStore(path, refresh_s=0)
+    writer = PercentileStore(path)
+    assert reader.distributions(PLAN)[TOTAL].n == 0
+    writer.record(Contact("P", "p@x.se", "Acme"), answers(random.Random(6)), PLAN)
+    assert reader.distributions(PLAN)[TOTAL].n == 1
+
+
+def test_read_only_never_creates_the_file(tmp_path):
+    path = tmp_path / "saknas.sqlite3"
+    with pytest.raises(sqlite3.OperationalError):
+        PercentileStore(str(path), read_only=True)
+    assert not path.exists()
@@ -0,0 +1,31 @@
+import sys
+import time
+
+import pytest
+
+from sjalvskattning import profiler
+
+
+def test_start_rejects_longer_than_cap(monkeypatch):
+    monkeypatch.setattr(profiler, "MAX_SECONDS", 10.0)
+    with pytest.raises(profiler.ProfilerError):
+        profiler.start(11)
+
+
+def test_switch_interval_is_left_alone_by_default():
+    before = sys.getswitchinterval()
+    sampler = profiler.Sampler(5, 0.001, precise=False).start()
+    time.sleep(0.02)
+    assert sys.getswitchinterval() == before
+    sampler.stop()
+    assert sampler.wait(5).ticks > 0
+
+
+def test_precise_restores_switch_interval():
+    before = sys.getswitchinterval()
+    sampler = profiler.Sampler(5, 0.001, precise=True).start()
+    time.sleep(0.02)
+    assert sys.getswitchinterval() <= profiler.SWITCH_INTERVAL
+    sampler.stop()
+    sampler.wait(5)
+    assert sys.getswitchinterval() == before
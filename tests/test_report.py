@@ -0,0 +1,19 @@
+from datetime import date
+
+from reportlab import rl_config
+
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.report import build_pdf
+
+PLAN = default_plan()
+ANSWERS = {q.id: 1 + q.id % 7 for q in PLAN.questions}
+
+
+def test_pdf_is_stable_and_flate_only_without_touching_rl_config():
+    before = rl_config.useA85
+    first = build_pdf(Contact("Anna", "a@x.se", "Acme"), ANSWERS, "FL-1", generated=date(2026, 1, 1))
+    again = build_pdf(Contact("Anna", "a@x.se", "Acme"), ANSWERS, "FL-1", generated=date(2026, 1, 1))
+    assert first == again
+    assert first.startswith(b"%PDF") and b"FlateDecode" in first and b"ASCII85Decode" not in first
+    assert rl_config.useA85 == before
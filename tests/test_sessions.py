@@ -0,0 +1,55 @@
+import threading
+
+from sjalvskattning.sessions import SessionStore
+
+
+def test_buffered_changes_survive_reopen(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SessionStore(path)
+    token = store.new("x.v1")
+    store.set_answer(token, 1, 5)
+    store.save_state(token, "x.v1", "questions", 2)
+    store.close()
+    saved = SessionStore(path).load(token)
+    assert (saved.instrument, saved.step, saved.page, saved.answers) == ("x.v1", "questions", 2, {1: 5})
+
+
+def test_forget_during_flush_does_not_resurrect(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    token = store.new("x.v1")
+    store.set_answer(token, 1, 5)
+    # flush() pausas precis innan den tar databaslåset; under tiden körs forget() klart
+    started, release = threading.Event(), threading.Event()
+    lock = store._db_lock
+
+    class PausingLock:
+        def __enter__(self):
+            if threading.current_thread() is flusher and not started.is_set():
+                started.set()
+                release.wait(5)
+            return lock.__enter__()
+
+        def __exit__(self, *exc):
+            return lock.__exit__(*exc)
+
+    store._db_lock = PausingLock()
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    assert started.wait(5)
+    store.forget(token)
+    release.set()
+    flusher.join(5)
+    store.flush()
+    assert store.load(token) is None
+    assert store.stats()["answers"] == 0
+
+
+def test_late_answer_after_forget_is_dropped(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    token = store.new("x.v1")
+    store.flush()
+    store.forget(token)
+    store.set_answer(token, 3, 4)  # sent klick från den gamla sidan
+    store.flush()
+    assert store.load(token) is None
+    assert store.stats() == {"sessions": 0, "answers": 0, "pending": 0}
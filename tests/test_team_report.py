@@ -0,0 +1,104 @@
+import json
+import logging
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+
+from sjalvskattning import team_report
+from sjalvskattning.columnstore import ColumnStore
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.team_report import TeamStats, scan_columns, scan_rows, team_file_name
+
+PLAN = default_plan()
+
+
+def answers(i: int) -> dict:
+    return {q.id: PLAN.scale_min + (q.id + i) % len(PLAN.scale_values) for q in PLAN.questions}
+
+
+def row(i: int, company: str = "Acme", at: str = "2026-03-01T12:00:00Z", **extra) -> dict:
+    r = {"name": "P", "email": f"p{i}@x.se", "company": company, "answersJson": json.dumps(answers(i)), "submittedAt": at}
+    r.update(extra)
+    return r
+
+
+def test_stats_match_direct_computation():
+    sets = [answers(i) for i in range(10)]
+    stats = TeamStats(PLAN)
+    stats.add(np.array([[a[q.id] for q in PLAN.questions] for a in sets], dtype=np.int8))
+    summary = stats.summary()
+    assert summary["n"] == 10
+    for k, cat in enumerate(summary["categories"]):
+        assert cat["mean"] == pytest.approx(np.mean([PLAN.sums(a)[k] for a in sets]), abs=0.01)
+    q1 = summary["questions"][0]
+    assert q1["counts"] == [sum(a[1] == v for a in sets) for v in PLAN.scale_values]
+
+
+@pytest.mark.parametrize("value", [-1, 0 + PLAN.scale_max + 1])
+def test_add_rejects_out_of_scale_before_counting(value):
+    stats = TeamStats(PLAN)
+    block = np.full((1, PLAN.n_questions), 4, dtype=np.int8)
+    block[0, 0] = value
+    with pytest.raises(ValueError):
+        stats.add(block)
+    assert stats.n == 0 and not stats.questions.any()
+
+
+def test_scan_rows_skips_and_counts_bad_rows(caplog):
+    rows = [row(i) for i in range(3)] + [
+        row(3, answersJson=json.dumps({"1": PLAN.scale_max + 1})),
+        row(4, answersJson="{trasig"),
+        row(5, at="igår"),
+        row(6, at=12),
+        row(7, instrument="finns-inte.v9"),
+    ]
+    with caplog.at_level(logging.WARNING, logger="sjalvskattning.team_report"):
+        groups = scan_rows(rows, PLAN)
+    assert groups["Acme"].n == 3
+    assert "4 rader med ogiltiga" in caplog.text and "okänt instrument" in caplog.text
+
+
+def test_since_until_select_the_same_rows_for_both_sources(tmp_path):
+    # runt midnatt UTC: båda källorna ska räkna dygnen i UTC
+    times = ["2026-02-28T23:59:59Z", "2026-03-01T00:00:00Z", "2026-03-01T23:59:59Z", "2026-03-02T00:00:00Z"]
+    rows = [row(i, at=t) for i, t in enumerate(times)]
+    store = ColumnStore(str(tmp_path / "cols"))
+    store.append_many(PLAN, [
+        (Contact("P", f"p{i}@x.se", "Acme"), answers(i), f"FL-20260301-000000-000{i}",
+         datetime.fromisoformat(t.replace("Z", "+00:00")).timestamp())
+        for i, t in enumerate(times)
+    ])
+    cols = store.columns(PLAN.key)
+    for since, until, n in [("2026-03-01", "2026-03-01", 2), ("2026-03-01", None, 3), (None, "2026-02-28", 1)]:
+        from_rows = scan_rows(rows, PLAN, since=since, until=until)
+        from_cols = scan_columns(cols, since=since, until=until)
+        assert [s.n for s in from_rows.values()] == [s.n for s in from_cols.values()] == [n]
+
+
+def test_colliding_file_names_get_a_suffix():
+    taken = set()
+    d = date(2026, 3, 1)
+    names = [team_file_name(c, d, taken) for c in ("Acme AB", "Acme-AB", "acme ab", "Bolag")]
+    assert names == [
+        "Teamrapport_Acme_AB_20260301.pdf", "Teamrapport_Acme_AB_20260301_2.pdf",
+        "Teamrapport_acme_ab_20260301_3.pdf", "Teamrapport_Bolag_20260301.pdf",
+    ]
+    assert team_file_name("Acme AB", d) == names[0]
+
+
+def test_main_all_writes_one_pdf_per_colliding_company(tmp_path):
+    source = tmp_path / "in.jsonl"
+    rows = [row(i, "Acme AB" if i % 2 else "Acme-AB") for i in range(10)]
+    source.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    assert team_report.main(["--all", "--source", str(source), "-o", str(tmp_path / "out"), "--min-n", "5"]) == 0
+    assert len(list((tmp_path / "out").glob("*.pdf"))) == 2
+
+
+def test_json_respects_min_n(tmp_path, capsys):
+    source = tmp_path / "in.jsonl"
+    rows = [row(i, "Acme") for i in range(5)] + [row(9, "Liten")]
+    source.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    assert team_report.main(["--all", "--source", str(source), "--json", "--min-n", "5"]) == 0
+    assert list(json.loads(capsys.readouterr().out)) == ["Acme"]
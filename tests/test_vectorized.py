@@ -0,0 +1,73 @@
+import random
+
+import numpy as np
+import pytest
+
+from sjalvskattning.core import calc_scores, classify
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.vectorized import answers_matrix, classify_codes, score_matrix
+
+PLAN = default_plan()
+KEYS = [cat.key for cat in PLAN.categories]
+
+
+def answer_sets(n: int, seed: int, skip: float = 0.0):
+    rng = random.Random(seed)
+    return [
+        {q.id: rng.randint(PLAN.scale_min, PLAN.scale_max) for q in PLAN.questions if rng.random() >= skip}
+        for _ in range(n)
+    ]
+
+
+@pytest.mark.parametrize("skip", [0.0, 0.3])
+def test_matches_calc_scores(skip):
+    sets = answer_sets(200, seed=5, skip=skip)
+    bulk = score_matrix(answers_matrix(sets), missing_as_zero=True)
+    for i, answers in enumerate(sets):
+        expected = calc_scores(answers)
+        assert bulk.sums[i].tolist() == list(PLAN.sums(answers))
+        assert bulk.means[i].tolist() == pytest.approx([getattr(expected, k) for k in KEYS])
+        if answers:
+            assert bulk.total[i] == pytest.approx(expected.total)
+        assert bulk.labels()[i].tolist() == [classify(getattr(expected, k)).label for k in KEYS]
+
+
+def test_classify_codes_matches_classify():
+    labels = PLAN.band_edges()[1]
+    scores = np.array([1.0, 2.49, 2.5, 4.99, 5.0, 7.0, np.nan])
+    codes = classify_codes(scores)
+    assert codes[-1] == -1
+    assert [labels[c] for c in codes[:-1]] == [classify(s).label for s in scores[:-1]]
+
+
+def test_unanswered_is_masked_not_zero():
+    bulk = score_matrix(answers_matrix([{1: 7}]))
+    assert bulk.answered[0].tolist() == [1, 0, 0]
+    assert bulk.means[0, 0] == 7 and np.isnan(bulk.means[0, 1])
+
+
+@pytest.mark.parametrize("value", [260, -1, 8, 256 + 4])
+def test_out_of_range_is_rejected_before_the_cast(value):
+    matrix = np.full((1, PLAN.n_questions), 4, dtype=np.int16)
+    matrix[0, 3] = value
+    with pytest.raises(ValueError):
+        score_matrix(matrix)
+
+
+def test_masked_out_of_range_is_ignored():
+    matrix = np.full((1, PLAN.n_questions), 4, dtype=np.int16)
+    matrix[0, 3] = 300
+    missing = np.zeros(matrix.shape, dtype=bool)
+    missing[0, 3] = True
+    assert score_matrix(matrix, missing).answered[0].sum() == PLAN.n_questions - 1
+
+
+def test_float_matrix_is_rejected():
+    with pytest.raises(ValueError):
+        score_matrix(np.full((1, PLAN.n_questions), 4.5))
+
+
+@pytest.mark.parametrize("value", [0, 8, 300])
+def test_answers_matrix_rejects_out_of_scale(value):
+    with pytest.raises(ValueError):
+        answers_matrix([{1: value}])
@@ -0,0 +1,62 @@
+import base64
+import gzip
+import io
+import json
+
+from sjalvskattning.blobstore import BlobStore
+from sjalvskattning.core import Contact
+from sjalvskattning.instrument import default_plan
+from sjalvskattning.outbox import Outbox
+from sjalvskattning.webhook import (
+    build_compact_payload, build_payload, encode_payload, enqueue_webhook_blob, write_payload_with_pdf,
+)
+
+PLAN = default_plan()
+ANSWERS = {q.id: 1 + q.id % 7 for q in PLAN.questions}
+CONTACT = Contact("Åsa", "asa@x.se", "Acme")
+URL = "http://127.0.0.1:9/hook?sig=test"
+
+
+def test_encode_payload_is_compact_utf8():
+    body, encoding = encode_payload({"name": "Åsa", "sums": [1, 2]})
+    assert encoding is None and body == '{"name":"Åsa","sums":[1,2]}'.encode("utf-8")
+
+
+def test_encode_payload_gzip_is_deterministic():
+    payload = build_compact_payload(CONTACT, ANSWERS, plan=PLAN)
+    body, encoding = encode_payload(payload, compress=True)
+    assert encoding == "gzip"
+    assert encode_payload(payload, compress=True)[0] == body  # mtime=0: samma kropp varje gång
+    assert json.loads(gzip.decompress(body)) == payload
+
+
+def test_compact_payload_lists_answers_in_question_order():
+    payload = build_compact_payload(CONTACT, {1: 5, 3: 2}, plan=PLAN)
+    assert payload["v"] == 2 and payload["instrument"] == PLAN.key
+    assert payload["answers"][:4] == [5, None, 2, None] and len(payload["answers"]) == PLAN.n_questions
+    assert payload["sums"] == list(PLAN.sums({1: 5, 3: 2}))
+
+
+def test_streamed_pdf_payload_matches_build_payload():
+    pdf = bytes(range(256)) * 50
+    base = build_payload(CONTACT, ANSWERS, plan=PLAN)
+    out = io.BytesIO()
+    write_payload_with_pdf(out, base, pdf, "rapport.pdf")
+    streamed = json.loads(out.getvalue())
+    inline = {"pdfBase64": base64.b64encode(pdf).decode(), "fileName": "rapport.pdf"}
+    expected = build_payload(CONTACT, ANSWERS, pdf=inline, plan=PLAN)
+    expected["submittedAt"] = streamed["submittedAt"]
+    assert streamed == expected
+
+
+def test_blob_transport_enqueues_a_reference(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    blobs = BlobStore(str(tmp_path / "blobs"))
+    try:
+        enqueue_webhook_blob(outbox, blobs, URL, CONTACT, ANSWERS, b"%PDF", "r.pdf", plan=PLAN)
+        msg, _ = outbox.claim()
+        assert msg.content_encoding == "gzip"
+        payload = json.loads(gzip.decompress(msg.body))
+        assert payload["pdf"]["fileName"] == "r.pdf" and blobs.get(payload["pdf"]["sha256"]) == b"%PDF"
+    finally:
+        outbox.close()